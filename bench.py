@@ -0,0 +1,240 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import folium
+import numpy as np
+import pandas as pd
+
+from utils_featurestore import CACHE_DIR
+from utils_geo import GridIndex, fit_zoom, hit_test, tolerance_for_zoom
+from utils_map import MAP_HEIGHT, MAP_WIDTH, build_map, feature_collections, normalize_features, png_data_url
+from utils_standin import OID, StandIn
+from utils_table import ColumnarTable, features_frame, make_query
+
+# Benchmarks of the dashboard data pipeline, stage by stage, over fixed
+# synthetic datasets served by the local stand-in FeatureServer:
+#
+#   python bench.py                                  # 1k/10k/100k, mixed geometry
+#   python bench.py --sizes 1000,10000 --out base.json
+#   python bench.py --sizes 1000,10000 --compare base.json
+#
+# Results are JSON (one entry per dataset, min/median seconds per stage plus
+# payload sizes); --compare exits non-zero when a stage got slower than
+# --threshold times the baseline.
+
+SIZES = (1000, 10000, 100000)
+MIXES = {
+    'point': {'point': 1.0},
+    'polyline': {'polyline': 1.0},
+    'polygon': {'polygon': 1.0},
+    'mixed': {'point': 0.3, 'polyline': 0.2, 'polygon': 0.5},
+}
+STAGES = ('query', 'dataframe', 'query_frame', 'normalize', 'bounds', 'geojson', 'folium', 'hit_test', 'table')
+LABEL_FIELD = 'Projectnr'
+ICON_PATH = 'assets/logo.png'
+CLICKS = 200           # hit tests per run
+PAGE_SIZE = 50         # table rows sent to the grid
+MIN_COMPARE = 0.005    # stages faster than this (s) are too noisy to compare
+BENCH_DIR = CACHE_DIR / 'bench'
+
+
+def _timed(fn, repeat):
+    """(last result, {'min', 'median', 'runs'}) over `repeat` runs."""
+    times, out = [], None
+    for _ in range(repeat):
+        out = None
+        gc.collect()
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, {'min': min(times), 'median': statistics.median(times), 'runs': len(times)}
+
+
+def _label(n):
+    return f'{n // 1000}k' if n >= 1000 and n % 1000 == 0 else str(n)
+
+
+# --------------------------------------------------------------------------
+# Stages (mirroring pages/01_Dashboard.py, "Volledige laag", first render)
+# --------------------------------------------------------------------------
+def run_dataset(n, mix, repeat=3, fmt='json', seed=0, lazy=True):
+    """All stages for one dataset; returns the result entry."""
+    t0 = time.perf_counter()
+    srv = StandIn(n, seed, MIXES[mix]).start()
+    entry = {'dataset': f'{mix}-{_label(n)}', 'features': n, 'mix': mix, 'format': fmt,
+             'seed': seed, 'lazy': lazy, 'generate_seconds': time.perf_counter() - t0, 'stages': {}}
+    stages = entry['stages']
+    try:
+        agol = srv.client()
+        agol.set_query_format(fmt)
+        agol.layer_info(srv.layer_url)  # token + metadata, as on a warm client
+
+        def query():
+            agol.reset_stats()
+            return agol.query_all(srv.layer_url, extra={'outSR': 4326}, profile='full')['features']
+
+        try:
+            features, stages['query'] = _timed(query, repeat)
+        except Exception as e:
+            # e.g. pbf on a mixed-geometry layer: fall back to JSON for the other stages
+            stages['query'] = {'error': str(e)}
+            agol.set_query_format('json')
+            features = query()
+        stages['query'].update({'bytes': sum(s['bytes'] for s in agol.stats.values()),
+                                'requests': sum(s['count'] for s in agol.stats.values())})
+        if 'error' not in stages['query']:
+            # query + DataFrame + geometry arrays in one pass (compare with query + dataframe)
+            _, stages['query_frame'] = _timed(
+                lambda: agol.query_frame(srv.layer_url, extra={'outSR': 4326}, profile='full'), repeat)
+    finally:
+        srv.stop()
+
+    # attribute columns + geometry arrays, as the dashboard builds them
+    (df, ga), stages['dataframe'] = _timed(lambda: features_frame(features), repeat)
+    (norm, extent), stages['normalize'] = _timed(lambda: normalize_features(features, ga), repeat)
+
+    _, stages['bounds'] = _timed(lambda: (ga.centers(ga.bounds()), ga.extent()), repeat)
+
+    # first render: the zoom at which the map fits the whole layer
+    tol = tolerance_for_zoom(fit_zoom(extent, MAP_WIDTH, MAP_HEIGHT), (extent[0] + extent[2]) / 2.0) if extent else 0.0
+    props = [OID, LABEL_FIELD] if lazy else None
+    (points_fc, shapes_fc), stages['geojson'] = _timed(lambda: feature_collections(norm, OID, tol, props), repeat)
+    stages['geojson']['bytes'] = len(json.dumps(points_fc)) + len(json.dumps(shapes_fc))
+
+    icon_url = png_data_url(ICON_PATH)
+
+    def render():
+        m = build_map(extent, LABEL_FIELD, collections=(points_fc, shapes_fc), fields=df.columns,
+                      icon_url=icon_url, lazy=lazy)
+        return m.get_root().render()
+
+    html, stages['folium'] = _timed(render, repeat)
+    stages['folium']['html_bytes'] = len(html.encode('utf-8'))
+    del html
+
+    rnd = random.Random(seed)
+    clicks = [norm[rnd.randrange(len(norm))]['center'] for _ in range(CLICKS)] if norm else []
+
+    def clicks_run():
+        index = GridIndex([item['bounds'] for item in norm])
+        structs = [item['struct'] for item in norm]
+        t = time.perf_counter()
+        hits = sum(hit_test(index, structs, lat, lon, tol_m=25.0) is not None for lat, lon in clicks)
+        return hits, time.perf_counter() - t
+
+    (hits, click_seconds), stages['hit_test'] = _timed(clicks_run, repeat)
+    stages['hit_test'].update({'clicks': len(clicks), 'hits': hits,
+                               'per_click_ms': 1000.0 * click_seconds / max(1, len(clicks))})
+
+    q = make_query(sort='Aanneemsom', ascending=False)
+
+    def table_run():
+        page, _ = ColumnarTable(df).page(q, 0, PAGE_SIZE)
+        return page.to_json(orient='records')
+
+    payload, stages['table'] = _timed(table_run, repeat)
+    stages['table']['payload_bytes'] = len(payload)
+    return entry
+
+
+# --------------------------------------------------------------------------
+# Results
+# --------------------------------------------------------------------------
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def meta():
+    import streamlit
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__, 'pandas': pd.__version__,
+        'folium': folium.__version__, 'streamlit': streamlit.__version__,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Rows (dataset, stage, base, now, ratio, slower) for the stages both runs have."""
+    base = {r['dataset'] + '/' + r['format']: r for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        b = base.get(r['dataset'] + '/' + r['format'])
+        if b is None:
+            continue
+        for stage in STAGES:
+            s_now, s_base = r['stages'].get(stage, {}), b['stages'].get(stage, {})
+            if 'median' not in s_now or 'median' not in s_base:
+                continue
+            ratio = s_now['median'] / s_base['median'] if s_base['median'] else float('inf')
+            slower = ratio > threshold and max(s_now['median'], s_base['median']) >= MIN_COMPARE
+            rows.append((r['dataset'], stage, s_base['median'], s_now['median'], ratio, slower))
+    return rows
+
+
+def _print_entry(entry):
+    print(f"\n{entry['dataset']} ({entry['format']}), generated in {entry['generate_seconds']:.1f}s")
+    for stage in STAGES:
+        s = entry['stages'].get(stage, {})
+        if 'median' not in s:
+            print(f'  {stage:<10} {s.get("error", "-")}')
+            continue
+        extra = ', '.join(f'{k}={v:,.0f}' if isinstance(v, (int, float)) and v >= 10 else f'{k}={v:.3g}'
+                          for k, v in s.items() if k not in ('min', 'median', 'runs'))
+        print(f"  {stage:<10} {s['median'] * 1000:10.1f} ms  (min {s['min'] * 1000:.1f}){'  ' + extra if extra else ''}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmark the dashboard data pipeline.')
+    ap.add_argument('--sizes', default=','.join(str(n) for n in SIZES))
+    ap.add_argument('--mixes', default='mixed', help=f"comma separated: {', '.join(MIXES)}")
+    ap.add_argument('--format', default='json', choices=('json', 'pbf'))
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--full-popups', action='store_true', help='popups in the map (lazy details off)')
+    ap.add_argument('--out', help=f'results file (default {BENCH_DIR}/bench-<time>.json)')
+    ap.add_argument('--compare', help='baseline results file')
+    ap.add_argument('--threshold', type=float, default=1.2, help='allowed slowdown factor vs the baseline')
+    args = ap.parse_args(argv)
+
+    results = {'meta': meta(), 'results': []}
+    for mix in args.mixes.split(','):
+        for n in (int(s) for s in args.sizes.split(',')):
+            entry = run_dataset(n, mix, args.repeat, args.format, args.seed, not args.full_popups)
+            results['results'].append(entry)
+            _print_entry(entry)
+
+    out = Path(args.out) if args.out else BENCH_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2), encoding='utf-8')
+    print(f'\nresults: {out}')
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        rows = compare(results, baseline, args.threshold)
+        print(f"\nvs {args.compare} (commit {baseline['meta'].get('commit')}):")
+        for dataset, stage, b, now, ratio, slower in rows:
+            print(f"  {dataset:<14} {stage:<10} {b * 1000:9.1f} -> {now * 1000:9.1f} ms  x{ratio:.2f}"
+                  f"{'  SLOWER' if slower else ''}")
+        if any(r[-1] for r in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
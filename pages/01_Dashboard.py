@@ -12,14 +12,11 @@ Ploegam – Dashboard (Kaart + Tabel)
 """
 
 from __future__ import annotations
-import base64
-import math
 from typing import Any, Dict, List, Tuple
 
 import streamlit as st
+import numpy as np
 import pandas as pd
-import folium
-from folium.plugins import Fullscreen
 from streamlit_folium import st_folium
 
 # Tabelselectie met AG-Grid (optioneel, maar aanbevolen)
@@ -30,7 +27,19 @@ except Exception:
     AGGRID_AVAILABLE = False
 
 # ✅ Juiste import van jouw helper (let op underscore)
-from utils_agol import AGOL  # utils_agol.py bevat update_features/add_features/delete_features  # noqa: E402
+from utils_agol import get_client  # utils_agol.py bevat update_features/add_features/delete_features  # noqa: E402
+from utils_featurestore import get_store  # noqa: E402
+from utils_cache import layer_cache, view_cache  # noqa: E402
+from utils_extent import get_extent_loader  # noqa: E402
+from utils_geo import GridIndex, fit_zoom, hit_test, tolerance_for_zoom  # noqa: E402
+from utils_map import MAP_HEIGHT, MAP_WIDTH, build_map, feature_collections, normalize_features, png_data_url, popup_html  # noqa: E402
+from utils_schema import DATE_TYPES, get_schema, is_null, to_epoch_ms  # noqa: E402
+from utils_domains import get_domain_store, get_remote_domains  # noqa: E402
+from utils_table import OPS, PAGE_SIZES, ColumnarTable, and_where, features_frame, filter_key, make_query, remote_page, sql_literal, to_where  # noqa: E402
+from utils_facets import FacetIndex, facet_where, selection_key  # noqa: E402
+from utils_stats import MONTH_PREFIX, stat, statistics  # noqa: E402
+from utils_outbox import get_edit_queue  # noqa: E402
+from utils_trace import end_trace, format_tree, metrics, span, start_trace, summarize, write_jsonl  # noqa: E402
 
 # ──────────────────────────────────────────────────────────────────────────────
 # PAGE CONFIG
@@ -48,94 +57,123 @@ ICON_PATH = "assets/logo.png"  # jouw PNG-icoon in de repo
 
 # Map defaults
 DEFAULT_BASEMAP = "Esri World Topographic"
-DEFAULT_MAP_HEIGHT = 500  # px
+DEFAULT_MAP_HEIGHT = MAP_HEIGHT  # px
+RENDER_MODES = ["GeoJSON-laag (snel)", "Losse objecten"]
+DEFAULT_RENDER_MODE = RENDER_MODES[0]
+LOAD_MODES = ["Volledige laag", "Zichtbaar gebied"]
+MIN_EXTENT_ZOOM = 9  # "Zichtbaar gebied" laadt pas vanaf dit zoomniveau
 
-# ──────────────────────────────────────────────────────────────────────────────
-# HELPERS
-# ──────────────────────────────────────────────────────────────────────────────
-def load_png_as_data_url(path: str) -> str | None:
-    """Laad PNG en retourneer data-URI (base64) zodat Folium/Leaflet hem inline kan gebruiken."""
-    try:
-        with open(path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode("utf-8")
-        return f"data:image/png;base64,{b64}"
-    except Exception:
-        return None
-
-def esri_to_struct(geom: Dict[str, Any]) -> Dict[str, Any] | None:
-    """Zet ESRI geometry om naar generieke structuur met (lat, lon)."""
-    if not geom:
-        return None
-    if "x" in geom and "y" in geom:
-        return {"type": "point", "coords": [(geom["y"], geom["x"])]}
-    if "paths" in geom:  # polyline
-        paths = [[(y, x) for x, y in path] for path in geom["paths"]]
-        return {"type": "polyline", "coords": paths}
-    if "rings" in geom:  # polygon
-        rings = [[(y, x) for x, y in ring] for ring in geom["rings"]]
-        return {"type": "polygon", "coords": rings}
-    return None
-
-def struct_bounds(struct: Dict[str, Any]) -> Tuple[float, float, float, float] | None:
-    lats, lons = [], []
-    t = struct["type"]
-    if t == "point":
-        for (lat, lon) in struct["coords"]:
-            lats.append(lat); lons.append(lon)
-    else:
-        for part in struct["coords"]:
-            for (lat, lon) in part:
-                lats.append(lat); lons.append(lon)
-    if not lats or not lons:
-        return None
-    return (min(lats), min(lons), max(lats), max(lons))
-
-def struct_center(struct: Dict[str, Any]) -> Tuple[float, float] | None:
-    """Ruwe center als gemiddelde van bounds (prima voor selectie/zoom)."""
-    b = struct_bounds(struct)
-    if not b:
-        return None
-    (min_lat, min_lon, max_lat, max_lon) = b
-    return ((min_lat + max_lat) / 2.0, (min_lon + max_lon) / 2.0)
-
-def haversine_m(lat1, lon1, lat2, lon2) -> float:
-    """Afstand in meters tussen twee lat/lon punten."""
-    R = 6371000.0
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = phi2 - phi1
-    dlmb = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb/2)**2
-    return 2 * R * math.asin(math.sqrt(a))
-
-def popup_html(attrs: Dict[str, Any]) -> str:
-    rows = "".join(
-        f"<tr><th style='text-align:left;padding-right:8px;white-space:nowrap'>{k}</th>"
-        f"<td>{'' if v is None else v}</td></tr>"
-        for k, v in attrs.items()
-    )
-    return f"<table>{rows}</table>"
+# Na een bewerking blijven deze cachestappen staan (features worden ter plekke bijgewerkt)
+LOCAL_EDIT_KEEP = ("features", "norm", "by_id", "extent", "schema")
+OUTBOX_POLL = 3  # seconden tussen statuscontroles zolang er wijzigingen onderweg zijn
 
 # ──────────────────────────────────────────────────────────────────────────────
 # DATA LADEN VIA AGOL
 # ──────────────────────────────────────────────────────────────────────────────
 cfg = st.secrets["arcgis"]
-agol = AGOL(cfg["username"], cfg["password"], cfg["portal"])  # gebruikt jouw utils_agol helper  # [1](https://ploegam-my.sharepoint.com/personal/s_adank_ploegam_nl/Documents/Microsoft%20Copilot%20Chat-bestanden/utils_agol%20(1).py).py)
+agol = get_client(cfg["username"], cfg["password"], cfg["portal"])  # gedeelde client (token + verbindingen) over reruns/sessies
 layer_url = cfg["projects_layer_url"]
 
-# Ophalen
-try:
-    res = agol.query(layer_url, out_fields="*", return_geometry=True,rue, extra={"outSR": 4326})
-    featuresures = res.get("features", [])
-except Exception as e:
-    st.error(f"Fout bijFout bij ophalen data: {e}")
+# Prestatie-trace per rerun (opt-in): ?debug=1 in de URL of debug_trace = true in de secrets
+DEBUG = bool(cfg.get("debug_trace", False)) or st.query_params.get("debug") == "1"
+trace = start_trace("dashboard") if DEBUG or cfg.get("trace_log") else None
+
+def finish_trace() -> None:
+    """Trace van deze rerun afsluiten en wegschrijven (één keer per rerun)."""
+    if trace is None or trace.end is not None:
+        return
+    end_trace(trace)
+    if cfg.get("trace_log"):
+        write_jsonl(trace, cfg["trace_log"])  # één JSON-regel per rerun, voor analyse over sessies heen
+    if cfg.get("metrics_file"):
+        metrics.write(cfg["metrics_file"])  # OpenMetrics-tekstbestand (bv. node_exporter textfile collector)
+
+def rerun_script() -> None:
+    """st.rerun() dat de trace eerst afsluit; anders ontbreken reruns via selectie/opslaan in het log."""
+    finish_trace()
+    st.rerun()
+
+def stop_script() -> None:
+    """st.stop() met afgesloten trace (zie rerun_script)."""
+    finish_trace()
     st.stop()
 
-if not features:
-    st.warning("Geen features gevondengevonden in de laag.")
-    st.stop()
+# Cache per (laag, where): UI-reruns (slider, basemap, selectie) raken het netwerk niet
+WHERE = "1=1"
+layer_cache.ttl = view_cache.ttl = int(cfg.get("cache_ttl", 300))  # seconden
+agol.set_query_format(cfg.get("query_format", "json"))  # "pbf" = compacte protobuf-antwoorden
+if cfg.get("domains_fs_url"):
+    try:
+        get_domain_store().attach(get_remote_domains(agol, cfg["domains_fs_url"]))
+    except Exception as e:  # keuzelijsten vallen terug op assets/domains
+        st.warning(f"Beheer domeinen niet bereikbaar, CSV-lijsten worden gebruikt: {e}")
 
-# Attribuuttabel
-df = pd.Data pd.DataFrame([f.get("attributes", {}) for f in features])
+# Ophalen – lokale feature-cache (SQLite); eerste keer volledig (gepagineerd), daarna alleen wijzigingen
+store = get_store(agol, layer_url, out_sr=4326)
+
+def load_features() -> List[Dict[str, Any]]:
+    layer_cache.invalidate(layer_url, WHERE)  # afgeleide stappen (frame, norm) horen bij deze nieuwe lading
+    progress = st.empty()
+    loaded = [0]
+
+    def _on_page(n: int) -> None:
+        loaded[0] += n
+        progress.caption(f"{loaded[0]} features geladen…")
+
+    try:
+        with span("store.sync"):
+            store.sync(progress=_on_page)
+        feats = store.features()
+    except Exception as e:
+        feats = store.features()
+        if not feats:
+            st.error(f"Fout bij ophalen data: {e}")
+            stop_script()
+        st.warning(f"Synchronisatie mislukt, lokale kopie wordt getoond: {e}")
+    progress.empty()
+    return feats
+
+def extent_to_bounds(ext: Dict[str, Any]) -> Tuple[float, float, float, float] | None:
+    if not ext or ext.get("xmin") is None or ext.get("xmin") == "NaN":
+        return None
+    return (ext["ymin"], ext["xmin"], ext["ymax"], ext["xmax"])
+
+def view_to_bounds(view: Dict[str, Any]) -> Tuple[float, float, float, float] | None:
+    b = (view or {}).get("bounds") or {}
+    sw, ne = b.get("_southWest") or {}, b.get("_northEast") or {}
+    if sw.get("lat") is None or ne.get("lat") is None:
+        return None
+    return (sw["lat"], sw["lng"], ne["lat"], ne["lng"])
+
+load_mode = st.session_state.get("load_mode", LOAD_MODES[0])
+layer_extent = None
+
+if load_mode == "Zichtbaar gebied":
+    # Alleen features in de kaartweergave (+ buffer) via envelope-query's; opgehaalde tegels blijven gecached
+    layer_extent = layer_cache.get(layer_url, "1=1", "extent", lambda: extent_to_bounds(agol.extent(layer_url, out_sr=4326)))
+    view = st.session_state.get(f"kaart_{st.session_state.get('map_gen', 0)}") or {}
+    view_bounds = view_to_bounds(view)
+    if view_bounds and (view.get("zoom") or 0) >= MIN_EXTENT_ZOOM:
+        try:
+            WHERE, features = get_extent_loader(agol, layer_url, out_sr=4326).load(view_bounds)
+        except Exception as e:
+            st.error(f"Fout bij ophalen data: {e}")
+            stop_script()
+    else:
+        WHERE, features = "extent:none", []
+        st.info(f"Zoom verder in (niveau ≥ {MIN_EXTENT_ZOOM}) om de projecten in het zichtbare gebied te laden.")
+else:
+    features = layer_cache.get(layer_url, WHERE, "features", load_features)
+
+    if not features:
+        st.warning("Geen features gevonden in de laag.")
+        stop_script()
+
+# Attribuuttabel en geometrie als kolommen, in één doorgang (lege tabel met de laagvelden als er in beeld niets ligt)
+if features:
+    df, geoms = layer_cache.get(layer_url, WHERE, "frame", lambda: features_frame(features))
+else:
+    df, geoms = pd.DataFrame(columns=[f["name"] for f in agol.layer_info(layer_url).get("fields", [])]), None
 
 # Key-veld bepalen
 id_field = None
@@ -148,43 +186,89 @@ if id_field is None:
 
 # LABEL veld controleren
 if LABEL_FIELD not in df.columns:
-    st.warning(f"Let op: labelveld '{LABEL_FIELD}' niet gevonden in kolommenmmen. Tooltip blijft leeg.")
+    st.warning(f"Let op: labelveld '{LABEL_FIELD}' niet gevonden in kolommen. Tooltip blijft leeg.")
+
+# Tabelfilter – de widgets staan bij de tabel; de waarden staan al in session_state,
+# zodat kaart en tabel dezelfde rijen tonen
+if "tbl_filters" not in st.session_state:
+    st.session_state["tbl_filters"] = []
+tq = make_query(
+    st.session_state.get("tbl_search", ""), st.session_state["tbl_filters"],
+    st.session_state.get("tbl_sort"), st.session_state.get("tbl_dir", "Oplopend") == "Oplopend",
+)
+table = layer_cache.get(layer_url, WHERE, "table", lambda: ColumnarTable(df))
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FACETTEN (zijbalk) – bitmap-index, geen verzoek naar de service
+# ──────────────────────────────────────────────────────────────────────────────
+facets = layer_cache.get(layer_url, WHERE, "facets", lambda: FacetIndex(df))
+FACET_DATES = {"Geplande_start": "Geplande start", "Geplande_oplev": "Geplande oplevering"}
+
+def _facet_selection() -> Dict[str, Any]:
+    """Huidige facetkeuze uit session_state (de widgets zelf staan hieronder)."""
+    sel: Dict[str, Any] = {}
+    for col in facets.values:
+        if st.session_state.get(f"facet_{col}"):
+            sel[col] = list(st.session_state[f"facet_{col}"])
+    for col in FACET_DATES:
+        d = st.session_state.get(f"facet_{col}") or ()
+        if col in facets.bounds and len(d) == 2:
+            sel[col] = (to_epoch_ms(d[0]), to_epoch_ms(d[1]) + 86_399_999)  # t/m einde van de dag
+    rng = st.session_state.get("facet_Aanneemsom")
+    if "Aanneemsom" in facets.bounds and rng and tuple(rng) != facets.bounds["Aanneemsom"]:
+        sel["Aanneemsom"] = tuple(rng)
+    return sel
+
+def _clear_facets() -> None:
+    for k in [k for k in st.session_state if str(k).startswith("facet_")]:
+        del st.session_state[k]
+
+facet_sel = _facet_selection()
+facet_counts = facets.counts(facet_sel)
+
+with st.sidebar:
+    st.markdown("### 🔎 Filters")
+    st.caption(f"{facets.count(facet_sel)} van {facets.n} projecten")
+    for col, values in facets.values.items():
+        cnt = facet_counts[col]
+        st.multiselect(
+            col, values, key=f"facet_{col}",
+            format_func=lambda v, cnt=cnt: f"{v or '(leeg)'} ({cnt.get(v, 0)})",
+        )
+    for col, label in FACET_DATES.items():
+        if col in facets.bounds:
+            st.date_input(label, value=[], key=f"facet_{col}", format="DD-MM-YYYY")
+    if "Aanneemsom" in facets.bounds:
+        lo, hi = facets.bounds["Aanneemsom"]
+        if lo < hi:
+            st.slider("Aanneemsom", min_value=lo, max_value=hi, value=(lo, hi), key="facet_Aanneemsom", format="€ %.0f")
+    st.button("Wis filters", on_click=_clear_facets, use_container_width=True)
+
+facet_mask = facets.mask(facet_sel)
+fkey = filter_key(tq) + selection_key(facet_sel)
+
 # ──────────────────────────────────────────────────────────────────────────────
 # VOORBEREIDING GEOMETRIE/BOUNDS
 # ──────────────────────────────────────────────────────────────────────────────
-# Normaliseer: maak een lijst met (et (attrs, struct, bounds, center)
-norm: List[Dict[str, Any]] = []
-global_bounds = None
-
-for f inf in features:
-    attrs = f.get("attributes", {})
-    geom = f.get("geometrygeometry", {})
-    struct = esri_to_struct(geom)
-   eom)
-    if not struct:
-        continue
-    b = struct_bounds(struct)
-    c = struct_center(struct)
-    item = {"attrs": attrs, "geom": geom, "struct": struct, "bounds": b, "center": c}
-    normnorm.append(item)
-
-    if b:
-        if not global_bounds:
-            global_bounds = b
-        else:
-            global_bounds = (
-                min min(global_bounds[0], b[0]),
-                    min(global_bounds[1], b[1]),
-                max(global_bounds[2],[2], b[2]),
-                max(global_bounds[3], b[, b[3]),
-]),
-            )
+# Normaliseer: maak een lijst met (attrs, struct, bounds, center)
+norm, global_bounds = layer_cache.get(layer_url, WHERE, "norm", lambda: normalize_features(features, geoms))
+if layer_extent:
+    # bij laden per kaartbeeld: startweergave = hele laag, niet alleen wat geladen is
+    global_bounds = layer_extent
 
 if not global_bounds:
     # fallback NL
-   
     global_bounds = (50.5, 3.2, 53.7, 7.4)
 
+# Kaart toont dezelfde rijen als de gefilterde tabel
+if fkey == "all":
+    norm_view = norm
+else:
+    def _filter_norm() -> List[Dict[str, Any]]:
+        keep = set(table.ids(tq, id_field, facet_mask).tolist())
+        return [item for item in norm if item["attrs"].get(id_field) in keep]
+    norm_view = view_cache.get(layer_url, WHERE, f"norm_{fkey}", _filter_norm)
+
 # ──────────────────────────────────────────────────────────────────────────────
 # STATE: SELECTIE + KAARTINSTELLINGEN
 # ──────────────────────────────────────────────────────────────────────────────
@@ -198,150 +282,136 @@ if "basemap" not in st.session_state:
 if "map_height" not in st.session_state:
     st.session_state["map_height"] = DEFAULT_MAP_HEIGHT
 
+if "render_mode" not in st.session_state:
+    st.session_state["render_mode"] = DEFAULT_RENDER_MODE
+
+if "cluster_points" not in st.session_state:
+    st.session_state["cluster_points"] = True
+
+if "lazy_details" not in st.session_state:
+    st.session_state["lazy_details"] = True
+
+if "map_gen" not in st.session_state:
+    # nieuwe key = kaart opnieuw mounten (fit-to-layer)
+    st.session_state["map_gen"] = 0
+
 # ──────────────────────────────────────────────────────────────────────────────
-# FLOATLOATING PANEL (POPOVER) – KAARTOPTIES
+# FLOATING PANEL (POPOVER) – KAARTOPTIES
 # ──────────────────────────────────────────────────────────────────────────────
-right = st.columns([1, 0.140.14])[1]  # small right column voor de knop
+right = st.columns([1, 0.14])[1]  # small right column voor de knop
 with right:
     try:
-        pop = st= st.popover("⚙ Kaartopties")
+        pop = st.popover("⚙ Kaartopties")
     except Exception:
         # Fallback voor oudere Streamlit-versies
-        pop = st.expander("⚙r("⚙ Kaartopties", expanded=False)
+        pop = st.expander("⚙ Kaartopties", expanded=False)
 
 with pop:
-    st.write("**Ondergrond**nd**")
+    st.write("**Ondergrond**")
     st.session_state["basemap"] = st.radio(
         label="",
         options=["Esri World Topographic", "Esri World Imagery"],
         index=0 if st.session_state["basemap"] == "Esri World Topographic" else 1,
- 1,
         horizontal=True
     )
 
-   
     st.write("**Kaarthoogte**")
-   
     st.session_state["map_height"] = st.slider(
-        "Hoogte (px)", min_value=400, max_value=1000, value=st.session_state["map_height"], step=25,=25, label_visibility="collapsed"
+        "Hoogte (px)", min_value=400, max_value=1000, value=st.session_state["map_height"], step=25, label_visibility="collapsed"
+    )
+
+    st.write("**Weergave**")
+    st.session_state["render_mode"] = st.radio(
+        label="Weergave",
+        options=RENDER_MODES,
+        index=RENDER_MODES.index(st.session_state["render_mode"]),
+        horizontal=True,
+        label_visibility="collapsed"
+    )
+
+    st.session_state["cluster_points"] = st.checkbox("Punten clusteren", value=st.session_state["cluster_points"])
+    st.session_state["lazy_details"] = st.checkbox(
+        "Details pas bij selectie laden", value=st.session_state["lazy_details"],
+        help="De kaart bevat dan alleen object-ID en projectnummer; het volledige record wordt opgehaald als je een project selecteert."
+    )
+
+    st.write("**Laden**")
+    st.radio(
+        label="Laden",
+        options=LOAD_MODES,
+        key="load_mode",
+        horizontal=True,
+        label_visibility="collapsed",
+        help=f"'Zichtbaar gebied' haalt alleen projecten binnen de kaartweergave op (vanaf zoomniveau {MIN_EXTENT_ZOOM})."
     )
 
-    if st.button("🔍 ZoomZoom volledige laag", use_container_width=True):
-        # Zet een vlag die we bij het tekenen van de kaart gebruiken
-        st.session_state["zoom_full_trigger"] = True
-        st.experimental_rerunerun()
+    if st.button("🔍 Zoom volledige laag", use_container_width=True):
+        # Nieuwe kaart-key: kaart wordt opnieuw gemount en zoomt naar de volledige laag
+        st.session_state["map_gen"] += 1
+        rerun_script()
 
 # ──────────────────────────────────────────────────────────────────────────────
-# KAART TEKENEN (FOL(FOLIUM)
+# KAART TEKENEN (FOLIUM)
 # ──────────────────────────────────────────────────────────────────────────────
-icon_data_url = load_png_as_data_url(ICON_PATHPATH)
+icon_data_url = png_data_url(ICON_PATH)
 map_height = st.session_state["map_height"]
 basemap = st.session_state["basemap"]
-
-# Basiskaart initialiseren
-default_center = [ (global_bounds[nds[0] + global_bounds[2]) / 2.0, (global_bounds[1] +1] + global_bounds[3]) / 2.0 ]
-m = folium.Map(location=default_center, zoom_start=8, tiles=None, controltrol_scale=True)
-
-# Ondergrond
-if basemap == "Esri World Topographic":
-    folium.TileLayer(
-        tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}",
-        attr    attr="Esri World Topographic Map",
-        name="Esri World Topographic Map",
-        overlay=False
-    ).add_to(m)
-else:
-    folium.TileLayer(
-        tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
-        attr="Esri World Imagery",
-        name="Esri World Imagery",
-            overlay=False
-    ).  ).add_to(m)
-
-fg_all = folium.FeatureGroup(namename="Projecten", show=True)
-fg_sel = folium.FeatureGroup(name="🔶 Selectlectie", show=True)
-
-# Teken alle features
-for item in norm:
-    attrs = item["attrs"]
-    struct = item["struct"]
-
-    tip = f"{LABEL_FIELD}: {attrsttrs.get(LABEL_FIELD, '')}" if LABEL_FIELD in attrs else None
-    pop = foliumlium.Popup(popup_html(attrs), max_width=dth=520)
-
-    if struct["type"] == "== "point":
-        (lat, lon) = struct["coords"][0]
-        if icon_data_url:
-            folium.Marker(
-                location=(lat, lon lon),
-                icon=folium.CustomIcon(icon_image=icon_data_url, icon_size=(28,(28, 28)),
-                tooltip=tip, popupp, popup=pop
-            ).add_to(fg_all)
-        else:
-            fol folium.CircleMarker(
-                location=(lat, lon), radius=7, color="#1f77b4", fill=True, fillfill_color="#1f77b4",
-                tooltip=tip, popup=pop
-            ).add.add_to(fg_all)
-    elif struct["type"] == "polyline":
-        for path in struct["coords"]:
-            folium.PolyLine(path, color="#d62728", weight=3, tooltip=tip, popup=pup=pop).add_to(fgo(fg_all)
-    elif struct["type"] == "polygon":
-        for ring in struct["coords"]:
-            folium.Polygon(ring, color="#1f77b4", weight=2, fill=True, fill_opacity=0.2, tooltip=tip, popup=pop=pop).add.add_to(fg_all)
-
-#)
+lazy = st.session_state["lazy_details"]
+
+def load_record(oid: Any) -> Dict[str, Any] | None:
+    """Volledig record van één object: geladen features, lokale feature-cache, anders één query op object-ID."""
+    by_id = layer_cache.get(layer_url, WHERE, "by_id", lambda: {item["attrs"].get(id_field): item["attrs"] for item in norm})
+    if oid in by_id:
+        return by_id[oid]
+
+    def _fetch() -> Dict[str, Any] | None:
+        f = store.get(oid) or agol.get_feature(layer_url, oid)
+        return (f or {}).get("attributes")
+    return view_cache.get(layer_url, f"{id_field}={oid}", "record", _fetch)
+
+# Huidige kaartweergave (zoom/center) uit de vorige interactie; leeg bij eerste keer laden
+map_key = f"kaart_{st.session_state['map_gen']}"
+map_view = st.session_state.get(map_key) or {}
+view_zoom = map_view.get("zoom")
+view_center = map_view.get("center")
+
+collections = None
+if st.session_state["render_mode"] == DEFAULT_RENDER_MODE:
+    # Eén GeoJSON-laag: gedeelde icoondefinitie, popup/tooltip client-side uit properties
+    # Lijnen/vlakken vereenvoudigd tot ~1 pixel op het huidige zoomniveau (per zoomniveau gecached);
+    # bij eerste keer laden het zoomniveau waarop fit_bounds de hele laag toont
+    lat_ref = view_center["lat"] if view_center else (global_bounds[0] + global_bounds[2]) / 2.0
+    zoom = view_zoom if view_zoom is not None else fit_zoom(global_bounds, MAP_WIDTH, map_height)
+    tol = tolerance_for_zoom(zoom, lat_ref)
+    zkey = f"z{int(zoom)}" if tol else "full"
+    # lichte modus: alleen ID + label in de properties; geen popup per object (details bij selectie)
+    props = [c for c in (id_field, LABEL_FIELD) if c in df.columns] if lazy else None
+    collections = view_cache.get(
+        layer_url, WHERE, f"geojson_{zkey}{'_lazy' if lazy else ''}_{fkey}",
+        lambda: feature_collections(norm_view, id_field, tol, props)
+    )
 
 # Highlight selectie (indien aanwezig)
-sel_id = st.session_state.get("selected_idd_id")
-if)
-if sel_id is not None:
-    # zoek corresponderende feature
-    for item in norm:
-        attrs = item["attrs"]
-        if attrs.get(id_field) != sel_id:
-            continue
-        struct = item["struct"]
-        tip = f"{LABEL_FIELD}: {}: {attrs.get(LABEL_FIELD, '')}" if LABEL_FIELD in attrs else None
-        pop = fol folium.Popup(popup_html(attrs),rs), max_width=520)
-
-        if struct["type"] == "point":
-                (lat, lon) = struct["coords"][0]
-            if icon_data_url:
-rl:
-                folium.Marker(
-                    location=(lat, lon),
-                    icon=folium.CustomIcon(icon_image=icon_datadata_url, icon_size=(34, 34)),
-                    tooltip=tip=tip, popup=pop
-                ).add_to(fgo(fg_sel)
-            else:
-                folium.CircleMarker(
-er(
-                    location=(lat, lon), radius=10, color="#ffbf00", fill=True, fill_color="#ffbf00",
-                    weight=2, tooltip=tip=tip, popup=pop
-                ).add_to(fg_sel_sel)
-        elif struct["type"] == "polyline":
-            for path in struct["coords"]:
-                        folium.PolyLine(path, color="#ffbf00", weight=6, tooltip=tip, popup=pop).add_to(fg_sel)
-        elif struct["type"] == "polygon":
-            for ring in struct["coords"]:
-                folium.Polygon(ring, color="#ffbf00", weight=4, fill=True, fill_opacity=0.15, tooltip=tip, popup=pup=pop).add_to(fg_sel_sel)
-        break
-
-fg_all_all.add_to(m)
-fgadd_to(m)
-fg_sel.add_to(m)
-Fullscreen().add_to(m)
-folium)
-folium.LayerControl(collapsed=False).add_to(m)
-
-# Altijd naar volledige laag zoomen bij laden of bij expliciete trigger
-(min_lat, min_lon,lon, max_lat, max_lon) = global_bounds
-m.fit_bounds([[min_lat, min_lon], [], [max_lat, max_lon]])
+sel_id = st.session_state.get("selected_id")
+sel_item = next((item for item in norm if item["attrs"].get(id_field) == sel_id), None) if sel_id is not None else None
 
-#on]])
+# Kaart opbouwen (utils_map.build_map, dezelfde kaart als in bench.py); startweergave = volledige laag
+# (bij laden en na "Zoom volledige laag"); daarna bepaalt map_view de weergave
+m = build_map(
+    global_bounds, LABEL_FIELD, collections=collections, norm=norm_view, fields=df.columns,
+    basemap=basemap, icon_url=icon_data_url, cluster=st.session_state["cluster_points"], lazy=lazy,
+    selected=sel_item, selected_record=load_record(sel_id) if sel_item else None,
+)
 
 # Render kaart (volledige breedte)
-st_map = st_folium(m, height=map_height, use_container_width=True)
+# Bij een herbouwde kaart (andere selectie/detailniveau) de huidige weergave behouden
+# (hier wordt de Folium-kaart naar HTML gerenderd)
+with span("folium.render", features=len(norm_view), mode=st.session_state["render_mode"]):
+    st_map = st_folium(
+        m, key=map_key, height=map_height, use_container_width=True,
+        center=(view_center["lat"], view_center["lng"]) if view_center else None,
+        zoom=view_zoom,
+    )
 
 # ──────────────────────────────────────────────────────────────────────────────
 # SELECTIE DOOR TE KLIKKEN OP DE KAART
@@ -354,145 +424,349 @@ try:
 except Exception:
     loc = None
 
-ifNone
-
 if loc:
     lat_click = loc.get("lat")
     lon_click = loc.get("lng")
-    # Vind dichtstbijzijndejnde feature(center) binnen 25 m (voor puntennten is dat exact)
-    nearest = None
-    nearest_dist = 25.0  # meter
-    for item in norm:
-        attrs = item["attrs"]
-        cen = item["center"]
-        if not cen:
-            continue
-        d = haversine_m(lat_click, lon_click, cen[0en[0], cen[1])
-       
-        if d <= nearest_dist:
-            nearest = attrs.get(id_field)
-            nearest_dist = d
+    # Ruimtelijke index (eenmalig per dataset): kandidaten via grid, daarna echte hit-test
+    # (punt-in-polygoon, afstand tot lijn/punt) binnen 25 m
+    index = view_cache.get(layer_url, WHERE, f"index_{fkey}", lambda: GridIndex([item["bounds"] for item in norm_view]))
+    hit = hit_test(index, [item["struct"] for item in norm_view], lat_click, lon_click, tol_m=25.0)
+    nearest = norm_view[hit]["attrs"].get(id_field) if hit is not None else None
     if nearest is not None and nearest != st.session_state.get("selected_id"):
-        st.session_state["selected_id"_id"] = nearest
-        st.rerun()
+        st.session_state["selected_id"] = nearest
+        rerun_script()
+
+# Lichte modus: volledig record van de selectie (ook als die buiten het geladen kaartbeeld valt)
+if lazy and st.session_state.get("selected_id") is not None:
+    record = load_record(st.session_state["selected_id"])
+    if record:
+        with st.expander(f"📄 Details {record.get(LABEL_FIELD, '')}", expanded=False):
+            st.markdown(popup_html(record), unsafe_allow_html=True)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # TABEL – AG-Grid met single selection
 # ──────────────────────────────────────────────────────────────────────────────
-st.markdown("### 🗂️"### 🗂️ Projecten")
-
-df_show = df.copy()
+st.markdown("### 🗂️ Projecten")
+
+def _reset_page() -> None:
+    st.session_state["tbl_page"] = 1
+
+tbl_cols = list(df.columns)
+c_search, c_sort, c_dir, c_size = st.columns([0.4, 0.25, 0.15, 0.2])
+with c_search:
+    st.text_input("Zoeken", key="tbl_search", placeholder="Zoek in tekstvelden…", on_change=_reset_page)
+with c_sort:
+    st.selectbox("Sorteren op", [None] + tbl_cols, key="tbl_sort", format_func=lambda c: "—" if c is None else c,
+                 on_change=_reset_page)
+with c_dir:
+    st.radio("Volgorde", ["Oplopend", "Aflopend"], key="tbl_dir", on_change=_reset_page)
+with c_size:
+    st.selectbox("Rijen per pagina", PAGE_SIZES, index=1, key="tbl_page_size", on_change=_reset_page)
+
+with st.expander(f"Filters ({len(st.session_state['tbl_filters'])})", expanded=False):
+    f1, f2, f3, f4 = st.columns([0.35, 0.15, 0.35, 0.15])
+    f_col = f1.selectbox("Kolom", tbl_cols, key="tbl_f_col")
+    f_op = f2.selectbox("Operator", OPS, key="tbl_f_op")
+    f_val = f3.text_input("Waarde", key="tbl_f_val", help="Datums als JJJJ-MM-DD of DD-MM-JJJJ")
+    if f4.button("➕ Toevoegen", use_container_width=True) and f_val:
+        # getal-/datumvelden: waarde nu controleren, niet pas bij het opbouwen van de where-clause
+        f_field = get_schema(agol, layer_url, layer_cache).get(f_col)
+        try:
+            if f_op != "bevat" and f_field is not None:
+                sql_literal(f_val, f_field.type)
+        except ValueError:
+            st.error(f"Ongeldige waarde voor {f_col}: {f_val!r} is geen "
+                     + ("datum" if f_field.type in DATE_TYPES else "getal") + ".")
+        else:
+            st.session_state["tbl_filters"] = st.session_state["tbl_filters"] + [(f_col, f_op, f_val)]
+            _reset_page()
+            rerun_script()
+    for i, (c, o, v) in enumerate(st.session_state["tbl_filters"]):
+        fc1, fc2 = st.columns([0.85, 0.15])
+        fc1.markdown(f"`{c}` {o} **{v}**")
+        if fc2.button("✖", key=f"tbl_f_del_{i}"):
+            st.session_state["tbl_filters"] = [f for j, f in enumerate(st.session_state["tbl_filters"]) if j != i]
+            _reset_page()
+            rerun_script()
+
+# Alleen de zichtbare pagina gaat naar de grid: lokaal (kolomcache) of, bij "Zichtbaar gebied", rechtstreeks uit de laag
+page_size = st.session_state.get("tbl_page_size", PAGE_SIZES[1])
+sel_now = st.session_state.get("selected_id")
+if load_mode == "Zichtbaar gebied":
+    field_types = {name: f.type for name, f in get_schema(agol, layer_url, layer_cache).fields.items()}
+    tbl_where = and_where(to_where(tq, field_types), facet_where(facet_sel, field_types))
+    total = view_cache.get(layer_url, tbl_where, "count", lambda: agol.count(layer_url, tbl_where))
+else:
+    tbl_pos = table.positions(tq, facet_mask)
+    total = len(tbl_pos)
+    if sel_now is not None and sel_now != st.session_state.get("tbl_last_sel"):
+        # selectie vanuit de kaart: naar de pagina met die rij springen
+        hit = np.flatnonzero(table.df[id_field].to_numpy()[tbl_pos] == sel_now)
+        if len(hit):
+            st.session_state["tbl_page"] = int(hit[0]) // page_size + 1
+st.session_state["tbl_last_sel"] = sel_now
+
+n_pages = max(1, -(-total // page_size))
+st.session_state["tbl_page"] = min(max(1, st.session_state.get("tbl_page", 1)), n_pages)
+p1, p2 = st.columns([0.2, 0.8])
+with p1:
+    st.number_input("Pagina", min_value=1, max_value=n_pages, step=1, key="tbl_page")
+with p2:
+    st.caption(f"{total} projecten – pagina {st.session_state['tbl_page']} van {n_pages}")
+offset = (st.session_state["tbl_page"] - 1) * page_size
+
+if load_mode == "Zichtbaar gebied":
+    try:
+        df_show = view_cache.get(
+            layer_url, tbl_where, f"page_{tq['sort']}_{tq['ascending']}_{offset}_{page_size}",
+            lambda: remote_page(agol, layer_url, tq, field_types, offset, page_size, where=tbl_where)
+        )
+    except Exception as e:
+        st.error(f"Fout bij ophalen tabel: {e}")
+        df_show = df.iloc[0:0]
+else:
+    df_show = table.df.iloc[tbl_pos[offset:offset + page_size]]
+df_show = df_show.copy()  # alleen de pagina
 
-# Visuele indicatorator (kolom 0)
-df_show.insert(0, "🔶 geselecteerd", df_show[id_field].eq(st.session_state.get("selectedselected_id")))
+# Visuele indicator (kolom 0)
+df_show.insert(0, "🔶 geselecteerd", df_show[id_field].eq(sel_now) if id_field in df_show.columns else False)
 
 if AGGRID_AVAILABLE:
-    gb = GridOptionsBuilder.from_dataframe(df_show(df_show)
-    gb.configure_selection(selection_mode="single", use_checkbox=False)
-    gb.configure_gridgrid_options(domLayout='normal')  # basic stijl
-    grid = AgGrid(
-        df_show,
-        gridgridOptions=gb.build(),
-        update_mode=GridUpdateMode.SELECTION_CHANGED,
-        height=450,
-        allow_unsafe_jscode=False,
-        fit_columnsumns_on_grid_load=True
-    )
-    sel_rows = grid.get("selected_rowsrows", [])
+    with span("aggrid", rows=len(df_show)):
+        gb = GridOptionsBuilder.from_dataframe(df_show)
+        gb.configure_selection(selection_mode="single", use_checkbox=False)
+        gb.configure_default_column(sortable=False, filter=False)  # sorteren/filteren gebeurt server-side (boven de tabel)
+        gb.configure_grid_options(domLayout='normal')  # basic stijl
+        grid = AgGrid(
+            df_show,
+            gridOptions=gb.build(),
+            update_mode=GridUpdateMode.SELECTION_CHANGED,
+            height=450,
+            allow_unsafe_jscode=False,
+        )
+    sel_rows = grid.get("selected_rows", [])
     if sel_rows:
-        new_id = sel_rows[0].get(idt(id_field)
-        if new_id is not None and new_id != st.session_state.get.get("selected_id"):
+        new_id = sel_rows[0].get(id_field)
+        if new_id is not None and new_id != st.session_state.get("selected_id"):
             st.session_state["selected_id"] = new_id
-                st.rerun()
+            rerun_script()
 else:
-    st.info("Voor rijselectie in de tabel is **streamlit-aggrid** nodig. Voeg toe aan requirements.txt: `streamlit-agt-aggrid`.")
-    st.dataframe(df_show, use_container_width=True, height=450=450)
+    st.info("Voor rijselectie in de tabel is **streamlit-aggrid** nodig. Voeg toe aan requirements.txt: `streamlit-aggrid`.")
+    st.dataframe(df_show, use_container_width=True, height=450)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# KERNCIJFERS – aggregaties (service: outStatistics; volledige laag: lokaal uit de cache)
+# ──────────────────────────────────────────────────────────────────────────────
+KPI_GROUPS = {"Status": "Status", "Bedrijf": "Bedrijf", "Soort": "Soort", "Planning (maand)": MONTH_PREFIX + "Geplande_start"}
+KPI_STATS = [stat("count", id_field, "Aantal"), stat("sum", "Aanneemsom", "Totaal"), stat("avg", "Aanneemsom", "Gemiddeld")]
+
+with st.expander("📈 Kerncijfers", expanded=False):
+    if load_mode == "Zichtbaar gebied":
+        # één klein verzoek per groepering, met dezelfde filters als de tabel
+        kpi_where, kpi_df = tbl_where, None
+    else:
+        kpi_where, kpi_df = f"{WHERE}|{fkey}", table.df.iloc[tbl_pos]
+
+    def _kpi(group_by: List[str]) -> pd.DataFrame:
+        return statistics(agol, layer_url, KPI_STATS, group_by,
+                          where=tbl_where if kpi_df is None else "1=1",
+                          df=kpi_df, prefer_local=kpi_df is not None)
+
+    try:
+        totals = view_cache.get(layer_url, kpi_where, "kpi_totals", lambda: _kpi([]))
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Projecten", f"{int(totals['Aantal'].iloc[0] or 0)}")
+        k2.metric("Totale aanneemsom", f"€ {float(totals['Totaal'].iloc[0] or 0):,.0f}".replace(",", "."))
+        k3.metric("Gemiddelde aanneemsom", f"€ {float(totals['Gemiddeld'].iloc[0] or 0):,.0f}".replace(",", "."))
+
+        group_label = st.radio("Groeperen op", list(KPI_GROUPS), horizontal=True, key="kpi_group")
+        grouped = view_cache.get(layer_url, kpi_where, f"kpi_{KPI_GROUPS[group_label]}",
+                                  lambda: _kpi([KPI_GROUPS[group_label]]))
+        st.dataframe(
+            grouped.rename(columns={KPI_GROUPS[group_label].removeprefix(MONTH_PREFIX): group_label}),
+            use_container_width=True, hide_index=True,
+            column_config={
+                "Totaal": st.column_config.NumberColumn(format="€ %.0f"),
+                "Gemiddeld": st.column_config.NumberColumn(format="€ %.0f"),
+            },
+        )
+    except Exception as e:
+        st.warning(f"Kerncijfers niet beschikbaar: {e}")
 
 # ──────────────────────────────────────────────────────────────────────────────
-#──
 # BEWERKEN (MODEL B) – Bewerken -> Opslaan
 # ──────────────────────────────────────────────────────────────────────────────
-st.markdowndown("---")
-st.markdown("### ✏️ Bewerewerken")
+st.markdown("---")
+st.markdown("### ✏️ Bewerken")
+
+# Opslaan loopt via een wachtrij (SQLite in .cache): direct zichtbaar, op de achtergrond naar ArcGIS
+outbox = get_edit_queue(agol, layer_url, store, key_field=cfg.get("relation_key_field"))
+outbox_open = outbox.counts()
+
+def same_value(new: Any, old: Any) -> bool:
+    """Formulierwaarde ongewijzigd t.o.v. de geladen waarde (leeg en None tellen gelijk)."""
+    new, old = (None if v is None or v == "" else v for v in (new, old))
+    if new is None or old is None:
+        return new is old
+    return new == old or str(new) == str(old)
+
+def apply_local_edit(oid: Any, attrs: Dict[str, Any]) -> None:
+    """Optimistische update: geladen features ter plekke bijwerken; alleen afgeleide stappen worden opnieuw berekend."""
+    for f in features:
+        a = f.get("attributes", {})
+        if a.get(id_field) == oid:
+            a.update(attrs)
+            break
+    layer_cache.invalidate(layer_url, keep=LOCAL_EDIT_KEEP)
+
+@st.fragment(run_every=OUTBOX_POLL if outbox_open else None)
+def outbox_status() -> None:
+    """Status van de opslagwachtrij; ververst zichzelf zolang er iets onderweg of mislukt is."""
+    counts = outbox.counts()
+    busy = counts.get("pending", 0) + counts.get("sending", 0)
+    if busy:
+        msg = f"⏳ {busy} wijziging(en) worden op de achtergrond opgeslagen…"
+        if outbox.last_error:
+            msg += f" ArcGIS niet bereikbaar, nieuwe poging volgt ({outbox.last_error})."
+        st.caption(msg)
+    elif outbox_open.get("pending") or outbox_open.get("sending"):
+        st.caption("✅ Alle wijzigingen opgeslagen.")
+    for item in outbox.items():
+        label = item["attrs"].get(LABEL_FIELD) or item["oid"]
+        c_msg, c_retry, c_drop = st.columns([0.7, 0.15, 0.15])
+        if item["status"] == "conflict" and item["kind"] == "add":
+            c_msg.warning(f"**{label}** is mogelijk al aangemaakt (ArcGIS gaf geen antwoord). Controleer de laag.")
+            retry = c_retry.button("Toch opslaan", key=f"outbox_retry_{item['id']}", use_container_width=True)
+        elif item["status"] == "conflict":
+            c_msg.warning(f"**{label}** is intussen door iemand anders gewijzigd; jouw wijziging is niet opgeslagen.")
+            retry = c_retry.button("Toch opslaan", key=f"outbox_retry_{item['id']}", use_container_width=True)
+        else:
+            c_msg.error(f"Opslaan van **{label}** mislukt: {item['error']}")
+            retry = c_retry.button("Opnieuw", key=f"outbox_retry_{item['id']}", use_container_width=True)
+        if retry:
+            outbox.retry(item["id"], force=item["status"] == "conflict")
+            st.rerun(scope="fragment")
+        if c_drop.button("Verwerpen", key=f"outbox_drop_{item['id']}", use_container_width=True):
+            try:
+                outbox.discard(item["id"])  # versie uit ArcGIS terug in de lokale kopie
+            except Exception as e:
+                st.error(f"Verwerpen mislukt: {e}")
+            else:
+                rerun_script()
+
+outbox_status()
 
-sel_id = st= st.session_state.get("selected_id")
+sel_id = st.session_state.get("selected_id")
+sel_match = df[df[id_field] == sel_id] if sel_id is not None else df.iloc[0:0]
 if sel_id is None:
-   is None:
     st.info("Selecteer een record (in de kaart of de tabel) om te bewerken.")
+elif sel_match.empty:
+    st.info("Het geselecteerde record valt buiten de geladen projecten.")
 else:
-    current_attrs = df[df[id_field] == sel_id].iloc[0].to_dict()
+    current_attrs = sel_match.iloc[0].to_dict()
 
     # Open/dicht edit mode
     if "edit_mode" not in st.session_state:
         st.session_state["edit_mode"] = False
 
-    col_b, col_a = st.columns([0.15,.15, 0.85])
+    col_b, col_a = st.columns([0.15, 0.85])
     with col_b:
         if not st.session_state["edit_mode"]:
-            if st.button("Bewerken",en", use_container_width=True):
+            if st.button("Bewerken", use_container_width=True):
                 st.session_state["edit_mode"] = True
         else:
-            if st.button("Annuleren", use_container_widthidth=True):
+            if st.button("Annuleren", use_container_width=True):
                 st.session_state["edit_mode"] = False
-                st  st.rerun()
+                rerun_script()
 
     if st.session_state["edit_mode"]:
-        with st.form("edit_formform", clear_on_submit=False):
-            st.captiontion(f"Record ID: **{sel_id}**")
-
-            edited = {}
-            for col, val val in current_attrs.items():
-                # ID niet bewerkbaar
-                if col == id_field:
-_field:
-                    st.text_input(col, str(val), disabled=True)
-                    edited[col] = val
+        with st.form("edit_form", clear_on_submit=False):
+            st.caption(f"Record ID: **{sel_id}**")
+
+            # invoervelden volgen de laagdefinitie (type, lengte, domein, bewerkbaar)
+            schema = get_schema(agol, layer_url, layer_cache)
+            edited, shown = {}, {}
+            for col, val in current_attrs.items():
+                field = schema.get(col)
+                if field is None or col == id_field or field.widget == "readonly":
+                    label = field.alias if field else col
+                    st.text_input(label, "" if is_null(val) else str(val), disabled=True, key=f"edit_{col}")
                     continue
-                # type-heuristiek
-                if isinstance(val, (intal, (int, float)) and not isinstance(val, bool):
-                    # gebruik string->float fallbackback
-                    default_val = float(val) if val is not None else 0.0
-                    new_val = st.number_input(col,col, value=default_val)
-                    if isinstance(val(val, int):
-                        new_val = int(new(new_val)
+                cur = field.display(val)
+                dl = get_domain_store().for_field(col) if field.widget == "text" else None
+                if dl:
+                    # keuzelijst uit assets/domains (Mdw.-code, label "Naam (Mdw.)"); een oude
+                    # volledige naam wordt naar de code vertaald, een onbekende waarde blijft kiesbaar
+                    cur = dl.lookup(cur) or cur
+                    opts = [v for v in dl.options if not field.length or len(v) <= field.length]
+                    opts += [cur] if cur and cur not in opts else []
+                    new_val = st.selectbox(field.alias, opts, index=opts.index(cur) if cur in opts else 0,
+                                           format_func=dl.label, key=f"edit_{col}")
+                elif field.widget == "select":
+                    opts = ([""] if field.nullable else []) + list(field.codes.values())
+                    idx = opts.index(cur) if cur in opts else 0
+                    new_val = st.selectbox(field.alias, opts, index=idx, key=f"edit_{col}")
+                elif field.widget == "int":
+                    new_val = st.number_input(field.alias, value=None if cur is None else int(cur), step=1, key=f"edit_{col}")
+                elif field.widget == "float":
+                    new_val = st.number_input(field.alias, value=None if cur is None else float(cur), key=f"edit_{col}")
+                elif field.widget == "date":
+                    new_val = st.date_input(field.alias, value=cur, format="DD-MM-YYYY", key=f"edit_{col}")
                 else:
-                    new_val = st.text_input(col, "" if val is None else str(val(val))
+                    new_val = st.text_input(field.alias, "" if cur is None else str(cur), max_chars=field.length, key=f"edit_{col}")
                 edited[col] = new_val
-
-            submittedtted = st.form_submit_button("Opslaan")
-                    if submitted:
-                # Zoek geometrie van het geselecteerde object (optioneel bij update)
-                selected_geom = None
-                for item in norm:
-                    if item["attrs"].get(id_field) == sel_id:
-                        selected_geom = item["geom"]
-                        break
-
-                feature_payload = {"attributes": edited}
-                # geometry meesturen is optioneel bij updateFeatures; we laten het achterwege tenzij je het expliciet wilt bijwerken.
-                # Als je geometrie toch wilt meesturen, haal comment weg:
-                # if selected_geom:
-                #     feature_payload["geometry"] = selected_geom
-
+                shown[col] = cur
+
+            submitted = st.form_submit_button("Opslaan")
+            if submitted:
+                # alleen gewijzigde velden controleren en versturen (plus object-ID)
+                edited = {col: v for col, v in edited.items() if not same_value(v, shown[col])}
+                if not edited:
+                    st.session_state["edit_mode"] = False
+                    st.toast("Geen wijzigingen om op te slaan.")
+                    rerun_script()
+                if schema.oid_field in current_attrs:
+                    edited[schema.oid_field] = current_attrs[schema.oid_field]
+                edited, errors = schema.validate(edited)
+                if errors:
+                    st.error("Ongeldige velden:\n\n" + "\n".join(f"- {msg}" for _, msg in errors))
+                    stop_script()
+
+                # wachtrij: direct lokaal zichtbaar, versturen (en conflictcontrole op de bewerkdatum) op de achtergrond;
+                # alleen attributen, de geometrie wordt hier niet bewerkt
+                edit_field = (agol.layer_info(layer_url).get("editFieldsInfo") or {}).get("editDateField")
                 try:
-                    # Gebruik jouw helper; update één feature
-                    res_upd_upd = agol.update_features(layer_url, [feature_payload])  # gebruikt utils_agol.update_features  # [1](https://ploegam-my.sharepoint.com/personal/s_adank_ploegam_nl/Documents/Microsoft%20Copilot%20Chat-bestanden/utils_agol%20(1).py).py)
-                    # Controle basisfeedback
-ack
-                    if isinstance(res_upd, dict)ict) and res_upd.get("updateResults"):
-                        ok = res_upd["updateResults"][0].get("et("success", False)
-                                if ok:
-                            st.success("Wijzigingen opgeslagen.")
-                            st.session_state["edit_mode"] = False
-                            st.rerun()
-                        else:
-                            st.error(f"Opslaan mislukt:ukt: {res_upd['updateResults'][0]}")
-                    else:
-                        st.success("Wijzigingenngen verzonden.")
-                        st.session_state["te["edit_mode"] = False
-                        st.rerun()
+                    outbox.update(edited, base_edit=current_attrs.get(edit_field) if edit_field else None)
                 except Exception as e:
-                    st.error(f"Opslaanlaan mislukt: {e}")
+                    st.error(f"Opslaan mislukt: {e}")
+                    stop_script()
+                apply_local_edit(sel_id, edited)
+                st.session_state["edit_mode"] = False
+                rerun_script()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# PRESTATIE-TRACE (opt-in) – spantree van deze rerun + metrics-export
+# ──────────────────────────────────────────────────────────────────────────────
+finish_trace()
+
+if DEBUG:
+    with st.expander(f"🐞 Prestatie-trace – {trace.seconds * 1000:.0f} ms", expanded=True):
+        st.code(format_tree(trace, min_ms=1.0), language=None)
+        steps = pd.DataFrame(
+            [{"Stap": name, "Aantal": n, "ms": round(t * 1000, 1)} for name, (n, t) in summarize(trace).items()],
+            columns=["Stap", "Aantal", "ms"],
+        )
+        st.dataframe(steps.sort_values("ms", ascending=False), use_container_width=True, hide_index=True)
+
+        st.markdown("**ArcGIS-verzoeken (sinds start van het proces)**")
+        st.dataframe(
+            pd.DataFrame([{"Operatie": op, **s} for op, s in sorted(agol.stats.items())]),
+            use_container_width=True, hide_index=True,
+        )
+        st.caption(f"Laagcache: {layer_cache.hits} hits, {layer_cache.misses} missers; "
+                   f"weergavecache: {view_cache.hits} hits, {view_cache.misses} missers")
+        st.download_button("⬇ Metrics (OpenMetrics)", metrics.openmetrics(), file_name="dashboard_metrics.txt",
+                           mime="application/openmetrics-text")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # EINDE
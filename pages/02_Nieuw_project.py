@@ -1,30 +1,31 @@
 import streamlit as st
 import pandas as pd
-from pathlib import Path
 import folium
 from streamlit_folium import st_folium
 from folium.plugins import Draw
-from utils_agol import AGOL, arcgis_polygon_from_geojson
+from utils_agol import get_client, arcgis_polygon_from_geojson
+from utils_cache import layer_cache
+from utils_extent import get_extent_loader
+from utils_outbox import get_edit_queue
+from utils_import import import_rows, read_rows
+from utils_schema import get_schema
+from utils_domains import apply_field_config, get_domain_store, get_remote_domains
 
 st.header("➕ Nieuw project invoeren")
 
 cfg = st.secrets["arcgis"]
-agol = AGOL(cfg["username"], cfg["password"], cfg.get("portal"))
+agol = get_client(cfg["username"], cfg["password"], cfg.get("portal"))
 projects_url = cfg["projects_layer_url"]
 relation_field = cfg["relation_key_field"]
 
-DOMAINS = Path("assets/domains")
-
-def load_csv(name):
-    p = DOMAINS / name
-    if not p.exists():
-        return []
+# keuzelijsten: één keer geparsed per proces, herladen als een bestand wijzigt;
+# met domains_fs_url komen lijsten en veldconfiguratie uit Beheer domeinen
+domains = get_domain_store()
+if cfg.get("domains_fs_url"):
     try:
-        df = pd.read_csv(p, sep=None, engine="python")
-        col = "waarde" if "waarde" in df.columns else df.columns[0]
-        return [""] + df[col].astype(str).tolist()
-    except:
-        return [""]
+        domains.attach(get_remote_domains(agol, cfg["domains_fs_url"]))
+    except Exception as e:
+        st.warning(f"Beheer domeinen niet bereikbaar, CSV-lijsten worden gebruikt: {e}")
 
 # ───────────────────────────────
 # VELDEN
@@ -43,21 +44,32 @@ FIELDS = [
     ("Geplande_start","Geplande start","date",False,None,None),
     ("Geplande_oplev","Geplande oplevering","date",False,None,None),
     ("Status","Status","text",True,20,["Onderhanden","Gereed"]),
-    ("MT_lid","MT lid","text",False,5, load_csv("Directie_MT.csv")),
-    ("PL","Projectleider","text",True,5, load_csv("Projectleiders.csv")),
-    ("WVB_1","Werkvoorbereider 1","text",False,5, load_csv("Werkvoorbereiders.csv")),
-    ("WVB_2","Werkvoorbereider 2","text",False,5, load_csv("Werkvoorbereiders.csv")),
-    ("Uitvoerder","Uitvoerder","text",False,5, load_csv("Uitvoerders.csv")),
-    ("KAM_mer","KAM medewerker","text",False,5, load_csv("KAM.csv")),
+    ("MT_lid","MT lid","text",False,5, domains.options("Directie_MT")),
+    ("PL","Projectleider","text",True,5, domains.options("Projectleiders")),
+    ("WVB_1","Werkvoorbereider 1","text",False,5, domains.options("Werkvoorbereiders")),
+    ("WVB_2","Werkvoorbereider 2","text",False,5, domains.options("Werkvoorbereiders")),
+    ("Uitvoerder","Uitvoerder","text",False,5, domains.options("Uitvoerders")),
+    ("KAM_mer","KAM medewerker","text",False,5, domains.options("KAM")),
     ("Opdrachtbonnen","Opdrachtbonnen","text",False,5,None),
     ("Emailadres","Emailadres","text",False,40,None),
     ("Financieel","Financieel","text",False,5,None),
     ("Directie_Combi","Directie Combinatie","text",False,5,None),
     ("Adres","Adres","text",True,256,None),
     ("Factuur_aan","Factuur aan","text",False,256,None),
-    ("Controller","Controller","text",False,5,load_csv("Controllers.csv")),
+    ("Controller","Controller","text",False,5,domains.options("Controllers")),
     ("Projectmap","Projectmap","text",True,256,None),
 ]
+# maxlen volgt de laagdefinitie (die bepaalt wat de laag opslaat, bv. 7-cijferige Mdw.-codes);
+# daarna de overrides uit FieldConfig (labels/verplicht/maxlen/bron)
+try:
+    layer_schema = get_schema(agol, projects_url, layer_cache)
+except Exception as e:
+    layer_schema = None
+    st.warning(f"Laagdefinitie niet beschikbaar, standaard veldlengtes worden gebruikt: {e}")
+if layer_schema is not None:
+    FIELDS = [(k, label, typ, req, getattr(layer_schema.get(k), "length", None) or maxlen, opts)
+              for k, label, typ, req, maxlen, opts in FIELDS]
+FIELDS = apply_field_config(FIELDS, domains)
 
 form_vals = {}
 cols = st.columns(2)
@@ -67,7 +79,13 @@ for idx, (key,label,typ,req,maxlen,opts) in enumerate(FIELDS):
     with col:
         label2 = label + (" *" if req else "")
         if opts:
-            form_vals[key] = st.selectbox(label2, options=opts, key=key)
+            dl = domains.for_field(key)
+            # alleen waarden die in het laagveld passen; de rest zou bij opslaan geweigerd worden
+            fit = [v for v in opts if not maxlen or len(v) <= maxlen]
+            form_vals[key] = st.selectbox(label2, options=fit, key=key,
+                                          format_func=dl.label if dl else str,
+                                          help=f"{len(opts) - len(fit)} waarde(n) met een code langer dan {maxlen} tekens "
+                                               "passen niet in dit veld." if len(fit) < len(opts) else None)
         else:
             if typ=="text":
                 form_vals[key] = st.text_input(label2, max_chars=maxlen, key=key)
@@ -93,6 +111,8 @@ if out.get("last_active_drawing"):
     geometry = arcgis_polygon_from_geojson(gj)
 
 # OPSLAAN
+# projectnummer als sleutel: een add zonder antwoord wordt eerst opgezocht in plaats van dubbel aangemaakt
+outbox = get_edit_queue(agol, projects_url, key_field=relation_field)
 if st.button("Opslaan"):
     missing = [label for (key,label,_,req,_,_) in FIELDS if req and not form_vals[key]]
     if missing:
@@ -102,13 +122,103 @@ if st.button("Opslaan"):
     attrs = {k:v for k,v in form_vals.items()}
     attrs[relation_field] = attrs["Projectnr"]
 
+    # controle tegen de laagdefinitie zelf (type, lengte, domein); datums -> epoch ms
+    try:
+        schema = get_schema(agol, projects_url, layer_cache)
+    except Exception as e:
+        st.error(f"Laagdefinitie niet beschikbaar: {e}")
+        st.stop()
+    attrs, errors = schema.validate(attrs)
+    if errors:
+        st.error("Ongeldige velden:\n\n" + "\n".join(f"- {msg}" for _, msg in errors))
+        st.stop()
+
     feature = {"attributes": attrs}
     if geometry:
         feature["geometry"] = geometry
 
     try:
-        resp = agol.add_features(projects_url, [feature])
-        st.success("Project opgeslagen.")
-        st.write(resp)
+        # wachtrij (SQLite in .cache): het project staat meteen in de lokale kopie van het dashboard
+        # (tijdelijk object-ID) en wordt op de achtergrond naar ArcGIS verstuurd
+        outbox.add(feature["attributes"], feature.get("geometry"))
+        layer_cache.invalidate(projects_url)
+        st.success("Project opgeslagen; het wordt op de achtergrond naar ArcGIS verstuurd.")
     except Exception as e:
         st.error(f"Fout bij opslaan: {e}")
+
+@st.fragment(run_every=3 if outbox.counts() else None)
+def outbox_status():
+    counts = outbox.counts()
+    busy = counts.get("pending", 0) + counts.get("sending", 0)
+    if busy:
+        st.caption(f"⏳ {busy} wijziging(en) onderweg naar ArcGIS"
+                   + (f" – niet bereikbaar, nieuwe poging volgt ({outbox.last_error})" if outbox.last_error else "…"))
+    for item in outbox.items():
+        label = item["attrs"].get("Projectnr") or item["oid"]
+        c_msg, c_retry, c_drop = st.columns([0.7, 0.15, 0.15])
+        if item["status"] == "conflict" and item["kind"] == "add":
+            c_msg.warning(f"**{label}** is mogelijk al aangemaakt (ArcGIS gaf geen antwoord). "
+                          "Controleer de laag; 'Opnieuw' verstuurt het project toch.")
+        elif item["status"] == "conflict":
+            c_msg.warning(f"**{label}** is intussen door iemand anders gewijzigd; de wijziging is niet opgeslagen.")
+        else:
+            c_msg.error(f"Opslaan van **{label}** mislukt: {item['error']}")
+        if c_retry.button("Opnieuw", key=f"outbox_retry_{item['id']}", use_container_width=True):
+            outbox.retry(item["id"], force=item["status"] == "conflict")
+            st.rerun(scope="fragment")
+        if c_drop.button("Verwerpen", key=f"outbox_drop_{item['id']}", use_container_width=True):
+            try:
+                outbox.discard(item["id"])
+            except Exception as e:
+                st.error(f"Verwerpen mislukt: {e}")
+            else:
+                st.rerun(scope="fragment")
+
+outbox_status()
+
+# ───────────────────────────────
+# BULK IMPORT (Excel/CSV)
+# ───────────────────────────────
+with st.expander("📥 Bulk import (Excel/CSV)", expanded=False):
+    st.caption(
+        "Eerste rij = kolomnamen (veldnaam of label uit het formulier). "
+        "Optioneel kolommen `lon`/`lat` voor een puntlocatie. "
+        "Alle rijen worden gecontroleerd; geldige rijen worden in batches opgeslagen."
+    )
+    upload = st.file_uploader("Bestand", type=["xlsx", "csv"], key="bulk_file")
+    dry_run = st.checkbox("Alleen controleren (niets opslaan)", value=True, key="bulk_dry_run")
+
+    if upload is not None and st.button("Import starten", key="bulk_start"):
+        status = st.empty()
+
+        def _progress(rep):
+            status.caption(f"{rep['rows']} rijen gelezen – {rep['valid']} geldig – {rep['imported']} opgeslagen")
+
+        def _prepare(attrs):
+            attrs[relation_field] = attrs.get("Projectnr")
+            return attrs
+
+        def _push(batch):
+            return agol.bulk_edits(projects_url, adds=batch)["adds"]
+
+        try:
+            report = import_rows(
+                read_rows(upload, upload.name), FIELDS,
+                push=None if dry_run else _push, prepare=_prepare, progress=_progress,
+                schema=get_schema(agol, projects_url, layer_cache), domains=domains,
+            )
+        except Exception as e:
+            st.error(f"Import afgebroken: {e}")
+            st.stop()
+
+        if report["imported"]:
+            layer_cache.invalidate(projects_url)
+            get_extent_loader(agol, projects_url, out_sr=4326).invalidate()
+
+        st.write(f"**{report['rows']}** rijen, **{report['valid']}** geldig, **{report['imported']}** opgeslagen, "
+                 f"**{len(report['errors'])}** fouten.")
+        if report["errors"]:
+            err_df = pd.DataFrame(report["errors"], columns=["Rij", "Veld", "Melding"])
+            st.dataframe(err_df, use_container_width=True, height=300)
+            st.download_button("Foutenrapport (CSV)", err_df.to_csv(index=False, sep=";").encode("utf-8-sig"),
+                               file_name="importfouten.csv", mime="text/csv")
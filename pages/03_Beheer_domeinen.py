@@ -1,31 +1,112 @@
+import pandas as pd
+import streamlit as st
+
+from utils_agol import get_client
+from utils_domains import get_domain_store, get_remote_domains
+
+st.header("🗂️ Beheer domeinen")
+
+cfg = st.secrets["arcgis"]
+agol = get_client(cfg["username"], cfg["password"], cfg.get("portal"))
+domains_fs = cfg.get("domains_fs_url")
+
+if not domains_fs:
+    st.info("Geen `domains_fs_url` ingesteld; de keuzelijsten komen uit `assets/domains/*.csv`.")
+    st.stop()
+
 # ───────────────────────────────────────────────
 # DOMAIN VALUES LAYER OR TABLE DETECTIE
+# (eerste layer/table = domeinwaarden, tweede table = FieldConfig)
 # ───────────────────────────────────────────────
+try:
+    remote = get_remote_domains(agol, domains_fs)
+except Exception as e:
+    st.error(f"Beheer domeinen FeatureServer niet bereikbaar: {e}")
+    st.stop()
 
-domain_layer_id = None
-fieldcfg_table_id = None
+domains = get_domain_store()
+domains.attach(remote)
+domain_url = remote.domain_store.layer_url
+fieldcfg_url = remote.fieldcfg_store.layer_url if remote.fieldcfg_store else None
 
-# 1) Kijk eerst naar layers (voor de zekerheid)
-if "layers" in svc and svc["layers"]:
-    domain_layer_id = svc["layers"][0]["id"]
+# ───────────────────────────────────────────────
+# SYNC STATUS
+# ───────────────────────────────────────────────
+c1, c2 = st.columns([0.8, 0.2])
+with c2:
+    if st.button("Nu synchroniseren", use_container_width=True):
+        remote.sync(force=True)
+remote.sync()
+with c1:
+    st.caption(
+        f"Domeinen: `{domain_url}`  \n"
+        f"FieldConfig: `{fieldcfg_url or '–'}`  \n"
+        f"Versie: `{remote.version}`"
+    )
+if remote.error:
+    st.warning(f"Laatste synchronisatie mislukt, lokale kopie wordt gebruikt: {remote.error}")
 
-# 2) Als er geen layers zijn → gebruik de eerste TABLE als domeinwaarden
-if domain_layer_id is None:
-    if "tables" in svc and svc["tables"]:
-        domain_layer_id = svc["tables"][0]["id"]
-    else:
-        st.error("Geen layers of tables gevonden in deze FeatureServer.")
-        st.stop()
+# ───────────────────────────────────────────────
+# WAARDENLIJSTEN
+# ───────────────────────────────────────────────
+st.subheader("Waardenlijsten")
+lists = remote.lists()
+if not lists:
+    st.info("De domeintabel bevat (nog) geen lijsten; de CSV-bestanden blijven in gebruik.")
+else:
+    name = st.selectbox("Lijst", sorted(lists))
+    dl = lists[name]
+    st.dataframe(
+        pd.DataFrame({"Waarde": dl.values, "Naam": dl.names, "Mdw.": dl.codes}),
+        use_container_width=True, hide_index=True,
+    )
 
-# Bepaal domein-URL
-domain_url = domains_fs.rstrip("/") + f"/{domain_layer_id}"
+# ───────────────────────────────────────────────
+# DOMEINTABEL BEWERKEN
+# ───────────────────────────────────────────────
+st.subheader("Domeintabel bewerken")
+store = remote.domain_store
+rows = [f["attributes"] for f in store.features()]
+oid_field = store.oid_field
+df = pd.DataFrame(rows)
 
-# 3) FIELD CONFIG detectie (tabel 2 indien aanwezig)
-if "tables" in svc and len(svc["tables"]) > 1:
-    # tweede table = FieldConfig
-    fieldcfg_table_id = svc["tables"][1]["id"]
+st.data_editor(df, num_rows="dynamic", disabled=[oid_field],
+               use_container_width=True, hide_index=True, key="domain_editor")
 
-fieldcfg_url = (
-    domains_fs.rstrip("/") + f"/{fieldcfg_table_id}"
-    if fieldcfg_table_id is not None else None
-)
+if st.button("Wijzigingen opslaan"):
+    changes = st.session_state["domain_editor"]
+    # alleen gewijzigde cellen meesturen
+    updates = [{"attributes": {**vals, oid_field: int(df.iloc[int(i)][oid_field])}}
+               for i, vals in changes.get("edited_rows", {}).items()]
+    adds = [{"attributes": {k: v for k, v in row.items() if k != oid_field}}
+            for row in changes.get("added_rows", [])]
+    deletes = [int(df.iloc[i][oid_field]) for i in changes.get("deleted_rows", [])]
+
+    if not (updates or adds or deletes):
+        st.info("Geen wijzigingen.")
+    else:
+        try:
+            res = agol.bulk_edits(domain_url, adds=adds, updates=updates, deletes=deletes)
+            failed = [r for part in res.values() for r in part if not (r or {}).get("success")]
+            remote.sync(force=True)  # nieuwe versie voor alle sessies
+            if failed:
+                st.error(f"{len(failed)} wijziging(en) mislukt: {(failed[0] or {}).get('error')}")
+            else:
+                st.success("Domeinen opgeslagen.")
+                st.rerun()
+        except Exception as e:
+            st.error(f"Opslaan mislukt: {e}")
+
+# ───────────────────────────────────────────────
+# FIELDCONFIG
+# ───────────────────────────────────────────────
+if fieldcfg_url:
+    st.subheader("Veldconfiguratie (FieldConfig)")
+    fc = remote.field_config()
+    if fc:
+        st.dataframe(
+            pd.DataFrame([{"Veld": k, **v} for k, v in fc.items()]),
+            use_container_width=True, hide_index=True,
+        )
+    else:
+        st.info("FieldConfig-tabel is leeg of heeft geen kolom `veld`.")
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from utils_domains import DomainStore
+from utils_import import import_rows, validate_row
+from utils_schema import LayerSchema
+from utils_standin import FIELDS as LAYER_FIELDS, OID
+
+DOMAINS = DomainStore(Path(__file__).resolve().parents[1] / 'assets' / 'domains')
+# as in pages/02_Nieuw_project.py, before the layer lengths are applied
+FIELDS = [
+    ('Projectnr', 'Projectnummer', 'text', True, 10, None),
+    ('PL', 'Projectleider', 'text', True, 5, DOMAINS.options('Projectleiders')),
+]
+COLMAP = {'Projectnr': 'Projectnr', 'PL': 'PL'}
+
+
+def test_seven_digit_code_is_accepted():
+    attrs, errors = validate_row({'Projectnr': 'P1', 'PL': '1000439'}, FIELDS, COLMAP, DOMAINS)
+    assert errors == []
+    assert attrs['PL'] == '1000439'
+
+
+def test_name_is_stored_as_code():
+    attrs, errors = validate_row({'Projectnr': 'P1', 'PL': 'Johan Peters'}, FIELDS, COLMAP, DOMAINS)
+    assert errors == []
+    assert attrs['PL'] == '1000439'
+
+
+def test_unknown_person_is_rejected():
+    _, errors = validate_row({'Projectnr': 'P1', 'PL': 'Onbekend'}, FIELDS, COLMAP, DOMAINS)
+    assert [f for f, _ in errors] == ['PL']
+
+
+def test_import_with_layer_schema():
+    schema = LayerSchema({'objectIdField': OID, 'fields': LAYER_FIELDS})
+    pushed = []
+
+    def push(batch):
+        pushed.extend(batch)
+        return [{'success': True} for _ in batch]
+
+    rows = [(1, {'Projectnr': 'P1', 'PL': '1000439'}), (2, {'Projectnr': 'P2', 'PL': '01018'})]
+    report = import_rows(rows, FIELDS, push=push, schema=schema, domains=DOMAINS)
+    assert report['errors'] == []
+    assert [f['attributes']['PL'] for f in pushed] == ['1000439', '01018']
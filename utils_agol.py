@@ -1,38 +1,205 @@
-import requests, time, json
+import requests, time, json, threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from utils_pbf import decode_query
+from utils_table import FrameBuilder
+from utils_trace import metrics, span, submit
+
+try:
+    # parses the response bytes directly, ~2x faster than json.loads on query pages
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+FILTER_PARAMS = ('geometry', 'geometryType', 'inSR', 'spatialRel', 'distance', 'units', 'time')
+EDIT_CHUNK_ROWS = 1000            # applyEdits rows per request
+EDIT_CHUNK_BYTES = 2 * 1024 ** 2  # applyEdits JSON per request
+TOKEN_MINUTES = 60                # requested token lifetime
+TOKEN_REFRESH_MARGIN = 300        # renew this many seconds before the server-side expiry
+
+# Named query profiles: what a view needs from a layer.
+#   fields     '*' or a tuple of names ('@oid' = the layer's object id field)
+#   geometry   return geometry at all
+#   out_sr     output spatial reference (wkid)
+#   precision  geometryPrecision (decimals in out_sr units; 6 ~ 0.1 m in degrees)
+#   fmt        'json' or 'pbf' (decoded locally by utils_pbf)
+QUERY_PROFILES = {
+    # local copy / viewport tiles: everything the map and the table render
+    'full': {'fields': '*', 'geometry': True, 'out_sr': 4326, 'precision': 6, 'fmt': 'json'},
+    # table pages and aggregates: attributes only
+    'table': {'fields': '*', 'geometry': False, 'fmt': 'json'},
+    # one record for the detail panel / popup
+    'detail': {'fields': '*', 'geometry': False, 'fmt': 'json'},
+    # tooltip / labels only
+    'label': {'fields': ('@oid', 'Projectnr'), 'geometry': False, 'fmt': 'json'},
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(username, password, portal=None):
+    """
+    Process-wide AGOL client per (portal, username). Streamlit reruns and
+    sessions share one client, so the token and the connection pool are
+    reused instead of rebuilt per rerun.
+    """
+    portal = (portal or 'https://www.arcgis.com').rstrip('/')
+    key = (portal, username)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = AGOL(username, password, portal)
+        elif client.password != password:
+            # rotated credentials: keep the pool, drop the old token
+            with client._tok_lock:
+                client.password = password
+                client._token = None
+        return client
+
 
 class AGOL:
-    def __init__(self, username, password, portal='https://www.arcgis.com'):
+    def __init__(self, username, password, portal='https://www.arcgis.com',
+                 pool_size=10, max_retries=3, backoff=0.5):
         self.username = username
         self.password = password
         self.portal = portal.rstrip('/')
         self._token = None
         self._tok_expires = 0
+        self._tok_lock = threading.Lock()
+        self._layer_info = {}
+
+        # one keep-alive session per client; pool sized for query_pages workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self.profiles = {name: dict(p) for name, p in QUERY_PROFILES.items()}
+
+    def set_query_format(self, fmt):
+        """Response format ('json' or 'pbf') for all query profiles of this client."""
+        if fmt not in ('json', 'pbf'):
+            raise ValueError(f'Unknown query format: {fmt}')
+        for p in self.profiles.values():
+            p['fmt'] = fmt
 
     # ----------------------------------------------------------------------
     # Token
     # ----------------------------------------------------------------------
     def _ensure_token(self):
-        t = int(time.time())
-        if self._token and t < self._tok_expires - 60:
+        if self._token and time.time() < self._tok_expires - TOKEN_REFRESH_MARGIN:
+            return self._token
+
+        # single-flight: concurrent callers wait for one refresh instead of each
+        # requesting their own token
+        with self._tok_lock:
+            if self._token and time.time() < self._tok_expires - TOKEN_REFRESH_MARGIN:
+                return self._token
+
+            url = self.portal + '/sharing/rest/generateToken'
+            data = {
+                'f': 'json',
+                'username': self.username,
+                'password': self.password,
+                'referer': 'https://www.arcgis.com',
+                'expiration': TOKEN_MINUTES
+            }
+            t = time.time()
+            with span('agol.token'):
+                js = self._request('POST', url, idempotent=True, data=data, timeout=30)
+            metrics.inc('agol_token_refreshes', doc='Tokens requested from generateToken')
+            if 'token' not in js:
+                raise RuntimeError(js)
+            # 'expires' is epoch milliseconds
+            expires = js.get('expires')
+            self._tok_expires = expires / 1000.0 if expires else t + TOKEN_MINUTES * 60
+            self._token = js['token']
+
             return self._token
 
-        url = self.portal + '/sharing/rest/generateToken'
-        data = {
-            'f': 'json',
-            'username': self.username,
-            'password': self.password,
-            'referer': 'https://www.arcgis.com',
-            'expiration': 60
-        }
-        r = requests.post(url, data=data, timeout=30)
-        r.raise_for_status()
-        js = r.json()
-        if 'token' not in js:
-            raise RuntimeError(js)
-        self._token = js['token']
-        self._tok_expires = t + 3600
-
-        return self._token
+    # ----------------------------------------------------------------------
+    # HTTP (pooled session, retries, timing)
+    # ----------------------------------------------------------------------
+    def _request(self, method, url, idempotent=False, raw=False, **kw):
+        """
+        Send one request over the pooled session and return the decoded JSON
+        (with raw=True: the body bytes, unless the service answered in JSON).
+        429/5xx responses and connection errors are retried with exponential
+        backoff (honouring Retry-After), but only for idempotent calls.
+        """
+        retries = self.max_retries if idempotent else 0
+        attempt = 0
+        op = _op(url)
+        while True:
+            t0 = time.perf_counter()
+            err = None
+            with span('agol.http', op=op, attempt=attempt) as s:
+                try:
+                    r = self.session.request(method, url, **kw)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    r, err = None, e
+                nbytes = len(r.content) if r is not None else 0
+                if s is not None:
+                    s.attrs.update(status=r.status_code if r is not None else type(err).__name__, bytes=nbytes)
+            elapsed = time.perf_counter() - t0
+            status = r.status_code if r is not None else None
+            self._record(op, elapsed, nbytes, attempt, status)
+
+            js = None
+            if r is not None and status < 400:
+                if raw and 'json' not in r.headers.get('Content-Type', ''):
+                    return r.content
+                with span('agol.decode', fmt='json', bytes=nbytes):
+                    t1 = time.perf_counter()
+                    js = json_loads(r.content)  # the body bytes as received, no str copy
+                    metrics.observe('agol_decode_seconds', time.perf_counter() - t1, fmt='json', op=op,
+                                    doc='Response decoding time')
+                # AGOL reports throttling/server errors also as HTTP 200 + {"error": {...}}
+                code = (js.get('error') or {}).get('code') if isinstance(js, dict) else None
+                if code in RETRY_STATUS:
+                    status = code
+
+            if attempt < retries and (err is not None or status in RETRY_STATUS):
+                wait = self.backoff * (2 ** attempt)
+                if r is not None and r.headers.get('Retry-After', '').isdigit():
+                    wait = max(wait, int(r.headers['Retry-After']))
+                time.sleep(wait)
+                attempt += 1
+                continue
+
+            if err is not None:
+                raise err
+            r.raise_for_status()
+            return js
+
+    def _record(self, op, elapsed, nbytes, attempt, status=None):
+        metrics.inc('agol_requests', op=op, status=status or 'error', doc='HTTP requests to ArcGIS')
+        metrics.observe('agol_request_seconds', elapsed, op=op, doc='HTTP request latency')
+        metrics.inc('agol_response_bytes', nbytes, op=op, doc='Response body bytes (decompressed)')
+        if attempt:
+            metrics.inc('agol_retries', op=op, doc='Retried requests')
+        with self._stats_lock:
+            s = self.stats.setdefault(op, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                           'bytes': 0, 'retries': 0})
+            s['count'] += 1
+            s['seconds'] += elapsed
+            s['max_seconds'] = max(s['max_seconds'], elapsed)
+            s['bytes'] += nbytes
+            if attempt:
+                s['retries'] += 1
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {}
 
     # ----------------------------------------------------------------------
     # Generic GET/POST
@@ -41,20 +208,22 @@ class AGOL:
         tok = self._ensure_token()
         p = params.copy() if params else {}
         p.update({'f': 'json', 'token': tok})
-        r = requests.get(url, params=p, timeout=60)
-        r.raise_for_status()
-        js = r.json()
+        js = self._request('GET', url, idempotent=True, params=p, timeout=60)
         if 'error' in js:
             raise RuntimeError(js['error'])
         return js
 
-    def post(self, url, data):
+    def post(self, url, data, idempotent=False, fmt='json'):
         tok = self._ensure_token()
         d = data.copy()
-        d.update({'f': 'json', 'token': tok})
-        r = requests.post(url, data=d, timeout=60)
-        r.raise_for_status()
-        js = r.json()
+        d.update({'f': fmt, 'token': tok})
+        js = self._request('POST', url, idempotent=idempotent, raw=fmt == 'pbf', data=d, timeout=60)
+        if isinstance(js, bytes):
+            with span('agol.decode', fmt='pbf', bytes=len(js)):
+                t1 = time.perf_counter()
+                res = decode_query(js)
+                metrics.observe('agol_decode_seconds', time.perf_counter() - t1, fmt='pbf', op=_op(url))
+            return res
         if 'error' in js:
             raise RuntimeError(js['error'])
         return js
@@ -62,20 +231,180 @@ class AGOL:
     # ----------------------------------------------------------------------
     # Query
     # ----------------------------------------------------------------------
-    def query(self, layer_url, where='1=1', out_fields='*', return_geometry=True, extra=None):
-        params = {
-            'where': where,
-            'outFields': out_fields,
-            'returnGeometry': 'true' if return_geometry else 'false'
-        }
+    def _select(self, layer_url, out_fields, return_geometry, profile):
+        """Query params (outFields, geometry, outSR, precision) and format for a profile."""
+        if profile is None:
+            return {'outFields': out_fields, 'returnGeometry': 'true' if return_geometry else 'false'}, 'json'
+        p = self.profiles[profile] if isinstance(profile, str) else profile
+        fields = p.get('fields', '*')
+        if fields != '*':
+            oid = self.layer_info(layer_url).get('objectIdField') or 'OBJECTID'
+            fields = ','.join(oid if f == '@oid' else f for f in fields)
+        params = {'outFields': fields, 'returnGeometry': 'true' if p.get('geometry') else 'false'}
+        if p.get('geometry'):
+            if p.get('out_sr') is not None:
+                params['outSR'] = p['out_sr']
+            if p.get('precision') is not None:
+                params['geometryPrecision'] = p['precision']
+        return params, p.get('fmt') or 'json'
+
+    def query(self, layer_url, where='1=1', out_fields='*', return_geometry=True, extra=None, profile=None):
+        """
+        Plain query. With a profile (name in self.profiles or a dict of the
+        same shape) fields, geometry, outSR, precision and format come from
+        the profile; out_fields/return_geometry are then ignored.
+        """
+        params, fmt = self._select(layer_url, out_fields, return_geometry, profile)
+        params['where'] = where
         if extra:
             params.update(extra)
+        if fmt != 'json':
+            return self.post(layer_url.rstrip('/') + '/query', params, idempotent=True, fmt=fmt)
         return self.get(layer_url.rstrip('/') + '/query', params)
 
+    def get_feature(self, layer_url, oid, extra=None, profile='detail'):
+        """One feature by object id (single-id query), or None."""
+        params = dict(extra or {})
+        params['objectIds'] = oid
+        feats = self.query(layer_url, extra=params, profile=profile).get('features') or []
+        return feats[0] if feats else None
+
+    def count(self, layer_url, where='1=1', extra=None):
+        """Number of matching features (returnCountOnly)."""
+        params = {'where': where, 'returnCountOnly': 'true'}
+        if extra:
+            params.update(extra)
+        js = self.post(layer_url.rstrip('/') + '/query', params, idempotent=True)
+        return int(js.get('count') or 0)
+
+    def statistics(self, layer_url, stats, group_by=None, where='1=1', order_by=None):
+        """
+        Server-side aggregation (outStatistics). stats is a list of
+        {'statisticType', 'onStatisticField', 'outStatisticFieldName'};
+        returns one attribute dict per group (one row without group_by).
+        """
+        params = {'where': where, 'outStatistics': json.dumps(stats), 'returnGeometry': 'false'}
+        if group_by:
+            params['groupByFieldsForStatistics'] = ','.join(group_by)
+        if order_by:
+            params['orderByFields'] = order_by
+        js = self.post(layer_url.rstrip('/') + '/query', params, idempotent=True)
+        return [f.get('attributes', {}) for f in js.get('features', [])]
+
+    def extent(self, layer_url, where='1=1', out_sr=4326):
+        """Extent of the matching features (returnExtentOnly) as {xmin, ymin, xmax, ymax}."""
+        params = {'where': where, 'returnExtentOnly': 'true', 'outSR': out_sr}
+        js = self.post(layer_url.rstrip('/') + '/query', params, idempotent=True)
+        return js.get('extent') or {}
+
+    # ----------------------------------------------------------------------
+    # Paged query (maxRecordCount aware)
+    # ----------------------------------------------------------------------
+    def layer_info(self, layer_url, refresh=False):
+        """Layer metadata (fields, maxRecordCount, ...), cached per client."""
+        key = layer_url.rstrip('/')
+        if refresh or key not in self._layer_info:
+            self._layer_info[key] = self.get(key)
+        return self._layer_info[key]
+
+    def query_ids(self, layer_url, where='1=1', extra=None):
+        """Return (objectIdFieldName, sorted object ids)."""
+        params = {'where': where, 'returnIdsOnly': 'true'}
+        if extra:
+            params.update(extra)
+        js = self.post(layer_url.rstrip('/') + '/query', params, idempotent=True)
+        oid_field = js.get('objectIdFieldName') or 'OBJECTID'
+        return oid_field, sorted(js.get('objectIds') or [])
+
+    def _query_oids(self, layer_url, oid_field, oids, out_fields, return_geometry, extra, profile=None):
+        params, fmt = self._select(layer_url, out_fields, return_geometry, profile)
+        params['objectIds'] = ','.join(str(i) for i in oids)
+        if extra:
+            params.update(extra)
+        js = self.post(layer_url.rstrip('/') + '/query', params, idempotent=True, fmt=fmt)
+        feats = js.get('features', [])
+
+        # service may cut off below maxRecordCount (e.g. heavy geometry): fetch the rest
+        if js.get('exceededTransferLimit'):
+            got = {f.get('attributes', {}).get(oid_field) for f in feats}
+            rest = [i for i in oids if i not in got]
+            if rest and len(rest) < len(oids):
+                feats += self._query_oids(layer_url, oid_field, rest, out_fields, return_geometry, extra, profile)
+            elif rest:
+                raise RuntimeError(f'exceededTransferLimit without progress ({len(rest)} objects left)')
+        return feats
+
+    def query_pages(self, layer_url, where='1=1', out_fields='*', return_geometry=True,
+                    extra=None, page_size=None, max_workers=4, profile=None):
+        """
+        Yield all features in pages of at most maxRecordCount, in object id
+        order. Pages are fetched concurrently on a bounded thread pool, so the
+        caller can start on the first page before the last one has arrived.
+        """
+        info = self.layer_info(layer_url)
+        limit = info.get('maxRecordCount') or 1000
+        size = min(page_size, limit) if page_size else limit
+
+        # filter params select the ids; the pages themselves are fetched by objectIds
+        extra = extra or {}
+        filt = {k: v for k, v in extra.items() if k in FILTER_PARAMS}
+        out = {k: v for k, v in extra.items() if k not in FILTER_PARAMS}
+
+        oid_field, oids = self.query_ids(layer_url, where, filt)
+        pages = [oids[i:i + size] for i in range(0, len(oids), size)]
+        if not pages:
+            return
+
+        def fetch(chunk):
+            feats = self._query_oids(layer_url, oid_field, chunk, out_fields, return_geometry, out, profile)
+            feats.sort(key=lambda f: f.get('attributes', {}).get(oid_field) or 0)
+            return feats
+
+        self._ensure_token()  # fetch token once, not per worker
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pages)))) as pool:
+            # keep at most max_workers pages in flight
+            ahead = max(1, max_workers)
+            futs = [submit(pool, fetch, p) for p in pages[:ahead]]
+            nxt = len(futs)
+            for i in range(len(pages)):
+                feats = futs[i].result()
+                if nxt < len(pages):
+                    futs.append(submit(pool, fetch, pages[nxt]))
+                    nxt += 1
+                futs[i] = None
+                yield feats
+
+    def query_all(self, layer_url, where='1=1', out_fields='*', return_geometry=True,
+                  extra=None, page_size=None, max_workers=4, profile=None):
+        """Like query(), but complete (all pages), in object id order."""
+        feats = []
+        for page in self.query_pages(layer_url, where, out_fields, return_geometry,
+                                     extra, page_size, max_workers, profile):
+            feats.extend(page)
+        return {'features': feats}
+
+    def query_frame(self, layer_url, where='1=1', out_fields='*', return_geometry=True,
+                    extra=None, page_size=None, max_workers=4, profile=None):
+        """
+        Like query_all(), but straight into columns: (attribute DataFrame,
+        GeometryArray or None without geometry), rows in object id order.
+        Each page is added to the field columns and geometry arrays as it
+        arrives, while the next pages are still in flight (FrameBuilder).
+        """
+        params, _ = self._select(layer_url, out_fields, return_geometry, profile)
+        fields = [f['name'] for f in self.layer_info(layer_url).get('fields', [])] if out_fields == '*' else ()
+        frame = FrameBuilder(fields, params['returnGeometry'] == 'true')
+        for page in self.query_pages(layer_url, where, out_fields, return_geometry,
+                                     extra, page_size, max_workers, profile):
+            frame.add(page)
+        with span('agol.frame', rows=frame.rows):
+            return frame.frame()
+
     # ----------------------------------------------------------------------
     # Native ArcGIS REST applyEdits (preferred)
     # ----------------------------------------------------------------------
-    def apply_edits(self, layer_url, adds=None, updates=None, deletes=None):
+    def apply_edits(self, layer_url, adds=None, updates=None, deletes=None,
+                    rollback_on_failure=None, use_global_ids=None):
         payload = {}
         if adds:
             payload['adds'] = json.dumps(adds)
@@ -83,9 +412,70 @@ class AGOL:
             payload['updates'] = json.dumps(updates)
         if deletes:
             payload['deletes'] = deletes  # is a string "1,2,3"
+        if rollback_on_failure is not None:
+            payload['rollbackOnFailure'] = 'true' if rollback_on_failure else 'false'
+        if use_global_ids is not None:
+            payload['useGlobalIds'] = 'true' if use_global_ids else 'false'
 
         return self.post(layer_url.rstrip('/') + '/applyEdits', payload)
 
+    # ----------------------------------------------------------------------
+    # Bulk edits (chunked, concurrent applyEdits)
+    # ----------------------------------------------------------------------
+    def bulk_edits(self, layer_url, adds=None, updates=None, deletes=None,
+                   chunk_size=None, max_bytes=EDIT_CHUNK_BYTES, max_workers=4,
+                   rollback_on_failure=False, use_global_ids=False):
+        """
+        Apply any number of adds/updates/deletes through applyEdits in chunks
+        of at most chunk_size rows (default: the layer's maxRecordCount) and
+        max_bytes of JSON, sent concurrently.
+
+        Returns {'adds': [...], 'updates': [...], 'deletes': [...]}, each list
+        aligned with the caller's input rows; every entry is the service's
+        per-feature result ({'success', 'objectId', 'globalId', 'error'}).
+        A chunk that fails as a whole marks all its rows with that error.
+        rollback_on_failure applies per chunk, not across chunks.
+        """
+        if chunk_size is None:
+            chunk_size = min(self.layer_info(layer_url).get('maxRecordCount') or 1000, EDIT_CHUNK_ROWS)
+
+        jobs = []
+        for kind, rows in (('adds', adds or []), ('updates', updates or []), ('deletes', deletes or [])):
+            for start, chunk in _chunks(rows, chunk_size, max_bytes):
+                jobs.append((kind, start, chunk))
+
+        results = {'adds': [None] * len(adds or []),
+                   'updates': [None] * len(updates or []),
+                   'deletes': [None] * len(deletes or [])}
+        if not jobs:
+            return results
+
+        def send(job):
+            kind, start, chunk = job
+            kw = {'rollback_on_failure': rollback_on_failure, 'use_global_ids': use_global_ids}
+            if kind == 'deletes':
+                kw['deletes'] = ','.join(str(i) for i in chunk)
+            else:
+                kw[kind] = chunk
+            return self.apply_edits(layer_url, **kw)
+
+        self._ensure_token()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+            futs = [(job, submit(pool, send, job)) for job in jobs]
+            for (kind, start, chunk), fut in futs:
+                try:
+                    res = fut.result().get(kind[:-1] + 'Results') or []
+                    err = None
+                except Exception as e:
+                    res, err = [], e
+                for i in range(len(chunk)):
+                    if i < len(res):
+                        results[kind][start + i] = res[i]
+                    else:
+                        msg = str(err) if err else 'no result returned for this row'
+                        results[kind][start + i] = {'success': False, 'error': {'description': msg}}
+        return results
+
     # ----------------------------------------------------------------------
     # Legacy wrappers (still compatible)
     # ----------------------------------------------------------------------
@@ -100,3 +490,71 @@ class AGOL:
     def delete_features(self, layer_url, where):
         return self.post(layer_url.rstrip('/') + '/deleteFeatures',
                          {'where': where})
+
+
+def _op(url):
+    """Last path segment of a REST url (query, applyEdits, generateToken, ...); 'layer' for layer metadata."""
+    op = url.rstrip('/').rsplit('/', 1)[-1]
+    return 'layer' if op.isdigit() else op
+
+
+def _chunks(rows, size, max_bytes):
+    """Yield (start, rows) chunks limited by row count and JSON size."""
+    start, cur, cur_bytes = 0, [], 0
+    for i, row in enumerate(rows):
+        n = len(json.dumps(row)) + 1
+        if cur and (len(cur) >= size or cur_bytes + n > max_bytes):
+            yield start, cur
+            start, cur, cur_bytes = i, [], 0
+        cur.append(row)
+        cur_bytes += n
+    if cur:
+        yield start, cur
+
+
+# --------------------------------------------------------------------------
+# Spatial filter
+# --------------------------------------------------------------------------
+def envelope_filter(xmin, ymin, xmax, ymax, wkid=4326, spatial_rel='esriSpatialRelIntersects'):
+    """query() extra params for an envelope filter (geometry/geometryType/spatialRel)."""
+    return {
+        'geometry': json.dumps({'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax,
+                                'spatialReference': {'wkid': wkid}}),
+        'geometryType': 'esriGeometryEnvelope',
+        'inSR': wkid,
+        'spatialRel': spatial_rel
+    }
+
+
+# --------------------------------------------------------------------------
+# GeoJSON -> ESRI JSON
+# --------------------------------------------------------------------------
+def _ring_area2(ring):
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:]))
+
+
+def arcgis_polygon_from_geojson(gj, wkid=4326):
+    """Convert a GeoJSON geometry (as drawn with folium Draw) to ESRI JSON."""
+    if not gj:
+        return None
+    typ = gj.get('type')
+    coords = gj.get('coordinates')
+    sr = {'wkid': wkid}
+    if typ == 'Point':
+        return {'x': coords[0], 'y': coords[1], 'spatialReference': sr}
+    if typ == 'LineString':
+        return {'paths': [[list(p[:2]) for p in coords]], 'spatialReference': sr}
+    if typ == 'MultiLineString':
+        return {'paths': [[list(p[:2]) for p in line] for line in coords], 'spatialReference': sr}
+    if typ in ('Polygon', 'MultiPolygon'):
+        polys = [coords] if typ == 'Polygon' else coords
+        rings = []
+        for poly in polys:
+            for i, ring in enumerate(poly):
+                ring = [list(p[:2]) for p in ring]
+                # ESRI: outer ring clockwise (negative area), holes counter-clockwise
+                if (_ring_area2(ring) > 0) == (i == 0):
+                    ring.reverse()
+                rings.append(ring)
+        return {'rings': rings, 'spatialReference': sr}
+    return None
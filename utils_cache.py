@@ -0,0 +1,77 @@
+import threading, time
+from collections import OrderedDict
+
+from utils_trace import metrics, span
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with a time-to-live, shared by all sessions
+    of the process. Keys are (layer_url, where, stage) so everything derived
+    from one layer read can be invalidated together after an edit. Stages
+    computed per view or per filter go in a separate `derived` cache, so
+    however many of them pile up they never evict the layer reads; it is
+    invalidated together with this one.
+    """
+
+    def __init__(self, maxsize=64, ttl=300, derived=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.derived = derived
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, layer_url, where, stage, compute):
+        """Return the cached value for the key, or compute() and store it."""
+        key = (layer_url.rstrip('/'), where, stage)
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                metrics.inc('layer_cache_hits', stage=_stage_name(stage), doc='Layer cache hits')
+                return entry[1]
+            self.misses += 1
+        metrics.inc('layer_cache_misses', stage=_stage_name(stage), doc='Layer cache misses (computed)')
+
+        with span('cache.compute', stage=stage):
+            value = compute()
+
+        with self._lock:
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, layer_url=None, where=None, keep=()):
+        """
+        Drop all stages for a layer (optionally one where clause); no args =
+        everything. Stages named in keep stay, e.g. the features themselves
+        after they were patched in place.
+        """
+        if self.derived is not None:
+            self.derived.invalidate(layer_url, where, keep)
+        with self._lock:
+            if layer_url is None:
+                self._data.clear()
+                return
+            url = layer_url.rstrip('/')
+            for key in [k for k in self._data
+                        if k[0] == url and (where is None or k[1] == where) and k[2] not in keep]:
+                del self._data[key]
+
+
+def _stage_name(stage):
+    # per-filter/per-page stages ('norm_<key>', 'page_...') share one metrics label
+    return stage.split('_', 1)[0]
+
+
+# per-view/per-filter stages (filtered geometry, GeoJSON per zoom, hit-test
+# index, records, remote pages and counts)
+view_cache = TTLCache()
+# process-wide cache for layer reads (features, DataFrame, geometry, bounds)
+layer_cache = TTLCache(derived=view_cache)
@@ -0,0 +1,403 @@
+import csv, threading, time
+from pathlib import Path
+
+from utils_featurestore import CACHE_DIR, get_store
+
+DOMAINS_DIR = Path('assets/domains')
+DOMAINS_DB = CACHE_DIR / 'domains.sqlite'
+
+# form/layer field -> domain list (file stem under assets/domains)
+FIELD_DOMAINS = {
+    'MT_lid': 'Directie_MT',
+    'PL': 'Projectleiders',
+    'WVB_1': 'Werkvoorbereiders',
+    'WVB_2': 'Werkvoorbereiders',
+    'Uitvoerder': 'Uitvoerders',
+    'KAM_mer': 'KAM',
+    'Controller': 'Controllers',
+}
+
+
+# --------------------------------------------------------------------------
+# One lookup list
+# --------------------------------------------------------------------------
+class DomainList:
+    """
+    Values of one domain file as parallel tuples (value, name, code), with
+    dict indexes by value, Mdw. and lowercased Naam built once on load, so
+    label(), `in` and lookup() do not scan the list.
+    """
+
+    def __init__(self, values, names=None, codes=None):
+        self.values = tuple(values)
+        self.names = tuple(names) if names is not None else self.values
+        self.codes = tuple(codes) if codes is not None else ('',) * len(self.values)
+        self.options = ('',) + self.values
+        self._index = {v: i for i, v in reversed(list(enumerate(self.values)))}
+        self._by_code = {c: i for i, c in enumerate(self.codes) if c}
+        self._by_name = {n.lower(): i for i, n in reversed(list(enumerate(self.names))) if n}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self._index
+
+    def label(self, value):
+        """'Naam (Mdw.)' for display; the value itself when unknown."""
+        i = self._index.get(value)
+        if i is None:
+            return value
+        return f'{self.names[i]} ({self.codes[i]})' if self.codes[i] else self.names[i]
+
+    def by_code(self, code):
+        i = self._by_code.get(code)
+        return None if i is None else self.values[i]
+
+    def lookup(self, value):
+        """
+        List value for a stored or typed value: the value itself, a Mdw.
+        code, or a full Naam (older records); None when it matches nothing.
+        """
+        s = '' if value is None else str(value).strip()
+        if not s:
+            return None
+        if s in self._index:
+            return s
+        found = self.by_code(s)
+        if found is None:
+            i = self._by_name.get(s.lower())
+            found = None if i is None else self.values[i]
+        return found
+
+
+def read_domain_file(path):
+    """
+    Parse one domain CSV (semicolon or comma, BOM allowed). The value column
+    is `waarde` when present, else `Mdw.` (the employee code the person
+    fields of the layer hold), else the first column; Naam is only the label.
+    Codes are 5 or 7 digits; the forms only offer the ones that fit the
+    field length in the layer definition.
+    """
+    with open(path, encoding='utf-8-sig', newline='') as fh:
+        header_line = fh.readline()
+        delim = ';' if header_line.count(';') >= header_line.count(',') else ','
+        header = next(csv.reader([header_line], delimiter=delim), [])
+        header = [h.strip() for h in header]
+        if not header:
+            return DomainList(())
+        ccol = header.index('Mdw.') if 'Mdw.' in header else None
+        vcol = header.index('waarde') if 'waarde' in header else (ccol if ccol is not None else 0)
+        ncol = header.index('Naam') if 'Naam' in header else vcol
+        values, names, codes = [], [], []
+        for row in csv.reader(fh, delimiter=delim):
+            if len(row) <= vcol or not row[vcol].strip():
+                continue
+            values.append(row[vcol].strip())
+            names.append(row[ncol].strip() if len(row) > ncol else '')
+            codes.append(row[ccol].strip() if ccol is not None and len(row) > ccol else '')
+    return DomainList(values, names, codes)
+
+
+# --------------------------------------------------------------------------
+# Store (all lists, reloaded when a file changes)
+# --------------------------------------------------------------------------
+class DomainStore:
+    """
+    All domain lists of a directory, parsed once. Files are stat()ed at most
+    every `check_interval` seconds; a changed mtime/size reloads only that
+    file, a new file is picked up, a removed one becomes an empty list.
+    """
+
+    def __init__(self, root=DOMAINS_DIR, check_interval=2.0):
+        self.root = Path(root)
+        self.check_interval = check_interval
+        self._lists = {}  # stem -> DomainList
+        self._stamps = {}  # stem -> (mtime_ns, size)
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.remote = None
+        self.refresh(force=True)
+
+    def attach(self, remote):
+        """Prefer lists and field configuration from a RemoteDomains; CSVs stay the fallback."""
+        self.remote = remote
+
+    def refresh(self, force=False):
+        now = time.time()
+        with self._lock:
+            if not force and now - self._checked < self.check_interval:
+                return
+            self._checked = now
+            seen = set()
+            for path in sorted(self.root.glob('*.csv')) if self.root.exists() else ():
+                stem = path.stem
+                seen.add(stem)
+                st = path.stat()
+                stamp = (st.st_mtime_ns, st.st_size)
+                if self._stamps.get(stem) == stamp:
+                    continue
+                try:
+                    self._lists[stem] = read_domain_file(path)
+                except (OSError, UnicodeDecodeError, csv.Error):
+                    self._lists[stem] = DomainList(())
+                self._stamps[stem] = stamp
+                self.reloads += 1
+            for stem in set(self._lists) - seen:
+                del self._lists[stem]
+                del self._stamps[stem]
+
+    def get(self, name):
+        """DomainList by name / file stem (or file name); empty list when missing."""
+        stem = Path(name).stem
+        if self.remote is not None:
+            dl = self.remote.lists().get(stem)
+            if dl:
+                return dl
+        self.refresh()
+        return self._lists.get(stem) or DomainList(())
+
+    def options(self, name):
+        """Dropdown options: '' followed by the values."""
+        return self.get(name).options
+
+    def field_config(self):
+        return self.remote.field_config() if self.remote is not None else {}
+
+    def for_field(self, field):
+        """DomainList for a form/layer field, or None when the field has no list."""
+        name = (self.field_config().get(field) or {}).get('source') or FIELD_DOMAINS.get(field)
+        return None if name is None else self.get(name)
+
+
+# --------------------------------------------------------------------------
+# Remote domain + FieldConfig tables (Beheer domeinen FeatureServer)
+# --------------------------------------------------------------------------
+DOMAIN_COLUMNS = {
+    'list': ('domein', 'lijst', 'bron'),
+    'value': ('waarde', 'value', 'code'),
+    'name': ('naam', 'label', 'omschrijving'),
+    'code': ('mdw.', 'mdw', 'code'),
+    'order': ('volgorde', 'sortering'),
+    'active': ('actief',),
+}
+FIELDCFG_COLUMNS = {
+    'field': ('veld', 'veldnaam', 'field'),
+    'label': ('label', 'alias'),
+    'required': ('verplicht', 'required'),
+    'maxlen': ('maxlen', 'lengte'),
+    'source': ('dropdown_source', 'bron', 'domein'),
+}
+
+
+def discover_tables(agol, fs_url):
+    """
+    (domain_url, fieldcfg_url) of a Beheer domeinen FeatureServer: the first
+    layer (or table) holds the domain values, a second table the FieldConfig.
+    """
+    fs_url = fs_url.rstrip('/')
+    svc = agol.get(fs_url)
+    layers = svc.get('layers') or []
+    tables = svc.get('tables') or []
+    first = layers[0] if layers else (tables[0] if tables else None)
+    if first is None:
+        raise ValueError('Geen layers of tables gevonden in deze FeatureServer.')
+    cfg = tables[1] if len(tables) > 1 else None
+    return f"{fs_url}/{first['id']}", (f"{fs_url}/{cfg['id']}" if cfg else None)
+
+
+def _columns(attrs, spec):
+    lower = {k.lower(): k for k in attrs}
+    return {role: next((lower[c] for c in cands if c in lower), None) for role, cands in spec.items()}
+
+
+def _truthy(v):
+    if isinstance(v, str):
+        return v.strip().lower() in ('1', 'ja', 'j', 'true', 'yes', 'y', 'waar')
+    return bool(v)
+
+
+def _val(attrs, col, role):
+    return attrs.get(col[role]) if col[role] else None
+
+
+def _text(v):
+    if v is None:
+        return ''
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+def build_lists(features):
+    """Group domain-table rows into {list name: DomainList}, ordered by volgorde, then name."""
+    if not features:
+        return {}
+    col = _columns(features[0]['attributes'], DOMAIN_COLUMNS)
+    if col['list'] is None or col['value'] is None:
+        return {}
+    groups = {}
+    for f in features:
+        a = f['attributes']
+        active = _val(a, col, 'active')
+        if active is not None and not _truthy(active):
+            continue
+        value = _text(a.get(col['value']))
+        if not value:
+            continue
+        name = _text(_val(a, col, 'name')) or value
+        code = _text(a.get(col['code'])) if col['code'] and col['code'] != col['value'] else ''
+        order = _val(a, col, 'order')
+        groups.setdefault(_text(a.get(col['list'])), []).append(
+            (order if order is not None else float('inf'), name.lower(), value, name, code))
+    out = {}
+    for lst, rows in groups.items():
+        rows.sort(key=lambda r: r[:2])
+        out[Path(lst).stem] = DomainList([r[2] for r in rows], [r[3] for r in rows], [r[4] for r in rows])
+    return out
+
+
+def build_field_config(features):
+    """FieldConfig rows -> {field: {'label', 'required', 'maxlen', 'source'}} (None = keep form default)."""
+    if not features:
+        return {}
+    col = _columns(features[0]['attributes'], FIELDCFG_COLUMNS)
+    if col['field'] is None:
+        return {}
+    out = {}
+    for f in features:
+        a = f['attributes']
+        field = _text(a.get(col['field']))
+        if not field:
+            continue
+        required = _val(a, col, 'required')
+        maxlen = _val(a, col, 'maxlen')
+        out[field] = {
+            'label': _text(_val(a, col, 'label')) or None,
+            'required': None if required is None else _truthy(required),
+            'maxlen': int(maxlen) if maxlen not in (None, '') else None,
+            'source': Path(_text(_val(a, col, 'source'))).stem or None,
+        }
+    return out
+
+
+class RemoteDomains:
+    """
+    Domain values and FieldConfig from the Beheer domeinen FeatureServer,
+    kept in a local SQLite copy (FeatureStore) so a restart or an outage
+    still has the last version. sync() is a cheap lastEditDate check at most
+    every `max_age` seconds per process and an incremental pull when a table
+    changed; the derived lists are rebuilt only when the version moved, so
+    edits reach every session within max_age without a full table fetch per
+    page view. A failed sync is not retried within max_age either; until then
+    `error` stays set and the local copy is served.
+    """
+
+    def __init__(self, agol, domain_url, fieldcfg_url=None, db_path=DOMAINS_DB, max_age=30):
+        self.domain_store = get_store(agol, domain_url, db_path=db_path)
+        self.fieldcfg_store = get_store(agol, fieldcfg_url, db_path=db_path) if fieldcfg_url else None
+        self.max_age = max_age
+        self.version = None
+        self.error = None
+        self.synced_at = None
+        self.failed_at = None
+        self._lists = {}
+        self._fieldcfg = {}
+        self._lock = threading.Lock()
+
+    def _stores(self):
+        return [s for s in (self.domain_store, self.fieldcfg_store) if s is not None]
+
+    def sync(self, force=False):
+        """Refresh from the service when due; returns True when the derived data changed."""
+        with self._lock:
+            fetched = 0
+            if not force and self.failed_at and time.time() - self.failed_at < self.max_age:
+                return False  # back off: no retry cycle per call during an outage
+            try:
+                for store in self._stores():
+                    fetched += store.sync(max_age=0 if force else self.max_age)
+                self.error = self.failed_at = None
+            except Exception as e:  # offline: keep serving the local copy
+                self.error = str(e)
+                self.failed_at = time.time()
+            version = tuple(store.version for store in self._stores())
+            if not fetched and version == self.version:
+                return False
+            self._lists = build_lists(self.domain_store.features())
+            self._fieldcfg = build_field_config(self.fieldcfg_store.features()) if self.fieldcfg_store else {}
+            self.version = version
+            self.synced_at = time.time()
+            return True
+
+    def lists(self):
+        self.sync()
+        return self._lists
+
+    def field_config(self):
+        self.sync()
+        return self._fieldcfg
+
+
+_remotes = {}
+_remote_errors = {}  # key -> (time, error) of the last failed discovery
+_remotes_lock = threading.Lock()
+
+
+def get_remote_domains(agol, fs_url, max_age=30):
+    """
+    Process-wide RemoteDomains per Beheer domeinen FeatureServer. A failed
+    table discovery is remembered and re-raised for max_age seconds, so pages
+    that run this on every rerun do not wait for the service each time.
+    """
+    key = fs_url.rstrip('/')
+    with _remotes_lock:
+        if key not in _remotes:
+            failed = _remote_errors.get(key)
+            if failed and time.time() - failed[0] < max_age:
+                raise failed[1]
+            try:
+                domain_url, fieldcfg_url = discover_tables(agol, key)
+            except Exception as e:
+                _remote_errors[key] = (time.time(), e)
+                raise
+            _remote_errors.pop(key, None)
+            _remotes[key] = RemoteDomains(agol, domain_url, fieldcfg_url, max_age=max_age)
+        return _remotes[key]
+
+
+def apply_field_config(fields, store):
+    """
+    Form FIELDS tuples (name, label, type, required, maxlen, dropdown_source)
+    with the FieldConfig overrides of the store applied; a configured source
+    replaces the dropdown with that domain list.
+    """
+    cfg = store.field_config()
+    if not cfg:
+        return fields
+    out = []
+    for name, label, typ, req, maxlen, opts in fields:
+        c = cfg.get(name) or {}
+        out.append((
+            name,
+            c.get('label') or label,
+            typ,
+            req if c.get('required') is None else c['required'],
+            maxlen if c.get('maxlen') is None else c['maxlen'],
+            store.options(c['source']) if c.get('source') else opts,
+        ))
+    return out
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_domain_store(root=DOMAINS_DIR):
+    """Process-wide DomainStore per directory."""
+    key = str(Path(root).resolve())
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = DomainStore(root)
+        return _stores[key]
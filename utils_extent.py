@@ -0,0 +1,126 @@
+import math, threading, time
+
+from utils_agol import envelope_filter
+from utils_geo import GeometryArray
+
+
+class ExtentLoader:
+    """
+    Viewport-driven loading: the map extent (plus a buffer) is snapped to a
+    fixed grid of tiles of `tile_deg` degrees. Tiles that were fetched less
+    than `ttl` seconds ago are served from memory; the missing ones are
+    fetched with one envelope query over their bounding box. Features are
+    kept once per object id and referenced from every tile their bbox
+    touches. The query runs outside the lock; a result is only stored when
+    no clear or invalidate() happened while it was in flight.
+    """
+
+    def __init__(self, agol, layer_url, out_sr=4326, tile_deg=0.1, ttl=300, max_tiles=5000):
+        self.agol = agol
+        self.layer_url = layer_url.rstrip('/')
+        self.out_sr = out_sr
+        self.tile_deg = tile_deg
+        self.ttl = ttl
+        self.max_tiles = max_tiles
+        self._features = {}
+        self._tiles = {}  # (row, col) -> (fetched_at, set(oid))
+        self._gen = 0
+        self._epoch = 0  # bumped by every clear; results fetched before one are dropped
+        self._lock = threading.Lock()
+
+    def _tile_range(self, bounds, buffer):
+        min_lat, min_lon, max_lat, max_lon = bounds
+        blat = (max_lat - min_lat) * buffer
+        blon = (max_lon - min_lon) * buffer
+        d = self.tile_deg
+        return (math.floor((min_lat - blat) / d), math.floor((min_lon - blon) / d),
+                math.floor((max_lat + blat) / d), math.floor((max_lon + blon) / d))
+
+    def load(self, bounds, buffer=0.25, where='1=1'):
+        """
+        Features intersecting bounds (min_lat, min_lon, max_lat, max_lon)
+        grown by `buffer` (fraction of the view size). Returns (scope, features);
+        scope identifies the tile range and data generation, for use as a
+        cache key by the caller.
+        """
+        r0, c0, r1, c1 = self._tile_range(bounds, buffer)
+        tiles = [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+        fetched = None
+        while True:
+            with self._lock:
+                if fetched and fetched[0] == self._epoch:
+                    self._store(*fetched[1:])
+                    missing = []
+                else:  # first pass, or a clear dropped what was fetched
+                    now = time.time()
+                    missing = [t for t in tiles
+                               if t not in self._tiles or now - self._tiles[t][0] >= self.ttl]
+                if not missing:
+                    oids = set()
+                    for t in tiles:
+                        oids |= self._tiles[t][1]
+                    feats = [self._features[i] for i in sorted(oids) if i in self._features]
+                    return f'extent:{r0},{c0},{r1},{c1}:g{self._gen}', feats
+                if len(self._tiles) + len(missing) > self.max_tiles:
+                    # start over: the cleared tiles of this view are fetched again as well
+                    self._clear()
+                    missing = tiles
+                epoch = self._epoch
+            box, feats = self._fetch(missing, where)
+            fetched = (epoch, box, feats)
+
+    def _fetch(self, missing, where):
+        """(tile box, features) of one envelope query over the missing tiles."""
+        d = self.tile_deg
+        mr0 = min(t[0] for t in missing)
+        mc0 = min(t[1] for t in missing)
+        mr1 = max(t[0] for t in missing)
+        mc1 = max(t[1] for t in missing)
+        extra = envelope_filter(mc0 * d, mr0 * d, (mc1 + 1) * d, (mr1 + 1) * d)
+        extra['outSR'] = self.out_sr
+        res = self.agol.query_all(self.layer_url, where=where, extra=extra, profile='full')
+        return (mr0, mc0, mr1, mc1), res.get('features', [])
+
+    def _store(self, box, feats):
+        d = self.tile_deg
+        mr0, mc0, mr1, mc1 = box
+        # every tile in the fetched box is now fresh, including ones we already had
+        now = time.time()
+        box = {(r, c) for r in range(mr0, mr1 + 1) for c in range(mc0, mc1 + 1)}
+        for t in box:
+            self._tiles[t] = (now, set())
+
+        oid_field = self.agol.layer_info(self.layer_url).get('objectIdField') or 'OBJECTID'
+        bounds = GeometryArray.from_esri([f.get('geometry') for f in feats]).bounds()
+        for f, b in zip(feats, bounds):
+            oid = f['attributes'].get(oid_field)
+            self._features[oid] = f
+            if math.isnan(b[0]):
+                continue
+            for r in range(max(math.floor(b[0] / d), mr0), min(math.floor(b[2] / d), mr1) + 1):
+                for c in range(max(math.floor(b[1] / d), mc0), min(math.floor(b[3] / d), mc1) + 1):
+                    self._tiles[(r, c)][1].add(oid)
+        self._gen += 1
+
+    def _clear(self):
+        self._tiles.clear()
+        self._features.clear()
+        self._epoch += 1
+        self._gen += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+
+def get_extent_loader(agol, layer_url, out_sr=4326):
+    """Process-wide ExtentLoader per (layer, outSR)."""
+    key = (layer_url.rstrip('/'), out_sr)
+    with _loaders_lock:
+        if key not in _loaders:
+            _loaders[key] = ExtentLoader(agol, layer_url, out_sr)
+        return _loaders[key]
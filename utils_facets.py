@@ -0,0 +1,131 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils_table import sql_literal
+
+CATEGORICAL = ('Status', 'Soort', 'Bedrijf', 'PL')
+RANGES = ('Geplande_start', 'Geplande_oplev', 'Aanneemsom')
+EMPTY = ''  # facet value for empty cells
+
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    return int(POPCOUNT[bits].sum())
+
+
+# --------------------------------------------------------------------------
+# Bitmap index
+# --------------------------------------------------------------------------
+class FacetIndex:
+    """
+    Precomputed facet index over the attribute table: one packed bitmap
+    (np.packbits, 1 bit per row) per value of each categorical column, and a
+    sorted copy plus row order of each range column. Combining facets is a
+    handful of AND/OR operations on n/8 bytes; a range becomes a bitmap via
+    two searchsorted calls.
+
+    A selection is {column: [values]} for categorical columns and
+    {column: (lo, hi)} for ranges (inclusive; dates in epoch ms).
+    """
+
+    def __init__(self, df, categorical=CATEGORICAL, ranges=RANGES):
+        df = df.reset_index(drop=True)
+        self.n = len(df)
+        self.all = np.packbits(np.ones(self.n, dtype=bool))
+        self.values = {}  # column -> values, most frequent first
+        self.bitmaps = {}  # column -> {value: packed bitmap}
+        for col in categorical:
+            if col not in df.columns:
+                continue
+            s = df[col].astype(object).where(df[col].notna(), EMPTY).astype(str)
+            codes, uniques = pd.factorize(s)
+            freq = np.bincount(codes, minlength=len(uniques))
+            self.values[col] = [uniques[k] for k in np.argsort(-freq, kind='stable')]
+            self.bitmaps[col] = {uniques[k]: np.packbits(codes == k) for k in range(len(uniques))}
+
+        self.sorted = {}  # column -> (sorted values, row positions)
+        self.bounds = {}  # column -> (min, max)
+        for col in ranges:
+            if col not in df.columns:
+                continue
+            a = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+            order = np.flatnonzero(~np.isnan(a))
+            order = order[np.argsort(a[order], kind='stable')]
+            self.sorted[col] = (a[order], order)
+            if len(order):
+                self.bounds[col] = (float(a[order[0]]), float(a[order[-1]]))
+
+    def _range_bits(self, col, lo, hi):
+        vals, order = self.sorted[col]
+        i0 = np.searchsorted(vals, -np.inf if lo is None else lo, 'left')
+        i1 = np.searchsorted(vals, np.inf if hi is None else hi, 'right')
+        m = np.zeros(self.n, dtype=bool)
+        m[order[i0:i1]] = True
+        return np.packbits(m)
+
+    def bits(self, selection, skip=None):
+        """Packed bitmap of the rows matching all facets (except `skip`)."""
+        out = self.all.copy()
+        for col, sel in selection.items():
+            if col == skip:
+                continue
+            if col in self.bitmaps:
+                maps = self.bitmaps[col]
+                acc = np.zeros_like(out)
+                for v in sel:
+                    if v in maps:
+                        acc |= maps[v]
+                out &= acc
+            elif col in self.sorted:
+                out &= self._range_bits(col, *sel)
+        return out
+
+    def mask(self, selection):
+        """Boolean row mask for a selection (None when nothing is selected)."""
+        if not selection:
+            return None
+        return np.unpackbits(self.bits(selection), count=self.n).astype(bool)
+
+    def count(self, selection):
+        return popcount(self.bits(selection)) if selection else self.n
+
+    def counts(self, selection):
+        """
+        {column: {value: rows}} per categorical facet, each counted with all
+        other facets applied, so a facet shows what choosing a value would give.
+        """
+        out = {}
+        for col, maps in self.bitmaps.items():
+            base = self.bits(selection, skip=col)
+            out[col] = {v: popcount(base & bm) for v, bm in maps.items()}
+        return out
+
+
+def selection_key(selection):
+    return json.dumps(selection, sort_keys=True, default=str) if selection else ''
+
+
+def facet_where(selection, field_types):
+    """The same selection as a SQL where clause for the layer ('1=1' when empty)."""
+    parts = []
+    for col, sel in selection.items():
+        ftype = field_types.get(col)
+        if col in RANGES or isinstance(sel, tuple):
+            lo, hi = sel
+            if lo is not None:
+                parts.append(f'{col} >= {sql_literal(lo, ftype)}')
+            if hi is not None:
+                parts.append(f'{col} <= {sql_literal(hi, ftype)}')
+        else:
+            vals = [v for v in sel if v != EMPTY]
+            conds = []
+            if vals:
+                conds.append(f"{col} IN ({', '.join(sql_literal(v, ftype) for v in vals)})")
+            if EMPTY in sel:
+                conds.append(f'{col} IS NULL')
+            if conds:
+                parts.append('(' + ' OR '.join(conds) + ')')
+    return ' AND '.join(parts) or '1=1'
@@ -0,0 +1,260 @@
+import json, sqlite3, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils_agol import json_loads
+
+CACHE_DIR = Path('.cache')
+DEFAULT_DB = CACHE_DIR / 'features.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS features (
+    layer TEXT NOT NULL,
+    oid INTEGER NOT NULL,
+    attrs TEXT NOT NULL,
+    geom TEXT,
+    PRIMARY KEY (layer, oid)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    layer TEXT PRIMARY KEY,
+    oid_field TEXT,
+    edit_field TEXT,
+    last_edit INTEGER,
+    max_edit INTEGER,
+    checked_at REAL
+);
+"""
+
+
+class FeatureStore:
+    """
+    Local SQLite copy of one feature layer, keyed by object id.
+
+    The first sync() does a full paged pull; later syncs only compare the
+    layer's editingInfo.lastEditDate and, when it moved, fetch the rows whose
+    edit-date field is newer than the newest one we hold, plus the id list to
+    drop deleted rows. Layers without editor tracking fall back to a full pull
+    whenever lastEditDate changes.
+
+    Rows with a negative object id are local only (new objects waiting in
+    the outbox) and survive both kinds of sync; overlays registered with
+    add_overlay() are merged in again after every pull, so edits that have
+    not reached the service yet stay visible.
+    """
+
+    def __init__(self, agol, layer_url, out_sr=4326, db_path=DEFAULT_DB):
+        self.agol = agol
+        self.layer_url = layer_url.rstrip('/')
+        self.out_sr = out_sr
+        self.key = f'{self.layer_url}|{out_sr}'
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._failed = None  # (time, error) of the last failed check
+        self._overlays = []
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def add_overlay(self, fn):
+        """Register fn() -> (partial) features that are upserted after every pull (local edits not sent yet)."""
+        if fn not in self._overlays:
+            self._overlays.append(fn)
+
+    # ----------------------------------------------------------------------
+    # Sync
+    # ----------------------------------------------------------------------
+    def _state(self, con):
+        row = con.execute('SELECT oid_field, edit_field, last_edit, max_edit, checked_at '
+                          'FROM sync_state WHERE layer=?', (self.key,)).fetchone()
+        if not row:
+            return None
+        return dict(zip(('oid_field', 'edit_field', 'last_edit', 'max_edit', 'checked_at'), row))
+
+    def sync(self, max_age=30, progress=None):
+        """
+        Bring the local copy up to date. Returns the number of rows fetched.
+        Does nothing if the last check is younger than max_age seconds; a
+        failed check counts too and re-raises its error until then, so an
+        outage costs one retry cycle per max_age instead of one per call.
+        """
+        with self._lock:
+            if self._failed and time.time() - self._failed[0] < max_age:
+                raise self._failed[1]
+            with self._connect() as con:
+                state = self._state(con)
+            if state and time.time() - (state['checked_at'] or 0) < max_age:
+                return 0
+            try:
+                n = self._sync(state, progress)
+            except Exception as e:
+                self._failed = (time.time(), e)
+                raise
+            self._failed = None
+            return n
+
+    def _sync(self, state, progress):
+        info = self.agol.layer_info(self.layer_url, refresh=True)
+        last_edit = (info.get('editingInfo') or {}).get('lastEditDate')
+        edit_field = (info.get('editFieldsInfo') or {}).get('editDateField')
+
+        if state and last_edit is not None and last_edit == state['last_edit']:
+            with self._connect() as con:
+                con.execute('UPDATE sync_state SET checked_at=? WHERE layer=?', (time.time(), self.key))
+            return 0
+
+        if state and edit_field and state['max_edit'] is not None:
+            n = self._delta(state, edit_field, last_edit, progress)
+        else:
+            n = self._full(edit_field, last_edit, progress)
+        for fn in self._overlays:
+            self.upsert(fn())
+        return n
+
+    def _pull(self, where, progress):
+        extra = {'outSR': self.out_sr}
+        for page in self.agol.query_pages(self.layer_url, where=where, extra=extra, profile='full'):
+            if progress:
+                progress(len(page))
+            yield page
+
+    def _full(self, edit_field, last_edit, progress):
+        oid_field = self._oid_field()
+        n = 0
+        max_edit = None
+        with self._connect() as con:
+            con.execute('DELETE FROM features WHERE layer=? AND oid>=0', (self.key,))
+            for page in self._pull('1=1', progress):
+                self._write(con, oid_field, page)
+                n += len(page)
+                max_edit = _max_edit(page, edit_field, max_edit)
+            self._save_state(con, oid_field, edit_field, last_edit, max_edit)
+        return n
+
+    def _delta(self, state, edit_field, last_edit, progress):
+        oid_field = state['oid_field']
+        # small overlap: upserts are idempotent, missed edits are not
+        since = datetime.fromtimestamp(state['max_edit'] / 1000.0 - 1, tz=timezone.utc)
+        where = f"{edit_field} >= timestamp '{since:%Y-%m-%d %H:%M:%S}'"
+        n = 0
+        max_edit = state['max_edit']
+        with self._connect() as con:
+            for page in self._pull(where, progress):
+                self._write(con, oid_field, page)
+                n += len(page)
+                max_edit = _max_edit(page, edit_field, max_edit)
+
+            # deletes do not show up in an edit-date query
+            _, server_ids = self.agol.query_ids(self.layer_url)
+            local_ids = {r[0] for r in con.execute('SELECT oid FROM features WHERE layer=? AND oid>=0', (self.key,))}
+            gone = local_ids.difference(server_ids)
+            if gone:
+                con.executemany('DELETE FROM features WHERE layer=? AND oid=?',
+                                [(self.key, i) for i in gone])
+            self._save_state(con, oid_field, edit_field, last_edit, max_edit)
+        return n
+
+    def _oid_field(self):
+        info = self.agol.layer_info(self.layer_url)
+        if info.get('objectIdField'):
+            return info['objectIdField']
+        for f in info.get('fields', []):
+            if f.get('type') == 'esriFieldTypeOID':
+                return f['name']
+        return 'OBJECTID'
+
+    def _save_state(self, con, oid_field, edit_field, last_edit, max_edit):
+        con.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?, ?)',
+                    (self.key, oid_field, edit_field, last_edit, max_edit, time.time()))
+
+    def _write(self, con, oid_field, features):
+        con.executemany(
+            'INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)',
+            [(self.key, f['attributes'][oid_field], json.dumps(f.get('attributes', {})),
+              json.dumps(f['geometry']) if f.get('geometry') else None)
+             for f in features]
+        )
+
+    # ----------------------------------------------------------------------
+    # Read
+    # ----------------------------------------------------------------------
+    def features(self):
+        """All cached features in object id order, in query() response shape."""
+        with self._connect() as con:
+            rows = con.execute('SELECT attrs, geom FROM features WHERE layer=? ORDER BY oid',
+                               (self.key,)).fetchall()
+        return [{'attributes': json_loads(a), 'geometry': json_loads(g) if g else None}
+                for a, g in rows]
+
+    def get(self, oid):
+        """One cached feature by object id, or None."""
+        with self._connect() as con:
+            row = con.execute('SELECT attrs, geom FROM features WHERE layer=? AND oid=?',
+                              (self.key, oid)).fetchone()
+        if not row:
+            return None
+        return {'attributes': json_loads(row[0]), 'geometry': json_loads(row[1]) if row[1] else None}
+
+    @property
+    def version(self):
+        """(lastEditDate, newest edit date) of the local copy; changes whenever a sync brought edits."""
+        with self._connect() as con:
+            state = self._state(con)
+        return (state['last_edit'], state['max_edit']) if state else None
+
+    @property
+    def oid_field(self):
+        with self._connect() as con:
+            state = self._state(con)
+        return state['oid_field'] if state else self._oid_field()
+
+    # ----------------------------------------------------------------------
+    # Local write-through after our own edits
+    # ----------------------------------------------------------------------
+    def upsert(self, features):
+        """Merge (partial) features into the cache; attributes are merged per oid."""
+        oid_field = self.oid_field
+        with self._connect() as con:
+            merged = []
+            for f in features:
+                attrs = f.get('attributes', {})
+                oid = attrs.get(oid_field)
+                if oid is None:
+                    continue
+                row = con.execute('SELECT attrs, geom FROM features WHERE layer=? AND oid=?',
+                                  (self.key, oid)).fetchone()
+                old_attrs = json.loads(row[0]) if row else {}
+                old_geom = json.loads(row[1]) if row and row[1] else None
+                merged.append({'attributes': {**old_attrs, **attrs},
+                               'geometry': f.get('geometry') or old_geom})
+            self._write(con, oid_field, merged)
+
+    def delete(self, oids):
+        with self._connect() as con:
+            con.executemany('DELETE FROM features WHERE layer=? AND oid=?',
+                            [(self.key, i) for i in oids])
+
+
+def _max_edit(features, edit_field, current):
+    if not edit_field:
+        return current
+    vals = [f['attributes'].get(edit_field) for f in features]
+    vals = [v for v in vals if v is not None]
+    if current is not None:
+        vals.append(current)
+    return max(vals) if vals else None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(agol, layer_url, out_sr=4326, db_path=DEFAULT_DB):
+    """Process-wide FeatureStore per (layer, outSR, db)."""
+    key = (layer_url.rstrip('/'), out_sr, str(db_path))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = FeatureStore(agol, layer_url, out_sr, db_path)
+        return _stores[key]
@@ -0,0 +1,354 @@
+import math
+from itertools import chain
+
+import numpy as np
+
+EARTH_R = 6371000.0
+M_PER_DEG = math.pi * EARTH_R / 180.0
+
+NONE, POINT, POLYLINE, POLYGON = 0, 1, 2, 3
+TYPE_NAMES = {POINT: "point", POLYLINE: "polyline", POLYGON: "polygon"}
+
+
+# --------------------------------------------------------------------------
+# Columnar geometry (flat coordinate array + offsets)
+# --------------------------------------------------------------------------
+class GeometryArray:
+    """
+    All geometries of a layer in one contiguous (n_points, 2) array in
+    (lat, lon) order, with offsets per part and per feature:
+
+        points of part p     = xy[part_offsets[p]:part_offsets[p + 1]]
+        parts of feature i   = part_offsets[geom_offsets[i]:geom_offsets[i + 1]]
+
+    Axis swap, per-feature bounds, centers and the extent are single numpy
+    passes instead of Python loops over tuples.
+    """
+
+    def __init__(self, types, xy, part_offsets, geom_offsets):
+        self.types = types
+        self.xy = xy
+        self.part_offsets = part_offsets
+        self.geom_offsets = geom_offsets
+        # point offsets per feature
+        self.point_offsets = part_offsets[geom_offsets]
+        self.valid = np.diff(self.point_offsets) > 0
+
+    def __len__(self):
+        return len(self.types)
+
+    @classmethod
+    def from_esri(cls, geoms):
+        """Build from ESRI JSON geometries (x/y, paths or rings), lon/lat in."""
+        n = len(geoms)
+        types = np.zeros(n, dtype=np.int8)
+        n_parts = np.zeros(n, dtype=np.int64)
+        parts = []
+        for i, g in enumerate(geoms):
+            if not g:
+                continue
+            if g.get("x") is not None and g.get("y") is not None:
+                types[i] = POINT
+                parts.append(((g["x"], g["y"]),))
+                n_parts[i] = 1
+            elif g.get("paths"):
+                types[i] = POLYLINE
+                parts.extend(g["paths"])
+                n_parts[i] = len(g["paths"])
+            elif g.get("rings"):
+                types[i] = POLYGON
+                parts.extend(g["rings"])
+                n_parts[i] = len(g["rings"])
+
+        part_lens = np.fromiter((len(p) for p in parts), dtype=np.int64, count=len(parts))
+        flat = list(chain.from_iterable(parts))
+        if not flat:
+            xy = np.zeros((0, 2))
+        else:
+            try:
+                xy = np.array(flat, dtype=np.float64).reshape(len(flat), -1)
+            except ValueError:
+                # mixed z/m vertices
+                xy = np.array([v[:2] for v in flat], dtype=np.float64).reshape(len(flat), -1)
+            xy = np.ascontiguousarray(xy[:, 1::-1])
+
+        part_offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum(part_lens, out=part_offsets[1:])
+        geom_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(n_parts, out=geom_offsets[1:])
+        return cls(types, xy, part_offsets, geom_offsets)
+
+    @classmethod
+    def concat(cls, arrays):
+        """One array from several (e.g. one per query page), in order."""
+        arrays = list(arrays)
+        if len(arrays) == 1:
+            return arrays[0]
+        if not arrays:
+            return cls.from_esri([])
+        n_points = np.cumsum([0] + [len(a.xy) for a in arrays[:-1]])
+        n_parts = np.cumsum([0] + [len(a.part_offsets) - 1 for a in arrays[:-1]])
+        return cls(
+            np.concatenate([a.types for a in arrays]),
+            np.concatenate([a.xy for a in arrays]),
+            np.concatenate([[0]] + [a.part_offsets[1:] + k for a, k in zip(arrays, n_points)]),
+            np.concatenate([[0]] + [a.geom_offsets[1:] + k for a, k in zip(arrays, n_parts)]),
+        )
+
+    def bounds(self):
+        """(n, 4) array of (min_lat, min_lon, max_lat, max_lon); NaN for empty features."""
+        out = np.full((len(self), 4), np.nan)
+        if self.valid.any():
+            starts = self.point_offsets[:-1][self.valid]
+            out[self.valid, 0:2] = np.minimum.reduceat(self.xy, starts, axis=0)
+            out[self.valid, 2:4] = np.maximum.reduceat(self.xy, starts, axis=0)
+        return out
+
+    def centers(self, bounds=None):
+        """(n, 2) bbox centers (lat, lon)."""
+        b = self.bounds() if bounds is None else bounds
+        return (b[:, 0:2] + b[:, 2:4]) / 2.0
+
+    def extent(self):
+        """(min_lat, min_lon, max_lat, max_lon) over all features, or None."""
+        if not len(self.xy):
+            return None
+        lo = self.xy.min(axis=0)
+        hi = self.xy.max(axis=0)
+        return (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+
+    def struct(self, i):
+        """Feature i as dashboard struct {"type", "coords"} with [lat, lon] pairs."""
+        t = int(self.types[i])
+        if t == NONE or not self.valid[i]:
+            return None
+        po = self.part_offsets
+        parts = [self.xy[po[p]:po[p + 1]].tolist()
+                 for p in range(self.geom_offsets[i], self.geom_offsets[i + 1])]
+        return {"type": TYPE_NAMES[t], "coords": parts[0] if t == POINT else parts}
+
+
+def esri_to_geojson(geom):
+    """ESRI JSON geometry (lon/lat) -> GeoJSON geometry, or None."""
+    if not geom:
+        return None
+    if geom.get("x") is not None and geom.get("y") is not None:
+        return {"type": "Point", "coordinates": [geom["x"], geom["y"]]}
+    if geom.get("paths"):
+        return {"type": "MultiLineString", "coordinates": geom["paths"]}
+    if geom.get("rings"):
+        # all rings in one Polygon: Leaflet fills even-odd, so holes stay holes
+        return {"type": "Polygon", "coordinates": geom["rings"]}
+    return None
+
+
+# --------------------------------------------------------------------------
+# Zoom-dependent simplification (Douglas-Peucker)
+# --------------------------------------------------------------------------
+FULL_DETAIL_ZOOM = 14
+
+
+def fit_zoom(bounds, width, height, max_zoom=FULL_DETAIL_ZOOM):
+    """
+    Zoom level at which Leaflet's fitBounds shows bounds (min_lat, min_lon,
+    max_lat, max_lon) on a width x height pixel map, capped at max_zoom;
+    None without bounds.
+    """
+    if not bounds:
+        return None
+
+    def merc_y(lat):  # 0..1 over the Web Mercator world
+        s = math.sin(math.radians(max(-85.0511, min(85.0511, lat))))
+        return 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+    dx = (bounds[3] - bounds[1]) / 360.0
+    dy = abs(merc_y(bounds[0]) - merc_y(bounds[2]))
+    zooms = [math.log2(px / (256.0 * d)) for px, d in ((width, dx), (height, dy)) if d > 0]
+    if not zooms:
+        return max_zoom
+    return max(0, min(max_zoom, math.floor(min(zooms))))
+
+
+def tolerance_for_zoom(zoom, lat=52.0, pixels=1.0):
+    """Simplification tolerance in degrees: `pixels` screen pixels at this Web Mercator zoom."""
+    if zoom is None or zoom >= FULL_DETAIL_ZOOM:
+        return 0.0
+    m_per_px = 156543.03 * math.cos(math.radians(lat)) / (2 ** zoom)
+    return pixels * m_per_px / M_PER_DEG
+
+
+def simplify_coords(pts, tol):
+    """Douglas-Peucker on an (n, 2) array; keeps both end points."""
+    pts = np.asarray(pts, dtype=np.float64)
+    n = len(pts)
+    if tol <= 0 or n < 3:
+        return pts
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = pts[i], pts[j]
+        seg = pts[i + 1:j] - a
+        dx, dy = b - a
+        L = math.hypot(dx, dy)
+        if L == 0:
+            dist = np.hypot(seg[:, 0], seg[:, 1])
+        else:
+            dist = np.abs(dx * seg[:, 1] - dy * seg[:, 0]) / L
+        k = int(np.argmax(dist))
+        if dist[k] > tol:
+            mid = i + 1 + k
+            keep[mid] = True
+            stack.append((i, mid))
+            stack.append((mid, j))
+    return pts[keep]
+
+
+def simplify_esri(geom, tol):
+    """Simplified copy of an ESRI line/polygon geometry; points and tol=0 pass through."""
+    if not geom or tol <= 0:
+        return geom
+    if geom.get("paths"):
+        return {**geom, "paths": [simplify_coords(p, tol).tolist() for p in geom["paths"]]}
+    if geom.get("rings"):
+        rings = []
+        for r in geom["rings"]:
+            s = simplify_coords(r, tol)
+            # a ring needs 4 points (closed triangle); keep tiny rings as they are
+            rings.append(s.tolist() if len(s) >= 4 else r)
+        return {**geom, "rings": rings}
+    return geom
+
+
+# --------------------------------------------------------------------------
+# Hit testing (local equirectangular metres around the click)
+# --------------------------------------------------------------------------
+def _seg_dist(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    L = dx * dx + dy * dy
+    t = 0.0 if L == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / L))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+def _in_ring(px, py, ring):
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > py) != (yj > py) and px < (xj - xi) * (py - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def struct_distance_m(struct, lat, lon):
+    """
+    Distance in metres from (lat, lon) to a struct as built by the dashboard
+    ({"type": point|polyline|polygon, "coords": ...} in (lat, lon)).
+    0 when the point lies inside a polygon (even-odd rule, so holes count).
+    """
+    kx = math.cos(math.radians(lat)) * M_PER_DEG
+
+    def proj(part):
+        return [((plon - lon) * kx, (plat - lat) * M_PER_DEG) for plat, plon in part]
+
+    t = struct["type"]
+    if t == "point":
+        plat, plon = struct["coords"][0]
+        return math.hypot((plon - lon) * kx, (plat - lat) * M_PER_DEG)
+
+    parts = [proj(p) for p in struct["coords"]]
+    if t == "polygon":
+        inside = False
+        for ring in parts:
+            if _in_ring(0.0, 0.0, ring):
+                inside = not inside
+        if inside:
+            return 0.0
+
+    best = math.inf
+    for pts in parts:
+        if len(pts) == 1:
+            best = min(best, math.hypot(*pts[0]))
+        for (ax, ay), (bx, by) in zip(pts, pts[1:]):
+            best = min(best, _seg_dist(0.0, 0.0, ax, ay, bx, by))
+    return best
+
+
+class GridIndex:
+    """
+    Uniform grid over feature bounds (min_lat, min_lon, max_lat, max_lon).
+    Each feature is registered in every cell its bbox touches, so a lookup
+    only tests the few features around the click.
+    """
+
+    def __init__(self, bounds, extent=None, target_per_cell=4):
+        self.bounds = bounds
+        valid = [b for b in bounds if b]
+        if extent is None and valid:
+            extent = (min(b[0] for b in valid), min(b[1] for b in valid),
+                      max(b[2] for b in valid), max(b[3] for b in valid))
+        self.extent = extent or (0.0, 0.0, 0.0, 0.0)
+        n = max(1, int(math.sqrt(max(1, len(valid)) / target_per_cell)))
+        self.n = n
+        self.dlat = max((self.extent[2] - self.extent[0]) / n, 1e-9)
+        self.dlon = max((self.extent[3] - self.extent[1]) / n, 1e-9)
+        self.cells = {}
+        for i, b in enumerate(bounds):
+            if not b:
+                continue
+            r0, c0 = self._cell(b[0], b[1])
+            r1, c1 = self._cell(b[2], b[3])
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    self.cells.setdefault((r, c), []).append(i)
+
+    def _cell(self, lat, lon):
+        r = int((lat - self.extent[0]) / self.dlat)
+        c = int((lon - self.extent[1]) / self.dlon)
+        return min(max(r, 0), self.n - 1), min(max(c, 0), self.n - 1)
+
+    def candidates(self, lat, lon, tol_m=0.0):
+        """Indices whose bbox (grown by tol_m) contains the point."""
+        tlat = tol_m / M_PER_DEG
+        tlon = tol_m / (M_PER_DEG * max(math.cos(math.radians(lat)), 1e-6))
+        if (lat < self.extent[0] - tlat or lat > self.extent[2] + tlat
+                or lon < self.extent[1] - tlon or lon > self.extent[3] + tlon):
+            return []
+        r0, c0 = self._cell(lat - tlat, lon - tlon)
+        r1, c1 = self._cell(lat + tlat, lon + tlon)
+        seen = set()
+        out = []
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                for i in self.cells.get((r, c), ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    b = self.bounds[i]
+                    if b[0] - tlat <= lat <= b[2] + tlat and b[1] - tlon <= lon <= b[3] + tlon:
+                        out.append(i)
+        return out
+
+
+def hit_test(index, structs, lat, lon, tol_m=25.0):
+    """
+    Best hit for a click: points and lines within tol_m win over polygons
+    (they are drawn on top); among polygons that contain the click the one
+    with the smallest bbox wins, so a small project inside a large one stays
+    selectable. Returns an index or None.
+    """
+    best, best_key = None, None
+    for i in index.candidates(lat, lon, tol_m):
+        d = struct_distance_m(structs[i], lat, lon)
+        if d > tol_m:
+            continue
+        b = index.bounds[i]
+        key = (structs[i]["type"] == "polygon", d, (b[2] - b[0]) * (b[3] - b[1]))
+        if best_key is None or key < best_key:
+            best, best_key = i, key
+    return best
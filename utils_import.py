@@ -0,0 +1,216 @@
+import csv, io
+from datetime import date, datetime
+from pathlib import Path
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d')
+LON_COLUMNS = ('lon', 'lng', 'x', 'lengtegraad')
+LAT_COLUMNS = ('lat', 'y', 'breedtegraad')
+
+
+# --------------------------------------------------------------------------
+# Streaming readers
+# --------------------------------------------------------------------------
+def read_rows(fileobj, filename):
+    """
+    Yield (row_number, {header: value}) from an .xlsx or .csv file without
+    loading it whole: openpyxl in read-only mode for Excel, csv.reader for
+    CSV (delimiter sniffed from the first 8 KB, BOM stripped).
+    """
+    suffix = Path(filename).suffix.lower()
+    if suffix in ('.xlsx', '.xlsm'):
+        rows = _xlsx_rows(fileobj)
+    elif suffix in ('.csv', '.txt'):
+        rows = _csv_rows(fileobj)
+    else:
+        raise ValueError(f'Onbekend bestandstype: {suffix}')
+
+    header = None
+    for n, values in enumerate(rows, start=1):
+        if header is None:
+            header = [str(h).strip() if h is not None else '' for h in values]
+            continue
+        if not any(v not in (None, '') for v in values):
+            continue
+        yield n, dict(zip(header, values))
+
+
+def _xlsx_rows(fileobj):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for values in wb.worksheets[0].iter_rows(values_only=True):
+            yield values
+    finally:
+        wb.close()
+
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    sample = text.read(8192)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        text.detach()
+
+
+# --------------------------------------------------------------------------
+# Validation against the FIELDS spec
+# (name, label, type, required, maxlen, dropdown_source)
+# --------------------------------------------------------------------------
+def _column_map(fields, headers):
+    """Map file headers to field names (matches name or label, case-insensitive)."""
+    lookup = {}
+    for name, label, *_ in fields:
+        lookup[name.lower()] = name
+        lookup[label.lower()] = name
+    return {h: lookup[h.lower()] for h in headers if h and h.lower() in lookup}
+
+
+def _to_float(v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    s = str(v).strip().replace(' ', '')
+    if ',' in s and '.' in s:
+        s = s.replace('.', '').replace(',', '.')  # 1.234,56
+    elif ',' in s:
+        s = s.replace(',', '.')
+    return float(s)
+
+
+def _to_date(v):
+    if isinstance(v, datetime):
+        return v.strftime('%Y-%m-%d')
+    if isinstance(v, date):
+        return v.strftime('%Y-%m-%d')
+    s = str(v).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    raise ValueError(s)
+
+
+def validate_row(row, fields, colmap, domains=None):
+    """
+    Check one row against the field spec. Returns (attrs, errors) where
+    errors is a list of (field, message); all problems are reported. With a
+    DomainStore (utils_domains) a field with a domain list accepts its Mdw.
+    code or the full Naam, which is stored as the code; whether the code
+    fits the field is up to the layer schema (see import_rows).
+    """
+    vals = {colmap[h]: v for h, v in row.items() if h in colmap}
+    attrs, errors = {}, []
+    for name, label, typ, req, maxlen, opts in fields:
+        v = vals.get(name)
+        if isinstance(v, str):
+            v = v.strip()
+        if v is None or v == '':
+            if req:
+                errors.append((name, f'{label} is verplicht'))
+            continue
+        try:
+            if typ == 'float':
+                v = _to_float(v)
+            elif typ == 'date':
+                v = _to_date(v)
+            else:
+                v = str(v) if not isinstance(v, float) or not v.is_integer() else str(int(v))
+        except ValueError:
+            errors.append((name, f'{label}: ongeldige waarde {v!r} ({typ})'))
+            continue
+        dl = domains.for_field(name) if domains is not None and opts else None
+        if dl:
+            # the list decides; the code's length is checked against the layer (schema)
+            code = dl.lookup(v)
+            if code is None:
+                errors.append((name, f'{label}: {v!r} staat niet in de keuzelijst'))
+            else:
+                attrs[name] = code
+            continue
+        if maxlen and isinstance(v, str) and len(v) > maxlen:
+            errors.append((name, f'{label}: langer dan {maxlen} tekens'))
+            continue
+        if opts and v not in opts:
+            errors.append((name, f'{label}: {v!r} staat niet in de keuzelijst'))
+            continue
+        attrs[name] = v
+    return attrs, errors
+
+
+def _point(row):
+    keys = {k.lower(): k for k in row if k}
+    lon = next((row[keys[c]] for c in LON_COLUMNS if c in keys), None)
+    lat = next((row[keys[c]] for c in LAT_COLUMNS if c in keys), None)
+    if lon in (None, '') or lat in (None, ''):
+        return None
+    return {'x': _to_float(lon), 'y': _to_float(lat), 'spatialReference': {'wkid': 4326}}
+
+
+# --------------------------------------------------------------------------
+# Import
+# --------------------------------------------------------------------------
+def import_rows(rows, fields, push=None, batch_size=1000, prepare=None, progress=None, schema=None, domains=None):
+    """
+    Validate streamed rows and hand the valid ones to push(features) in
+    batches; push returns one result per feature (as AGOL.bulk_edits adds).
+    With push=None only validation runs. Memory stays flat: only one batch
+    and the error report are kept. With a LayerSchema (utils_schema) the
+    prepared attributes are also checked and coerced against the layer
+    itself, so type, length and domain errors show up before the upload.
+    `domains` is passed on to validate_row.
+
+    Returns {'rows', 'valid', 'imported', 'errors': [(row, field, message)]}.
+    """
+    report = {'rows': 0, 'valid': 0, 'imported': 0, 'errors': []}
+    batch, batch_rows = [], []
+    colmap = None
+
+    def flush():
+        if push and batch:
+            for n, res in zip(batch_rows, push(batch)):
+                if res and res.get('success'):
+                    report['imported'] += 1
+                else:
+                    err = (res or {}).get('error') or {}
+                    report['errors'].append((n, '', f"Service: {err.get('description') or err}"))
+        batch.clear()
+        batch_rows.clear()
+
+    for n, row in rows:
+        if colmap is None:
+            colmap = _column_map(fields, row.keys())
+        report['rows'] += 1
+        attrs, errors = validate_row(row, fields, colmap, domains)
+        try:
+            geom = _point(row)
+        except ValueError:
+            geom = None
+            errors.append(('', 'Ongeldige coördinaten'))
+        if prepare and not errors:
+            attrs = prepare(attrs)
+        if schema is not None and not errors:
+            attrs, errors = schema.validate(attrs)
+        if errors:
+            report['errors'].extend((n, f, msg) for f, msg in errors)
+            continue
+        report['valid'] += 1
+        feature = {'attributes': attrs}
+        if geom:
+            feature['geometry'] = geom
+        batch.append(feature)
+        batch_rows.append(n)
+        if len(batch) >= batch_size:
+            flush()
+        if progress and report['rows'] % batch_size == 0:
+            progress(report)
+    flush()
+    if progress:
+        progress(report)
+    return report
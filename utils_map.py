@@ -0,0 +1,184 @@
+import base64
+
+import folium
+import numpy as np
+from folium.plugins import Fullscreen, MarkerCluster
+
+from utils_geo import GeometryArray, esri_to_geojson, simplify_esri
+
+
+BASEMAPS = {
+    'Esri World Topographic': (
+        'https://server.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}',
+        'Esri World Topographic Map'),
+    'Esri World Imagery': (
+        'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
+        'Esri World Imagery'),
+}
+SELECTED_COLOR = '#ffbf00'
+MAP_WIDTH = 1200   # px; the dashboard map fills the wide layout
+MAP_HEIGHT = 500   # px
+
+
+# --------------------------------------------------------------------------
+# Map payload for the dashboard (shared with bench.py)
+# --------------------------------------------------------------------------
+def normalize_features(features, ga=None):
+    """
+    Features -> list of {attrs, geom, struct, bounds, center} plus the total
+    bounds. Coordinates, bounds and centers are computed in one vectorized
+    pass (GeometryArray); pass `ga` when the features were already converted.
+    """
+    if ga is None:
+        ga = GeometryArray.from_esri([f.get('geometry') for f in features])
+    bounds = ga.bounds()
+    centers = ga.centers(bounds)
+
+    norm = []
+    for i in np.flatnonzero(ga.valid):
+        f = features[i]
+        norm.append({
+            'attrs': f.get('attributes', {}),
+            'geom': f.get('geometry', {}),
+            'struct': ga.struct(i),
+            'bounds': tuple(bounds[i].tolist()),
+            'center': tuple(centers[i].tolist()),
+        })
+    return norm, ga.extent()
+
+
+def feature_collections(norm, id_field, tol=0.0, props=None):
+    """
+    GeoJSON FeatureCollections for the whole layer: (points, lines/polygons),
+    so points can be clustered. Lines and polygons are simplified with
+    tolerance `tol` (degrees); popup/tooltip/style come from the properties.
+    With `props` only those attributes go to the browser.
+    """
+    points, shapes = [], []
+    for item in norm:
+        gj = esri_to_geojson(simplify_esri(item['geom'], tol))
+        if not gj:
+            continue
+        attrs = item['attrs'] if props is None else {k: item['attrs'].get(k) for k in props}
+        feat = {'type': 'Feature', 'id': item['attrs'].get(id_field), 'geometry': gj, 'properties': attrs}
+        (points if gj['type'] == 'Point' else shapes).append(feat)
+    return ({'type': 'FeatureCollection', 'features': points},
+            {'type': 'FeatureCollection', 'features': shapes})
+
+
+def geojson_style(feature):
+    if feature['geometry']['type'] == 'MultiLineString':
+        return {'color': '#d62728', 'weight': 3}
+    return {'color': '#1f77b4', 'weight': 2, 'fillColor': '#1f77b4', 'fillOpacity': 0.2}
+
+
+def popup_html(attrs):
+    rows = ''.join(
+        f"<tr><th style='text-align:left;padding-right:8px;white-space:nowrap'>{k}</th>"
+        f"<td>{'' if v is None else v}</td></tr>"
+        for k, v in attrs.items()
+    )
+    return f'<table>{rows}</table>'
+
+
+def png_data_url(path):
+    """PNG file as a base64 data URI, so Leaflet can use it inline; None when unreadable."""
+    try:
+        with open(path, 'rb') as f:
+            return 'data:image/png;base64,' + base64.b64encode(f.read()).decode('utf-8')
+    except OSError:
+        return None
+
+
+# --------------------------------------------------------------------------
+# Folium map (dashboard and bench.py)
+# --------------------------------------------------------------------------
+def _add_item(item, points, shapes, tip, pop, icon_url, selected=False):
+    """One normalized feature as separate Folium objects (points and shapes go to their own group)."""
+    struct = item['struct']
+    if struct['type'] == 'point':
+        lat, lon = struct['coords'][0]
+        if icon_url:
+            size = (34, 34) if selected else (28, 28)
+            folium.Marker(location=(lat, lon), icon=folium.CustomIcon(icon_image=icon_url, icon_size=size),
+                          tooltip=tip, popup=pop).add_to(points)
+        elif selected:
+            folium.CircleMarker(location=(lat, lon), radius=10, color=SELECTED_COLOR, fill=True,
+                                fill_color=SELECTED_COLOR, weight=2, tooltip=tip, popup=pop).add_to(points)
+        else:
+            folium.CircleMarker(location=(lat, lon), radius=7, color='#1f77b4', fill=True, fill_color='#1f77b4',
+                                tooltip=tip, popup=pop).add_to(points)
+    elif struct['type'] == 'polyline':
+        for path in struct['coords']:
+            folium.PolyLine(path, color=SELECTED_COLOR if selected else '#d62728', weight=6 if selected else 3,
+                            tooltip=tip, popup=pop).add_to(shapes)
+    elif struct['type'] == 'polygon':
+        for ring in struct['coords']:
+            folium.Polygon(ring, color=SELECTED_COLOR if selected else '#1f77b4', weight=4 if selected else 2,
+                           fill=True, fill_opacity=0.15 if selected else 0.2, tooltip=tip, popup=pop).add_to(shapes)
+
+
+def _tip(attrs, label_field):
+    return f'{label_field}: {attrs.get(label_field, "")}' if label_field in attrs else None
+
+
+def build_map(bounds, label_field, collections=None, norm=(), fields=(), basemap='Esri World Topographic',
+              icon_url=None, cluster=True, lazy=True, selected=None, selected_record=None):
+    """
+    The dashboard's Folium map. With `collections` (points_fc, shapes_fc from
+    feature_collections) the layer is two GeoJSON layers with client-side
+    tooltips/popups; otherwise every item of `norm` becomes its own Folium
+    object. `fields` are the table columns (popup fields, tooltip only when
+    label_field is one of them); `selected` is a normalize_features item
+    drawn highlighted with a popup of `selected_record`. bounds are
+    (min_lat, min_lon, max_lat, max_lon), used for the start view.
+    """
+    center = [(bounds[0] + bounds[2]) / 2.0, (bounds[1] + bounds[3]) / 2.0]
+    m = folium.Map(location=center, zoom_start=8, tiles=None, control_scale=True)
+    tiles, attr = BASEMAPS.get(basemap) or BASEMAPS['Esri World Imagery']
+    folium.TileLayer(tiles=tiles, attr=attr, name=attr, overlay=False).add_to(m)
+
+    fg_all = folium.FeatureGroup(name='Projecten', show=True)
+    fg_sel = folium.FeatureGroup(name='🔶 Selectie', show=True)
+    # points are clustered client-side (Leaflet.markercluster)
+    fg_points = MarkerCluster(name='Projecten (punten)').add_to(fg_all) if cluster else fg_all
+
+    fields = list(fields)
+    if collections is not None:
+        points_fc, shapes_fc = collections
+        tooltip = label_field in fields
+
+        def popup():
+            return None if lazy else folium.GeoJsonPopup(fields=fields, max_width=520)
+
+        if shapes_fc['features']:
+            folium.GeoJson(
+                shapes_fc, name='Projecten', style_function=geojson_style,
+                tooltip=folium.GeoJsonTooltip(fields=[label_field]) if tooltip else None, popup=popup(),
+            ).add_to(fg_all)
+        if points_fc['features']:
+            if icon_url:
+                marker = folium.Marker(icon=folium.CustomIcon(icon_image=icon_url, icon_size=(28, 28)))
+            else:
+                marker = folium.CircleMarker(radius=7, color='#1f77b4', fill=True, fill_color='#1f77b4')
+            folium.GeoJson(
+                points_fc, name='Projecten (punten)', marker=marker,
+                tooltip=folium.GeoJsonTooltip(fields=[label_field]) if tooltip else None, popup=popup(),
+            ).add_to(fg_points)
+    else:
+        for item in norm:
+            attrs = item['attrs']
+            pop = None if lazy else folium.Popup(popup_html(attrs), max_width=520)
+            _add_item(item, fg_points, fg_all, _tip(attrs, label_field), pop, icon_url)
+
+    if selected is not None:
+        # popup only for the selection, built once from the full record
+        pop = folium.Popup(popup_html(selected_record or selected['attrs']), max_width=520)
+        _add_item(selected, fg_sel, fg_sel, _tip(selected['attrs'], label_field), pop, icon_url, selected=True)
+
+    fg_all.add_to(m)
+    fg_sel.add_to(m)
+    Fullscreen().add_to(m)
+    folium.LayerControl(collapsed=False).add_to(m)
+    m.fit_bounds([[bounds[0], bounds[1]], [bounds[2], bounds[3]]])
+    return m
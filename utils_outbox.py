@@ -0,0 +1,492 @@
+import json, sqlite3, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+from utils_agol import EDIT_CHUNK_ROWS, RETRY_STATUS, json_loads
+from utils_cache import layer_cache
+from utils_extent import get_extent_loader
+from utils_featurestore import CACHE_DIR, get_store
+from utils_table import sql_literal
+
+OUTBOX_DB = CACHE_DIR / 'outbox.sqlite'
+RETRY_MIN = 2.0          # seconds before the first retry after a network error
+RETRY_MAX = 120.0        # backoff ceiling
+KEEP_DONE = 24 * 3600    # sent edits are kept this long (base for later conflict checks)
+CLOCK_SKEW = 300         # seconds of leeway between our clock and the service's creation dates
+UNSURE_ADD = 'sent before without an answer; it may exist on the service already'
+
+PENDING, SENDING, DONE, FAILED, CONFLICT = 'pending', 'sending', 'done', 'failed', 'conflict'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    layer TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    oid INTEGER,
+    attrs TEXT NOT NULL,
+    geom TEXT,
+    base_edit INTEGER,
+    status TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    server_edit INTEGER,
+    unsure INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_layer_status ON outbox (layer, status);
+"""
+
+_COLUMNS = ('id', 'kind', 'oid', 'attrs', 'geom', 'base_edit', 'status', 'error',
+            'attempts', 'server_edit', 'unsure', 'created', 'updated')
+
+
+class EditQueue:
+    """
+    Durable outbox for the edits to one feature layer.
+
+    add() and update() store the edit in a local SQLite outbox, apply it to
+    the feature store right away (optimistic: the next rerun shows it) and
+    return; a background thread sends pending edits through applyEdits.
+    Updates of the same object that have not been sent yet are merged into
+    one. Before an update goes out its base edit date is compared with the
+    service: if someone else edited the object in the meantime the edit is
+    parked as 'conflict' instead of overwriting theirs. Network errors keep
+    edits pending (retried with backoff, also after a restart); edits the
+    service rejects become 'failed'.
+
+    New objects get a temporary negative object id until the service has
+    assigned the real one. applyEdits is not idempotent: an add that went
+    out without an answer (timeout, lost connection, restart while sending)
+    may have been created. Before it is sent again it is looked up by
+    `key_field` (e.g. the project number, created after it was queued when
+    the layer tracks creation dates); found means done. Without a key it is
+    parked as 'conflict' for the user to check instead of being sent twice.
+    """
+
+    def __init__(self, agol, layer_url, store=None, db_path=OUTBOX_DB, key_field=None):
+        self.agol = agol
+        self.layer_url = layer_url.rstrip('/')
+        self.store = store or get_store(agol, layer_url, out_sr=4326)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.key_field = key_field
+        self.last_error = None
+        self._lock = threading.Lock()       # outbox read-modify-write
+        self._send_lock = threading.Lock()  # one flush at a time
+        self._wake = threading.Event()
+        self._thread = None
+        self.store.add_overlay(self._unsent)
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+            if 'unsure' not in {r[1] for r in con.execute('PRAGMA table_info(outbox)')}:
+                con.execute('ALTER TABLE outbox ADD COLUMN unsure INTEGER NOT NULL DEFAULT 0')
+            # edits that were on their way when the process stopped go out again (adds after a lookup)
+            con.execute("UPDATE outbox SET status=?, unsure=CASE WHEN kind='add' THEN 1 ELSE unsure END "
+                        'WHERE layer=? AND status=?', (PENDING, self.layer_url, SENDING))
+            con.execute('DELETE FROM outbox WHERE layer=? AND status=? AND updated<?',
+                        (self.layer_url, DONE, time.time() - KEEP_DONE))
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _edit_field(self):
+        return (self.agol.layer_info(self.layer_url).get('editFieldsInfo') or {}).get('editDateField')
+
+    # ----------------------------------------------------------------------
+    # Queue edits (script thread)
+    # ----------------------------------------------------------------------
+    def update(self, attrs, geometry=None, base_edit=None):
+        """
+        Queue an update (attributes including the object id, geometry
+        optional) and apply it to the local copy. base_edit is the edit date
+        of the record as the user saw it; None skips the conflict check.
+        Returns the outbox id.
+        """
+        oid_field = self.store.oid_field
+        if attrs.get(oid_field) is None:
+            raise ValueError(f'update without {oid_field}')
+        oid = int(attrs[oid_field])
+        attrs = {k: v for k, v in attrs.items() if k != oid_field}
+        base_edit = None if base_edit is None or base_edit != base_edit else int(base_edit)
+        now = time.time()
+        with self._lock, self._connect() as con:
+            row = None
+            if oid < 0:
+                # not created on the service yet: merge into the add while it waits
+                row = con.execute('SELECT id, attrs, geom FROM outbox WHERE id=? AND layer=? AND kind=? AND status IN (?, ?)',
+                                  (-oid, self.layer_url, 'add', PENDING, FAILED)).fetchone()
+            if row is None:
+                row = con.execute('SELECT id, attrs, geom FROM outbox WHERE layer=? AND kind=? AND oid=? AND status=? '
+                                  'ORDER BY id DESC LIMIT 1', (self.layer_url, 'update', oid, PENDING)).fetchone()
+            if row:
+                item_id = row[0]
+                merged = {**json_loads(row[1]), **attrs}
+                geom = geometry if geometry is not None else (json_loads(row[2]) if row[2] else None)
+                con.execute('UPDATE outbox SET attrs=?, geom=?, updated=? WHERE id=?',
+                            (_dumps(merged), _dumps(geom), now, item_id))
+            else:
+                item_id = con.execute(
+                    'INSERT INTO outbox (layer, kind, oid, attrs, geom, base_edit, status, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (self.layer_url, 'update', oid, _dumps(attrs), _dumps(geometry), base_edit, PENDING, now, now)
+                ).lastrowid
+        self.store.upsert([{'attributes': {**attrs, oid_field: oid}, 'geometry': geometry}])
+        self._wake.set()
+        return item_id
+
+    def add(self, attrs, geometry=None):
+        """Queue a new object; it is put in the local copy under a temporary negative object id (returned)."""
+        oid_field = self.store.oid_field
+        attrs = {k: v for k, v in attrs.items() if k != oid_field}
+        now = time.time()
+        with self._lock, self._connect() as con:
+            item_id = con.execute(
+                'INSERT INTO outbox (layer, kind, attrs, geom, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.layer_url, 'add', _dumps(attrs), _dumps(geometry), PENDING, now, now)
+            ).lastrowid
+        self.store.upsert([{'attributes': {**attrs, oid_field: -item_id}, 'geometry': geometry}])
+        self._wake.set()
+        return -item_id
+
+    def _unsent(self):
+        """The edits not on the service yet as partial features, oldest first (FeatureStore overlay)."""
+        oid_field = self.store.oid_field
+        feats = []
+        for item in self.items((PENDING, SENDING, FAILED, CONFLICT)):
+            oid = -item['id'] if item['kind'] == 'add' else item['oid']
+            if item['kind'] == 'update' and self.store.get(oid) is None:
+                continue  # deleted on the service; nothing to show the edit on
+            feats.append({'attributes': {**item['attrs'], oid_field: oid}, 'geometry': item['geom']})
+        return feats
+
+    # ----------------------------------------------------------------------
+    # Status (for the UI)
+    # ----------------------------------------------------------------------
+    def counts(self):
+        """{status: number of edits} for the edits not sent yet (pending, sending, failed, conflict)."""
+        with self._connect() as con:
+            rows = con.execute('SELECT status, COUNT(*) FROM outbox WHERE layer=? AND status!=? GROUP BY status',
+                               (self.layer_url, DONE)).fetchall()
+        return dict(rows)
+
+    def items(self, statuses=(FAILED, CONFLICT)):
+        """Outbox entries with these statuses, oldest first, as dicts (attrs/geom decoded)."""
+        q = ','.join('?' * len(statuses))
+        with self._connect() as con:
+            rows = con.execute(f'SELECT {", ".join(_COLUMNS)} FROM outbox WHERE layer=? AND status IN ({q}) ORDER BY id',
+                               (self.layer_url, *statuses)).fetchall()
+        return [_item(r) for r in rows]
+
+    def retry(self, item_id, force=False):
+        """
+        Send a failed or conflicting edit again. force=True overwrites the
+        other edit of a conflict (the check then starts from that edit) and
+        sends an add that may exist already without looking it up again.
+        """
+        with self._lock, self._connect() as con:
+            n = con.execute(
+                'UPDATE outbox SET status=?, error=NULL, updated=?, '
+                'base_edit=CASE WHEN ? THEN COALESCE(server_edit, base_edit) ELSE base_edit END, '
+                'unsure=CASE WHEN ? OR status=? THEN 0 ELSE unsure END '
+                'WHERE id=? AND layer=? AND status IN (?, ?)',
+                (PENDING, time.time(), bool(force), bool(force), FAILED,
+                 item_id, self.layer_url, FAILED, CONFLICT)
+            ).rowcount
+        self._wake.set()
+        return n > 0
+
+    def discard(self, item_id):
+        """Drop an edit that was not sent and put the service's version back in the local copy."""
+        with self._lock, self._connect() as con:
+            row = con.execute('SELECT kind, oid FROM outbox WHERE id=? AND layer=? AND status IN (?, ?, ?)',
+                              (item_id, self.layer_url, PENDING, FAILED, CONFLICT)).fetchone()
+            if not row:
+                return False
+            con.execute('DELETE FROM outbox WHERE id=?', (item_id,))
+            if row[0] == 'add':
+                con.execute('DELETE FROM outbox WHERE layer=? AND oid=?', (self.layer_url, -item_id))
+        if row[0] == 'add':
+            self.store.delete([-item_id])
+        elif row[1] > 0:
+            f = self.agol.get_feature(self.layer_url, row[1], extra={'outSR': self.store.out_sr}, profile='full')
+            if f:
+                self.store.upsert([f])
+            else:
+                self.store.delete([row[1]])
+        layer_cache.invalidate(self.layer_url)
+        return True
+
+    def wait(self, timeout=None):
+        """Block until no edit is pending or being sent; False on timeout."""
+        end = None if timeout is None else time.time() + timeout
+        self._wake.set()
+        while True:
+            c = self.counts()
+            if not c.get(PENDING) and not c.get(SENDING):
+                return True
+            if end is not None and time.time() > end:
+                return False
+            time.sleep(0.05)
+
+    # ----------------------------------------------------------------------
+    # Sending (background thread)
+    # ----------------------------------------------------------------------
+    def start(self):
+        """Start the sender thread (once); it also picks up edits left from an earlier run."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'outbox {self.layer_url}', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return self
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            self._wake.wait(backoff or None)
+            self._wake.clear()
+            try:
+                while self.flush():
+                    pass
+                backoff, self.last_error = 0.0, None
+            except Exception as e:
+                self.last_error = _describe(e)
+                backoff = min(max(backoff * 2, RETRY_MIN), RETRY_MAX)
+
+    def flush(self, limit=EDIT_CHUNK_ROWS):
+        """
+        Send up to `limit` pending edits in one applyEdits request and
+        return how many were handled. Network errors are raised and leave
+        the edits pending.
+        """
+        with self._send_lock:
+            rows = self._take(limit)
+            if not rows:
+                return 0
+            try:
+                outcome = self._send(rows)
+            except Exception as e:
+                transient = _transient(e)
+                self._finish(rows, {r['id']: (PENDING if transient else FAILED, _describe(e), None, None)
+                                    for r in rows})
+                if transient:
+                    raise
+                return len(rows)
+            self._finish(rows, outcome)
+            return len(rows)
+
+    def _take(self, limit):
+        """Pending edits in queue order, marked as being sent; updates of objects still being created wait."""
+        with self._lock, self._connect() as con:
+            rows = con.execute(
+                f'SELECT {", ".join(_COLUMNS)} FROM outbox WHERE layer=? AND status=? AND (oid IS NULL OR oid > 0) '
+                'ORDER BY id LIMIT ?', (self.layer_url, PENDING, limit)).fetchall()
+            con.executemany('UPDATE outbox SET status=? WHERE id=?', [(SENDING, r[0]) for r in rows])
+        return [_item(r) for r in rows]
+
+    def _edit_dates(self, oids, oid_field, edit_field):
+        """{oid: edit date (None without editor tracking)} for the objects that still exist."""
+        js = self.agol.post(self.layer_url + '/query', {
+            'where': '1=1', 'objectIds': ','.join(str(i) for i in oids), 'returnGeometry': 'false',
+            'outFields': oid_field + (f',{edit_field}' if edit_field else ''),
+        }, idempotent=True)
+        return {f['attributes'].get(oid_field): f['attributes'].get(edit_field) if edit_field else None
+                for f in js.get('features', [])}
+
+    def _send(self, rows):
+        """Conflict check + applyEdits; returns {id: (status, error, oid, server edit date)}."""
+        oid_field, edit_field = self.store.oid_field, self._edit_field()
+        adds = [r for r in rows if r['kind'] == 'add']
+        updates = [r for r in rows if r['kind'] == 'update']
+        outcome = {}
+
+        if updates:
+            oids = sorted({r['oid'] for r in updates})
+            current = self._edit_dates(oids, oid_field, edit_field)
+            acked = self._acked(oids)
+            for r in updates:
+                if r['oid'] not in current:
+                    outcome[r['id']] = (FAILED, 'object no longer exists on the service', None, None)
+                elif r['base_edit'] is not None and edit_field:
+                    # our own earlier edits moved the edit date too
+                    base = max(r['base_edit'], acked.get(r['oid']) or 0)
+                    if (current[r['oid']] or 0) > base:
+                        outcome[r['id']] = (CONFLICT, 'edited on the service after it was loaded',
+                                            None, current[r['oid']])
+            updates = [r for r in updates if r['id'] not in outcome]
+
+        unsure = [r for r in adds if r['unsure']]
+        if unsure:
+            outcome.update(self._created_already(unsure, oid_field, edit_field))
+            adds = [r for r in adds if r['id'] not in outcome]
+
+        if not adds and not updates:
+            return outcome
+        try:
+            res = self.agol.apply_edits(
+                self.layer_url,
+                adds=[_feature(r['attrs'], r['geom']) for r in adds] or None,
+                updates=[_feature({**r['attrs'], oid_field: r['oid']}, r['geom']) for r in updates] or None,
+                rollback_on_failure=False,
+            )
+        except Exception as e:
+            if adds and _maybe_applied(e):
+                with self._lock, self._connect() as con:
+                    con.executemany('UPDATE outbox SET unsure=1 WHERE id=?', [(r['id'],) for r in adds])
+            raise
+        add_res, upd_res = res.get('addResults') or [], res.get('updateResults') or []
+        sent = ([(r, add_res[i] if i < len(add_res) else None) for i, r in enumerate(adds)]
+                + [(r, upd_res[i] if i < len(upd_res) else None) for i, r in enumerate(updates)])
+
+        ok = {r['id']: (r['oid'] if r['kind'] == 'update' else x.get('objectId'))
+              for r, x in sent if x and x.get('success')}
+        try:
+            edits = self._edit_dates(sorted(ok.values()), oid_field, edit_field) if ok and edit_field else {}
+        except Exception:
+            edits = {}  # sent anyway; the next sync brings the edit dates
+        for r, x in sent:
+            if r['id'] in ok:
+                oid = ok[r['id']]
+                outcome[r['id']] = (DONE, None, oid, edits.get(oid))
+            else:
+                err = (x or {}).get('error') or {}
+                outcome[r['id']] = (FAILED, err.get('description') or 'no result returned for this edit', None, None)
+        return outcome
+
+    def _created_already(self, rows, oid_field, edit_field):
+        """Outcomes for adds that may have been created: done when found by key_field, conflict without a key."""
+        info = self.agol.layer_info(self.layer_url)
+        types = {f['name']: f.get('type') for f in info.get('fields', [])}
+        created_field = (info.get('editFieldsInfo') or {}).get('creationDateField')
+        out = {}
+        for r in rows:
+            key = r['attrs'].get(self.key_field) if self.key_field else None
+            if key is None or key == '':
+                out[r['id']] = (CONFLICT, UNSURE_ADD, None, None)
+                continue
+            where = f'{self.key_field} = {sql_literal(key, types.get(self.key_field))}'
+            if created_field:
+                since = datetime.fromtimestamp(r['created'] - CLOCK_SKEW, tz=timezone.utc)
+                where += f" AND {created_field} >= timestamp '{since:%Y-%m-%d %H:%M:%S}'"
+            js = self.agol.post(self.layer_url + '/query', {
+                'where': where, 'returnGeometry': 'false',
+                'outFields': oid_field + (f',{edit_field}' if edit_field else ''),
+            }, idempotent=True)
+            found = js.get('features') or []
+            if found:
+                a = found[0]['attributes']
+                out[r['id']] = (DONE, None, a.get(oid_field), a.get(edit_field) if edit_field else None)
+        return out
+
+    def _acked(self, oids):
+        """Newest edit date the service gave our own sent edits, per object id."""
+        q = ','.join('?' * len(oids))
+        with self._connect() as con:
+            rows = con.execute(f'SELECT oid, MAX(server_edit) FROM outbox WHERE layer=? AND status=? '
+                               f'AND oid IN ({q}) GROUP BY oid', (self.layer_url, DONE, *oids)).fetchall()
+        return dict(rows)
+
+    def _finish(self, rows, outcome):
+        """Record the outcome per edit in the outbox, then bring the local copy in line."""
+        by_id = {r['id']: r for r in rows}
+        confirmed, created = [], []
+        now = time.time()
+        with self._lock, self._connect() as con:
+            for item_id, (status, error, oid, server_edit) in outcome.items():
+                con.execute('UPDATE outbox SET status=?, error=?, oid=COALESCE(?, oid), '
+                            'server_edit=COALESCE(?, server_edit), attempts=attempts+1, updated=? WHERE id=?',
+                            (status, error, oid, server_edit, now, item_id))
+                r = by_id[item_id]
+                if r['kind'] == 'add' and status == DONE:
+                    # queued updates of the new object now have its real id
+                    con.execute('UPDATE outbox SET oid=? WHERE layer=? AND oid=?', (oid, self.layer_url, -item_id))
+                    created.append((item_id, oid, server_edit))
+                elif r['kind'] == 'add' and status == FAILED:
+                    con.execute('UPDATE outbox SET status=?, error=? WHERE layer=? AND oid=? AND status=?',
+                                (FAILED, 'the new object was not created', self.layer_url, -item_id, PENDING))
+                elif status == DONE and server_edit is not None:
+                    confirmed.append((oid, server_edit))
+
+        oid_field, edit_field = self.store.oid_field, self._edit_field()
+        # attributes are in the local copy already (optimistic); only the new edit dates are added
+        self.store.upsert([{'attributes': {oid_field: oid, edit_field: edit}}
+                           for oid, edit in confirmed if self.store.get(oid)])
+        if created:
+            feats = []
+            for item_id, oid, edit in created:
+                # the temporary record includes edits made to it while it was queued
+                f = self.store.get(-item_id) or {'attributes': by_id[item_id]['attrs'], 'geometry': by_id[item_id]['geom']}
+                attrs = {**f['attributes'], oid_field: oid}
+                if edit_field and edit is not None:
+                    attrs[edit_field] = edit
+                feats.append({'attributes': attrs, 'geometry': f.get('geometry')})
+            self.store.delete([-item_id for item_id, _, _ in created])
+            self.store.upsert(feats)
+            layer_cache.invalidate(self.layer_url)
+            get_extent_loader(self.agol, self.layer_url, out_sr=self.store.out_sr).invalidate()
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value)
+
+
+def _item(row):
+    item = dict(zip(_COLUMNS, row))
+    item['attrs'] = json_loads(item['attrs'])
+    item['geom'] = json_loads(item['geom']) if item['geom'] else None
+    return item
+
+
+def _feature(attrs, geom):
+    return {'attributes': attrs, 'geometry': geom} if geom else {'attributes': attrs}
+
+
+def _transient(e):
+    """Network trouble (send again later) as opposed to a request the service rejects."""
+    if isinstance(e, requests.HTTPError):
+        return e.response is None or e.response.status_code in RETRY_STATUS
+    if isinstance(e, requests.RequestException):
+        return True
+    if isinstance(e, RuntimeError) and e.args and isinstance(e.args[0], dict):
+        return e.args[0].get('code') in RETRY_STATUS + (498, 499)
+    return False
+
+
+def _maybe_applied(e):
+    """True when the request may have been processed before it failed (no answer, as opposed to no connection)."""
+    if isinstance(e, requests.ConnectTimeout):
+        return False
+    if isinstance(e, requests.Timeout):
+        return True
+    if isinstance(e, requests.HTTPError):
+        return e.response is None or e.response.status_code in (502, 504)
+    if isinstance(e, requests.ConnectionError):
+        reason = getattr(e.args[0], 'reason', None) if e.args else None
+        return not isinstance(reason, ConnectTimeoutError)  # refused / DNS: never reached the service
+    return False
+
+
+def _describe(e):
+    if isinstance(e, RuntimeError) and e.args and isinstance(e.args[0], dict):
+        err = e.args[0]
+        return ' '.join(str(p) for p in (err.get('message'), *(err.get('details') or [])) if p) or str(err)
+    return str(e) or type(e).__name__
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_edit_queue(agol, layer_url, store=None, db_path=OUTBOX_DB, key_field=None):
+    """Process-wide EditQueue per (layer, db), with its sender thread running."""
+    key = (layer_url.rstrip('/'), str(db_path))
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = EditQueue(agol, layer_url, store, db_path, key_field).start()
+        elif key_field:
+            _queues[key].key_field = key_field
+        return _queues[key]
@@ -0,0 +1,330 @@
+import struct
+
+# FeatureCollectionPBuffer (ArcGIS REST f=pbf) decoder, pure Python.
+# Only the messages a query response uses are read; unknown fields are skipped.
+
+GEOMETRY_TYPES = {0: 'esriGeometryPoint', 1: 'esriGeometryMultipoint', 2: 'esriGeometryPolyline',
+                  3: 'esriGeometryPolygon', 4: 'esriGeometryMultipatch', 127: 'esriGeometryNull'}
+FIELD_TYPES = {0: 'esriFieldTypeSmallInteger', 1: 'esriFieldTypeInteger', 2: 'esriFieldTypeSingle',
+               3: 'esriFieldTypeDouble', 4: 'esriFieldTypeString', 5: 'esriFieldTypeDate',
+               6: 'esriFieldTypeOID', 7: 'esriFieldTypeGeometry', 8: 'esriFieldTypeBlob',
+               9: 'esriFieldTypeRaster', 10: 'esriFieldTypeGUID', 11: 'esriFieldTypeGlobalID',
+               12: 'esriFieldTypeXML'}
+UPPER_LEFT = 0
+
+
+# --------------------------------------------------------------------------
+# Wire format
+# --------------------------------------------------------------------------
+def _varint(buf, i):
+    shift = result = 0
+    while True:
+        b = buf[i]
+        i += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, i
+        shift += 7
+
+
+def _zigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _fields(buf, start=0, end=None):
+    """Yield (field number, wire type, value) over one message; length-delimited values are memoryviews."""
+    i, end = start, len(buf) if end is None else end
+    while i < end:
+        key, i = _varint(buf, i)
+        num, wt = key >> 3, key & 7
+        if wt == 0:
+            val, i = _varint(buf, i)
+        elif wt == 1:
+            val, i = buf[i:i + 8], i + 8
+        elif wt == 2:
+            n, i = _varint(buf, i)
+            val, i = buf[i:i + n], i + n
+        elif wt == 5:
+            val, i = buf[i:i + 4], i + 4
+        else:
+            raise ValueError(f'Unsupported wire type {wt}')
+        yield num, wt, val
+
+
+def _packed_varints(buf):
+    out, i, n = [], 0, len(buf)
+    while i < n:
+        v, i = _varint(buf, i)
+        out.append(v)
+    return out
+
+
+def _text(v):
+    return bytes(v).decode('utf-8')
+
+
+def _double(v):
+    return struct.unpack('<d', v)[0]
+
+
+# --------------------------------------------------------------------------
+# Messages
+# --------------------------------------------------------------------------
+def _value(buf):
+    for num, wt, v in _fields(buf):
+        if num == 1:
+            return _text(v)
+        if num == 2:
+            return struct.unpack('<f', v)[0]
+        if num == 3:
+            return _double(v)
+        if num in (4, 8):
+            return _zigzag(v)
+        if num in (5, 6, 7):
+            return v - (1 << 64) if num == 6 and v >= 1 << 63 else v
+        if num == 9:
+            return bool(v)
+    return None
+
+
+def _field(buf):
+    out = {}
+    for num, wt, v in _fields(buf):
+        if num == 1:
+            out['name'] = _text(v)
+        elif num == 2:
+            out['type'] = FIELD_TYPES.get(v, v)
+        elif num == 3:
+            out['alias'] = _text(v)
+    return out
+
+
+def _transform(buf):
+    origin, scale, translate = UPPER_LEFT, [1.0, 1.0], [0.0, 0.0]
+    for num, wt, v in _fields(buf):
+        if num == 1:
+            origin = v
+        elif num in (2, 3):
+            target = scale if num == 2 else translate
+            for n2, _, v2 in _fields(v):
+                if n2 in (1, 2):
+                    target[n2 - 1] = _double(v2)
+    return origin, scale, translate
+
+
+def _geometry(buf, gtype, transform, dims):
+    lengths, coords = [], []
+    for num, wt, v in _fields(buf):
+        if num == 2:
+            lengths = _packed_varints(v) if wt == 2 else [v]
+        elif num == 3:
+            coords = [_zigzag(c) for c in _packed_varints(v)] if wt == 2 else [_zigzag(v)]
+    origin, (sx, sy), (tx, ty) = transform
+    ysign = -1.0 if origin == UPPER_LEFT else 1.0
+
+    if gtype == 'esriGeometryPoint':
+        if len(coords) < 2:
+            return None
+        return {'x': tx + coords[0] * sx, 'y': ty + ysign * coords[1] * sy}
+
+    parts, k = [], 0
+    for n in lengths or [len(coords) // dims]:
+        # coordinates are deltas; every part starts again from 0
+        x = y = 0
+        part = []
+        for _ in range(n):
+            x += coords[k]
+            y += coords[k + 1]
+            part.append([tx + x * sx, ty + ysign * y * sy])
+            k += dims
+        parts.append(part)
+    if gtype == 'esriGeometryPolygon':
+        return {'rings': parts}
+    if gtype == 'esriGeometryPolyline':
+        return {'paths': parts}
+    if gtype == 'esriGeometryMultipoint':
+        return {'points': [p for part in parts for p in part]}
+    return None
+
+
+def _feature(buf, names, gtype, transform, dims):
+    values, geom = [], None
+    for num, wt, v in _fields(buf):
+        if num == 1:
+            values.append(_value(v))
+        elif num == 2:
+            geom = _geometry(v, gtype, transform, dims)
+    f = {'attributes': dict(zip(names, values))}
+    if geom is not None:
+        f['geometry'] = geom
+    return f
+
+
+def _feature_result(buf):
+    out = {'fields': [], 'features': []}
+    gtype, transform, has_z, has_m = None, (UPPER_LEFT, [1.0, 1.0], [0.0, 0.0]), False, False
+    raw_features = []
+    for num, wt, v in _fields(buf):
+        if num == 1:
+            out['objectIdFieldName'] = _text(v)
+        elif num == 7:
+            gtype = GEOMETRY_TYPES.get(v)
+            out['geometryType'] = gtype
+        elif num == 8:
+            sr = {}
+            for n2, _, v2 in _fields(v):
+                if n2 == 1:
+                    sr['wkid'] = v2
+                elif n2 == 2:
+                    sr['latestWkid'] = v2
+            out['spatialReference'] = sr
+        elif num == 9:
+            out['exceededTransferLimit'] = bool(v)
+        elif num == 10:
+            has_z = bool(v)
+        elif num == 11:
+            has_m = bool(v)
+        elif num == 12:
+            transform = _transform(v)
+        elif num == 13:
+            out['fields'].append(_field(v))
+        elif num == 15:
+            raw_features.append(v)  # decoded once fields and transform are known
+    names = [f.get('name') for f in out['fields']]
+    dims = 2 + has_z + has_m
+    out['features'] = [_feature(v, names, gtype, transform, dims) for v in raw_features]
+    return out
+
+
+def decode_query(data):
+    """
+    Decode an f=pbf query response into the shape of the JSON response
+    ({'features', 'fields', 'objectIdFieldName', ...}, or {'count'} /
+    {'objectIds'}). Coordinates are de-quantized with the response transform.
+    """
+    buf = memoryview(data)
+    for num, wt, v in _fields(buf):
+        if num != 2:
+            continue
+        for n2, _, v2 in _fields(v):
+            if n2 == 1:
+                return _feature_result(v2)
+            if n2 == 2:
+                for n3, _, v3 in _fields(v2):
+                    if n3 == 1:
+                        return {'count': v3}
+                return {'count': 0}
+            if n2 == 3:
+                res = {'objectIds': []}
+                for n3, w3, v3 in _fields(v2):
+                    if n3 == 1:
+                        res['objectIdFieldName'] = _text(v3)
+                    elif n3 == 3:
+                        res['objectIds'].extend(_packed_varints(v3) if w3 == 2 else [v3])
+                return res
+    return {'features': []}
+
+
+# --------------------------------------------------------------------------
+# Encoding (used by the stand-in FeatureServer, utils_standin)
+# --------------------------------------------------------------------------
+_FIELD_CODES = {v: k for k, v in FIELD_TYPES.items()}
+_GEOMETRY_CODES = {v: k for k, v in GEOMETRY_TYPES.items()}
+_SMALL = [bytes((i,)) for i in range(0x80)]
+
+
+def _put_varint(n):
+    if 0 <= n < 0x80:
+        return _SMALL[n]
+    out = bytearray()
+    n &= (1 << 64) - 1
+    while True:
+        b, n = n & 0x7F, n >> 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _key(num, wt):
+    return _put_varint((num << 3) | wt)
+
+
+def _ld(num, data):
+    return _key(num, 2) + _put_varint(len(data)) + data
+
+
+def _vi(num, v):
+    return _key(num, 0) + _put_varint(v)
+
+
+def _dbl(num, v):
+    return _key(num, 1) + struct.pack('<d', v)
+
+
+def _put_value(v):
+    if v is None:
+        return b''
+    if isinstance(v, str):
+        return _ld(1, v.encode('utf-8'))
+    if isinstance(v, bool):
+        return _vi(9, int(v))
+    if isinstance(v, int):
+        return _vi(8, (v << 1) ^ (v >> 63))
+    return _dbl(3, float(v))
+
+
+def _put_geometry(g, scale, tx, ty):
+    if g.get('x') is not None:
+        z = (round((g['x'] - tx) / scale), round((ty - g['y']) / scale))
+        return _ld(3, b''.join([_put_varint((c << 1) ^ (c >> 63)) for c in z]))
+    parts = g.get('rings') or g.get('paths') or ([g['points']] if g.get('points') else [])
+    coords = []
+    for part in parts:
+        # deltas within each part, the first vertex relative to 0
+        px = py = 0
+        for v in part:
+            qx, qy = round((v[0] - tx) / scale), round((ty - v[1]) / scale)
+            coords.append(qx - px)
+            coords.append(qy - py)
+            px, py = qx, qy
+    return (_ld(2, b''.join([_put_varint(len(p)) for p in parts]))
+            + _ld(3, b''.join([_put_varint((c << 1) ^ (c >> 63)) for c in coords])))
+
+
+def encode_query(res, scale=1e-8):
+    """
+    Encode a JSON-shaped query result ({'features', 'fields', ...},
+    {'count'} or {'objectIds'}) as an f=pbf response. Coordinates are
+    quantized to `scale` units from an upper-left origin.
+    """
+    if 'count' in res:
+        return _ld(2, _ld(2, _vi(1, int(res['count']))))
+    if 'objectIds' in res:
+        body = _ld(1, res.get('objectIdFieldName', 'OBJECTID').encode('utf-8'))
+        body += _ld(3, b''.join(_put_varint(i) for i in res['objectIds']))
+        return _ld(2, _ld(3, body))
+
+    gtype = res.get('geometryType') or 'esriGeometryNull'
+    tx, ty = -180.0, 90.0
+    fr = [_ld(1, res.get('objectIdFieldName', 'OBJECTID').encode('utf-8')),
+          _vi(7, _GEOMETRY_CODES.get(gtype, 127))]
+    wkid = (res.get('spatialReference') or {}).get('wkid')
+    if wkid:
+        fr.append(_ld(8, _vi(1, wkid)))
+    if res.get('exceededTransferLimit'):
+        fr.append(_vi(9, 1))
+    fr.append(_ld(12, _vi(1, UPPER_LEFT) + _ld(2, _dbl(1, scale) + _dbl(2, scale))
+                  + _ld(3, _dbl(1, tx) + _dbl(2, ty))))
+    names = []
+    for f in res.get('fields') or []:
+        names.append(f['name'])
+        fr.append(_ld(13, _ld(1, f['name'].encode('utf-8')) + _vi(2, _FIELD_CODES.get(f.get('type'), 4))))
+    for feat in res.get('features', []):
+        attrs = feat.get('attributes', {})
+        fb = b''.join([_ld(1, _put_value(attrs.get(n))) for n in names])
+        if feat.get('geometry'):
+            fb += _ld(2, _put_geometry(feat['geometry'], scale, tx, ty))
+        fr.append(_ld(15, fb))
+    return _ld(2, _ld(1, b''.join(fr)))
@@ -0,0 +1,197 @@
+import math
+from datetime import date, datetime, timezone
+
+STRING_TYPES = ('esriFieldTypeString', 'esriFieldTypeGUID')
+INT_TYPES = ('esriFieldTypeInteger', 'esriFieldTypeSmallInteger', 'esriFieldTypeBigInteger')
+FLOAT_TYPES = ('esriFieldTypeDouble', 'esriFieldTypeSingle')
+DATE_TYPES = ('esriFieldTypeDate', 'esriFieldTypeDateOnly')
+SYSTEM_TYPES = ('esriFieldTypeOID', 'esriFieldTypeGlobalID', 'esriFieldTypeGeometry')
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%Y-%m-%d %H:%M:%S')
+
+
+def is_null(v):
+    return v is None or v == '' or (isinstance(v, float) and math.isnan(v))
+
+
+# --------------------------------------------------------------------------
+# Date <-> epoch ms (ArcGIS date fields)
+# --------------------------------------------------------------------------
+def to_epoch_ms(v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return int(v)
+    if isinstance(v, datetime):
+        dt = v if v.tzinfo else v.replace(tzinfo=timezone.utc)
+    elif isinstance(v, date):
+        dt = datetime(v.year, v.month, v.day, tzinfo=timezone.utc)
+    else:
+        s = str(v).strip()
+        for fmt in DATE_FORMATS:
+            try:
+                dt = datetime.strptime(s, fmt).replace(tzinfo=timezone.utc)
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError(s)
+    return int(dt.timestamp() * 1000)
+
+
+def from_epoch_ms(v):
+    if is_null(v):
+        return None
+    return datetime.fromtimestamp(v / 1000.0, tz=timezone.utc).date()
+
+
+# --------------------------------------------------------------------------
+# Compiled field
+# --------------------------------------------------------------------------
+class Field:
+    """
+    One layer field compiled from its service definition. `coerce(value)`
+    converts a form/CSV value to what the service stores (or raises
+    ValueError with a Dutch message); `widget` tells the forms which input
+    to show: text, int, float, date, select or readonly.
+    """
+
+    def __init__(self, spec, readonly=()):
+        self.name = spec['name']
+        self.alias = spec.get('alias') or self.name
+        self.type = spec.get('type')
+        self.length = spec.get('length') if self.type in STRING_TYPES else None
+        self.nullable = spec.get('nullable', True)
+        self.editable = spec.get('editable', True) and self.type not in SYSTEM_TYPES and self.name not in readonly
+
+        domain = spec.get('domain') or {}
+        self.codes = None  # code -> name
+        self.range = None
+        if domain.get('type') == 'codedValue':
+            self.codes = {c['code']: c['name'] for c in domain.get('codedValues', [])}
+        elif domain.get('type') == 'range':
+            self.range = tuple(domain.get('range') or (None, None))
+
+        if not self.editable:
+            self.widget = 'readonly'
+        elif self.codes is not None:
+            self.widget = 'select'
+        elif self.type in INT_TYPES:
+            self.widget = 'int'
+        elif self.type in FLOAT_TYPES:
+            self.widget = 'float'
+        elif self.type in DATE_TYPES:
+            self.widget = 'date'
+        else:
+            self.widget = 'text'
+        self.coerce = self._compile()
+
+    def _compile(self):
+        label, length, codes, rng = self.alias, self.length, self.codes, self.range
+
+        if self.type in INT_TYPES:
+            def base(v):
+                f = float(str(v).replace(',', '.')) if isinstance(v, str) else float(v)
+                if not f.is_integer():
+                    raise ValueError(f'{label}: geen geheel getal')
+                return int(f)
+        elif self.type in FLOAT_TYPES:
+            def base(v):
+                return float(str(v).replace(',', '.')) if isinstance(v, str) else float(v)
+        elif self.type in DATE_TYPES:
+            base = to_epoch_ms
+        else:
+            def base(v):
+                s = str(v).strip()
+                if length and len(s) > length:
+                    raise ValueError(f'{label}: langer dan {length} tekens')
+                return s
+
+        def coerce(v):
+            if is_null(v):
+                return None
+            if codes is not None:
+                if v in codes:
+                    return v
+                # accept the display name as well
+                for code, name in codes.items():
+                    if name == v:
+                        return code
+                raise ValueError(f'{label}: {v!r} is geen geldige waarde')
+            try:
+                out = base(v)
+            except (TypeError, ValueError) as e:
+                msg = str(e)
+                raise ValueError(msg if msg.startswith(label) else f'{label}: ongeldige waarde {v!r}')
+            if rng and rng[0] is not None and out is not None and not (rng[0] <= out <= rng[1]):
+                raise ValueError(f'{label}: buiten bereik {rng[0]}–{rng[1]}')
+            return out
+
+        return coerce
+
+    def display(self, v):
+        """Stored value -> form value (dates as date, codes as name)."""
+        if is_null(v):
+            return None
+        if self.codes is not None:
+            return self.codes.get(v, v)
+        if self.type in DATE_TYPES:
+            return from_epoch_ms(v)
+        return v
+
+
+class LayerSchema:
+    """Compiled fields of a layer, built once from its /FeatureServer/<n> definition."""
+
+    def __init__(self, info):
+        edit = info.get('editFieldsInfo') or {}
+        readonly = {v for k, v in edit.items() if k.endswith('Field') and v}
+        self.oid_field = info.get('objectIdField')
+        self.fields = {}
+        for spec in info.get('fields', []):
+            f = Field(spec, readonly)
+            self.fields[f.name] = f
+            if f.type == 'esriFieldTypeOID':
+                self.oid_field = self.oid_field or f.name
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def get(self, name):
+        return self.fields.get(name)
+
+    def validate(self, attrs, required=()):
+        """
+        Coerce attrs for the service. Returns (clean, errors) with errors as
+        (field, message); unknown keys are reported, read-only ones dropped
+        (except the object id, which updates need).
+        """
+        clean, errors = {}, []
+        for k, v in attrs.items():
+            f = self.fields.get(k)
+            if f is None:
+                errors.append((k, f'{k}: onbekend veld in de laag'))
+                continue
+            if not f.editable:
+                if k == self.oid_field:
+                    clean[k] = v
+                continue
+            try:
+                clean[k] = f.coerce(v)
+            except ValueError as e:
+                errors.append((k, str(e)))
+                continue
+            if clean[k] is None and not f.nullable:
+                errors.append((k, f'{f.alias} is verplicht'))
+        for k in required:
+            if is_null(clean.get(k)) and not any(e[0] == k for e in errors):
+                f = self.fields.get(k)
+                errors.append((k, f'{f.alias if f else k} is verplicht'))
+        return clean, errors
+
+
+def get_schema(agol, layer_url, cache=None):
+    """LayerSchema for a layer; with a TTLCache it is compiled once per TTL."""
+    def build():
+        return LayerSchema(agol.layer_info(layer_url, refresh=True))
+
+    if cache is None:
+        return build()
+    return cache.get(layer_url, '1=1', 'schema', build)
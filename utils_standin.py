@@ -0,0 +1,1017 @@
+import calendar
+import gzip
+import json
+import math
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from utils_domains import DOMAINS_DIR, FIELD_DOMAINS, read_domain_file
+from utils_geo import M_PER_DEG
+from utils_pbf import encode_query
+
+# Local stand-in for an ArcGIS Online hosted FeatureServer: generateToken,
+# service/layer metadata, /query and the edit operations the AGOL client
+# uses, over a synthetic projects layer held in memory. For load tests and
+# benchmarks without touching arcgis.com:
+#
+#   python utils_standin.py --features 100000 --latency 0.05 --error-rate 0.01
+#
+# and point the app's [arcgis] secrets at the printed portal/layer URLs.
+
+OID = 'OBJECTID'
+EDIT_FIELD = 'EditDate'
+BASE_MS = 1735689600000                   # 2025-01-01, anchor of the synthetic dates
+DAY_MS = 86400000
+NL_BOUNDS = (3.4, 50.8, 7.2, 53.5)        # lon/lat box the projects are placed in
+MIX = {'polygon': 1.0}                    # geometry kinds of the generated features
+GEOMETRY_TYPES = {'point': 'esriGeometryPoint', 'polyline': 'esriGeometryPolyline',
+                  'polygon': 'esriGeometryPolygon'}
+MAX_RECORD_COUNT = 2000
+GZIP_MIN_BYTES = 1024
+
+
+def _field(name, ftype, length=None, alias=None, **kw):
+    f = {'name': name, 'type': ftype, 'alias': alias or name, 'nullable': True, 'editable': True}
+    if length:
+        f['length'] = length
+    f.update(kw)
+    return f
+
+
+_S, _D, _T = 'esriFieldTypeString', 'esriFieldTypeDouble', 'esriFieldTypeDate'
+FIELDS = [
+    _field(OID, 'esriFieldTypeOID', nullable=False, editable=False),
+    _field('Projectnr', _S, 10), _field('Bedrijf', _S, 5), _field('Omschrijving', _S, 256),
+    _field('Opdrachtgever', _S, 100), _field('Calcnr', _S, 10), _field('Soort', _S, 20),
+    _field('Combinanten', _S, 50), _field('Combinaam', _S, 20), _field('Aanneemsom', _D),
+    _field('Geplande_start', _T, 8), _field('Geplande_oplev', _T, 8), _field('Status', _S, 20),
+    # person fields hold the Mdw. code from assets/domains (5 or 7 digits)
+    _field('MT_lid', _S, 10), _field('PL', _S, 10), _field('WVB_1', _S, 10), _field('WVB_2', _S, 10),
+    _field('Uitvoerder', _S, 10), _field('KAM_mer', _S, 10), _field('Opdrachtbonnen', _S, 5),
+    _field('Emailadres', _S, 40), _field('Financieel', _S, 5), _field('Directie_Combi', _S, 5),
+    _field('Adres', _S, 256), _field('Factuur_aan', _S, 256), _field('Controller', _S, 10),
+    _field('Projectmap', _S, 256),
+    _field(EDIT_FIELD, _T, 8, editable=False),
+]
+
+
+class ServiceError(Exception):
+    """An error the service reports as HTTP 200 + {"error": {...}}, like AGOL."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def to_json(self):
+        return {'error': {'code': self.code, 'message': self.message, 'details': []}}
+
+
+# --------------------------------------------------------------------------
+# Synthetic projects
+# --------------------------------------------------------------------------
+_PLACES = ('Venlo', 'Roermond', 'Weert', 'Helmond', 'Eindhoven', 'Tilburg', 'Breda', 'Nijmegen',
+           'Arnhem', 'Utrecht', 'Zwolle', 'Groningen', 'Leeuwarden', 'Den Bosch', 'Maastricht')
+_WORKS = ('Reconstructie', 'Riolering', 'Herinrichting', 'Onderhoud', 'Fietspad', 'Rotonde',
+          'Kabels en leidingen', 'Bouwrijp maken', 'Woonrijp maken', 'Groot onderhoud')
+_CLIENTS = ('Gemeente', 'Provincie', 'Waterschap', 'Rijkswaterstaat', 'ProRail', 'Enexis')
+
+
+def _domain_values(name):
+    """The values of a domain list (Mdw. codes) as the forms store them."""
+    try:
+        values = list(read_domain_file(DOMAINS_DIR / f'{name}.csv').values)
+    except OSError:
+        values = []
+    return values or [f'{name[:3].upper()}{k:02d}' for k in range(1, 21)]
+
+
+def _split(xy, offsets, close=False):
+    """Coordinate lists per part from one flat (n, 2) array and part offsets."""
+    flat = np.round(xy, 7).tolist()
+    parts = []
+    for s, e in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        part = flat[s:e]
+        if close:
+            part.append(list(part[0]))
+        parts.append(part)
+    return parts
+
+
+def _rings(rng, lon, lat, radius, clockwise):
+    """
+    Irregular rings of 6-40 vertices around the centers, all at once; ESRI
+    outer rings run clockwise, holes counter-clockwise.
+    """
+    nv = rng.integers(6, 41, size=len(lon))
+    offsets = np.zeros(len(lon) + 1, dtype=np.int64)
+    np.cumsum(nv, out=offsets[1:])
+    owner = np.repeat(np.arange(len(lon)), nv)
+    k = np.arange(offsets[-1]) - offsets[owner]
+    step = np.where(clockwise, -2.0, 2.0) * np.pi / nv
+    a = rng.uniform(0, 2 * np.pi, size=len(lon))[owner] + step[owner] * k
+    r = (0.55 + 0.45 * rng.random(len(k))) * radius[owner]
+    ky = r / M_PER_DEG
+    kx = ky / np.cos(np.radians(lat[owner]))
+    xy = np.column_stack([lon[owner] + kx * np.cos(a), lat[owner] + ky * np.sin(a)])
+    return _split(xy, offsets, close=True)
+
+
+def _paths(rng, lon, lat):
+    """Meandering lines (streets, pipelines) of 2-60 segments of 20-150 m."""
+    nseg = rng.integers(2, 61, size=len(lon))
+    offsets = np.zeros(len(lon) + 1, dtype=np.int64)
+    np.cumsum(nseg + 1, out=offsets[1:])
+    owner = np.repeat(np.arange(len(lon)), nseg + 1)
+    first = np.zeros(offsets[-1], dtype=bool)
+    first[offsets[:-1]] = True
+    # heading random-walks along the path; the first vertex is the start point
+    turn = np.where(first, rng.uniform(0, 2 * np.pi, size=len(lon))[owner], rng.normal(0, 0.35, len(owner)))
+    heading = np.cumsum(turn)
+    heading -= np.repeat(heading[offsets[:-1]] - turn[offsets[:-1]], nseg + 1)
+    step = np.where(first, 0.0, rng.uniform(20, 150, len(owner)))
+    dx = np.cumsum(step * np.cos(heading))
+    dy = np.cumsum(step * np.sin(heading))
+    dx -= np.repeat(dx[offsets[:-1]], nseg + 1)
+    dy -= np.repeat(dy[offsets[:-1]], nseg + 1)
+    xy = np.column_stack([lon[owner] + dx / (M_PER_DEG * np.cos(np.radians(lat[owner]))),
+                          lat[owner] + dy / M_PER_DEG])
+    return _split(xy, offsets)
+
+
+def _geometries(rng, kinds, lon, lat):
+    """ESRI JSON geometries for all features, generated column-wise with numpy."""
+    n = len(kinds)
+    out = [None] * n
+    for i in np.flatnonzero(kinds == 'point').tolist():
+        out[i] = {'x': round(float(lon[i]), 7), 'y': round(float(lat[i]), 7)}
+
+    idx = np.flatnonzero(kinds == 'polyline')
+    for i, path in zip(idx.tolist(), _paths(rng, lon[idx], lat[idx])):
+        out[i] = {'paths': [path]}
+
+    idx = np.flatnonzero(kinds == 'polygon')
+    if len(idx):
+        radius = np.minimum(np.exp(rng.normal(4.5, 0.8, len(idx))), 2500.0)  # median ~90 m
+        u = rng.random(len(idx))
+        hole = u < 0.05                     # courtyard / excluded plot
+        second = (u >= 0.05) & (u < 0.15)   # second work area nearby
+        far = radius[second] * rng.uniform(2.5, 6.0, second.sum())
+        slat = lat[idx][second] + rng.uniform(-1, 1, second.sum()) * far / M_PER_DEG
+        slon = lon[idx][second] + far / (M_PER_DEG * np.cos(np.radians(lat[idx][second])))
+        owner = np.concatenate([np.arange(len(idx)), np.flatnonzero(hole), np.flatnonzero(second)])
+        rings = _rings(rng,
+                       np.concatenate([lon[idx], lon[idx][hole], slon]),
+                       np.concatenate([lat[idx], lat[idx][hole], slat]),
+                       np.concatenate([radius, radius[hole] * 0.3,
+                                       radius[second] * rng.uniform(0.3, 0.8, second.sum())]),
+                       np.concatenate([np.ones(len(idx), dtype=bool), np.zeros(hole.sum(), dtype=bool),
+                                       np.ones(second.sum(), dtype=bool)]))
+        for j, ring in zip(owner.tolist(), rings):
+            i = int(idx[j])
+            if out[i] is None:
+                out[i] = {'rings': []}
+            out[i]['rings'].append(ring)
+    return out
+
+
+def _attributes(rnd, oid, lists):
+    start = BASE_MS + rnd.randint(-5 * 365, 2 * 365) * DAY_MS
+    place, work = rnd.choice(_PLACES), rnd.choice(_WORKS)
+    soort = rnd.choices(('Eigen beheer', 'Combinatie', 'Onder aanneming'), (6, 3, 1))[0]
+
+    def pick(field, p=1.0):
+        return rnd.choice(lists[FIELD_DOMAINS[field]]) if rnd.random() < p else None
+
+    return {
+        OID: oid,
+        'Projectnr': f'{20 + (start - BASE_MS) // (365 * DAY_MS) % 10:02d}{oid:06d}'[:10],
+        'Bedrijf': rnd.choices(('001', '090', '315'), (7, 2, 1))[0],
+        'Omschrijving': f'{work} {place}',
+        'Opdrachtgever': f'{rnd.choice(_CLIENTS)} {place}',
+        'Calcnr': f'C{rnd.randint(10000, 99999)}' if rnd.random() < 0.7 else None,
+        'Soort': soort,
+        'Combinanten': rnd.choice(('ACW', 'Den Ouden', 'Dura Vermeer')) if soort == 'Combinatie' else None,
+        'Combinaam': rnd.choice(('Biggelaar', 'Gebr. De Koning')) if soort == 'Combinatie' else None,
+        'Aanneemsom': round(min(math.exp(rnd.gauss(13.0, 1.3)), 5e7), 2),
+        'Geplande_start': start,
+        'Geplande_oplev': start + rnd.randint(30, 720) * DAY_MS,
+        'Status': 'Gereed' if start < BASE_MS - rnd.randint(0, 900) * DAY_MS else 'Onderhanden',
+        'MT_lid': pick('MT_lid', 0.8),
+        'PL': pick('PL'),
+        'WVB_1': pick('WVB_1', 0.8),
+        'WVB_2': pick('WVB_2', 0.2),
+        'Uitvoerder': pick('Uitvoerder', 0.9),
+        'KAM_mer': pick('KAM_mer', 0.5),
+        'Opdrachtbonnen': rnd.choice(('Ja', 'Nee')),
+        'Emailadres': None,
+        'Financieel': None,
+        'Directie_Combi': None,
+        'Adres': f'{place}, {rnd.randint(1000, 9999)} {rnd.choice("ABCDEFGHJKLMNPRSTVWXZ")}{rnd.choice("ABCDEFGHJKLMNPRSTVWXZ")}',
+        'Factuur_aan': None,
+        'Controller': pick('Controller', 0.9),
+        'Projectmap': f'P:\\Projecten\\{oid:06d}',
+        EDIT_FIELD: BASE_MS - rnd.randint(0, 365 * DAY_MS),
+    }
+
+
+def synthetic_projects(n, seed=0, mix=None, start_oid=1):
+    """
+    n ESRI JSON features (lon/lat) with the projects schema. Deterministic
+    per seed, so benchmark datasets are the same on every machine. mix is
+    {'point' | 'polyline' | 'polygon': weight}; polygons are irregular rings
+    of 6-40 vertices with a lognormal size (median ~90 m), some with a hole
+    or a second part.
+    """
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    mix = mix or MIX
+    names = list(mix)
+    weights = np.array([mix[k] for k in names], dtype=float)
+    kinds = np.array(names)[rng.choice(len(names), size=n, p=weights / weights.sum())]
+    x0, y0, x1, y1 = NL_BOUNDS
+    lon, lat = rng.uniform(x0, x1, n), rng.uniform(y0, y1, n)
+    geoms = _geometries(rng, kinds, lon, lat)
+    lists = {name: _domain_values(name) for name in set(FIELD_DOMAINS.values())}
+    feats = []
+    for i in range(n):
+        feats.append({'attributes': _attributes(rnd, start_oid + i, lists), 'geometry': geoms[i]})
+    return feats
+
+
+# --------------------------------------------------------------------------
+# Where clauses (the SQL-92 subset the app sends)
+# --------------------------------------------------------------------------
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<str>'(?:[^']|'')*') |
+    (?P<num>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?) |
+    (?P<op><>|!=|>=|<=|=|<|>|\(|\)|,|-) |
+    (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+)""", re.X)
+_FUNCS = {'UPPER': lambda v: v.upper() if isinstance(v, str) else v,
+          'LOWER': lambda v: v.lower() if isinstance(v, str) else v}
+_CMP = {'=': lambda a, b: a == b, '<>': lambda a, b: a != b, '!=': lambda a, b: a != b,
+        '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b, '>=': lambda a, b: a >= b}
+
+
+def _tokens(where):
+    out, i = [], 0
+    while i < len(where):
+        if where[i:].strip() == '':
+            break
+        m = _TOKEN.match(where, i)
+        if not m or m.end() == i:
+            raise ServiceError(400, f"Invalid where clause near '{where[i:i + 20]}'")
+        kind = m.lastgroup
+        out.append((kind, m.group(kind).upper() if kind == 'word' else m.group(kind)))
+        i = m.end()
+    return out
+
+
+def _ms(text):
+    text = text.strip()
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(text, fmt)) * 1000
+        except ValueError:
+            continue
+    raise ServiceError(400, f"Invalid date literal '{text}'")
+
+
+def _like(pattern):
+    rx = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern)
+    return re.compile(rx, re.S).fullmatch
+
+
+class _Parser:
+    """Recursive descent over the tokens; compiles to a predicate on the attribute dict."""
+
+    def __init__(self, tokens, names):
+        self.t = tokens
+        self.i = 0
+        self.names = names
+
+    def peek(self, *values):
+        tok = self.t[self.i] if self.i < len(self.t) else (None, None)
+        return tok if not values or tok[1] in values else None
+
+    def take(self, *values):
+        tok = self.peek(*values)
+        if tok is None or tok == (None, None):
+            raise ServiceError(400, f'Invalid where clause: expected {" or ".join(values) or "a value"}')
+        self.i += 1
+        return tok
+
+    def expr(self):
+        parts = [self.conj()]
+        while self.peek('OR'):
+            self.i += 1
+            parts.append(self.conj())
+        return parts[0] if len(parts) == 1 else (lambda a: any(p(a) for p in parts))
+
+    def conj(self):
+        parts = [self.neg()]
+        while self.peek('AND'):
+            self.i += 1
+            parts.append(self.neg())
+        return parts[0] if len(parts) == 1 else (lambda a: all(p(a) for p in parts))
+
+    def neg(self):
+        if self.peek('NOT'):
+            self.i += 1
+            inner = self.neg()
+            return lambda a: not inner(a)
+        if self.peek('('):
+            # a parenthesised condition, unless it turns out to be a value
+            save = self.i
+            self.i += 1
+            try:
+                inner = self.expr()
+                self.take(')')
+                if not self.peek(*_CMP, 'LIKE', 'IN', 'IS', 'BETWEEN', 'NOT'):
+                    return inner
+            except ServiceError:
+                pass
+            self.i = save
+        return self.predicate()
+
+    def value(self):
+        kind, v = self.take()
+        if kind == 'str':
+            s = v[1:-1].replace("''", "'")
+            return lambda a: s
+        if kind == 'num':
+            n = float(v) if ('.' in v or 'E' in v.upper()) else int(v)
+            return lambda a: n
+        if kind == 'op' and v == '-':
+            inner = self.value()
+            return lambda a: -inner(a)
+        if kind == 'op' and v == '(':
+            inner = self.value()
+            self.take(')')
+            return inner
+        if v in ('TIMESTAMP', 'DATE') and self.peek() and self.peek()[0] == 'str':
+            ms = _ms(self.take()[1][1:-1])
+            return lambda a: ms
+        if v in _FUNCS and self.peek('('):
+            self.i += 1
+            inner, fn = self.value(), _FUNCS[v]
+            self.take(')')
+            return lambda a: fn(inner(a))
+        if v == 'NULL':
+            return lambda a: None
+        name = self.names.get(v)
+        if name is None:
+            raise ServiceError(400, f"Invalid where clause: unknown field '{v}'")
+        return lambda a: a.get(name)
+
+    def predicate(self):
+        left = self.value()
+        negate = bool(self.peek('NOT'))
+        if negate:
+            self.i += 1
+        kind, op = self.take()
+        if op == 'IS':
+            is_not = bool(self.peek('NOT'))
+            if is_not:
+                self.i += 1
+            self.take('NULL')
+            return (lambda a: left(a) is not None) if is_not else (lambda a: left(a) is None)
+        if op == 'LIKE':
+            pattern = self.value()(None)
+            match = _like(str(pattern))
+            test = lambda a: isinstance(left(a), str) and match(left(a)) is not None  # noqa: E731
+        elif op == 'IN':
+            self.take('(')
+            items = [self.value()(None)]
+            while self.peek(','):
+                self.i += 1
+                items.append(self.value()(None))
+            self.take(')')
+            allowed = set(items)
+            test = lambda a: left(a) is not None and left(a) in allowed  # noqa: E731
+        elif op == 'BETWEEN':
+            lo = self.value()
+            self.take('AND')
+            hi = self.value()
+            test = lambda a: _compare('>=', left(a), lo(a)) and _compare('<=', left(a), hi(a))  # noqa: E731
+        elif op in _CMP:
+            right = self.value()
+            test = lambda a: _compare(op, left(a), right(a))  # noqa: E731
+        else:
+            raise ServiceError(400, f"Invalid where clause near '{op}'")
+        return (lambda a: not test(a)) if negate else test
+
+
+def _compare(op, a, b):
+    if a is None or b is None:
+        return False
+    try:
+        return _CMP[op](a, b)
+    except TypeError:
+        try:
+            return _CMP[op](float(a), float(b))
+        except (TypeError, ValueError):
+            return False
+
+
+@lru_cache(maxsize=256)
+def compile_where(where, names):
+    """Predicate for a where clause; `names` is a tuple of the layer's field names."""
+    where = (where or '').strip() or '1=1'
+    p = _Parser(_tokens(where), {n.upper(): n for n in names})
+    pred = p.expr()
+    if p.i != len(p.t):
+        raise ServiceError(400, f"Invalid where clause near '{p.t[p.i][1]}'")
+    return pred
+
+
+# --------------------------------------------------------------------------
+# Layer
+# --------------------------------------------------------------------------
+def _bbox(g):
+    if not g:
+        return None
+    if g.get('x') is not None:
+        return g['x'], g['y'], g['x'], g['y']
+    pts = [v for part in (g.get('rings') or g.get('paths') or [g.get('points') or []]) for v in part]
+    if not pts:
+        return None
+    xs = [v[0] for v in pts]
+    ys = [v[1] for v in pts]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _envelope(p):
+    """(xmin, ymin, xmax, ymax) of the geometry filter, or None."""
+    g = p.get('geometry')
+    if not g:
+        return None
+    if p.get('geometryType', 'esriGeometryEnvelope') != 'esriGeometryEnvelope':
+        raise ServiceError(400, 'Only envelope geometry filters are supported')
+    try:
+        js = json.loads(g)
+        if isinstance(js, dict):
+            return float(js['xmin']), float(js['ymin']), float(js['xmax']), float(js['ymax'])
+    except ValueError:
+        pass
+    return tuple(float(v) for v in g.split(','))
+
+
+def _wkid(value):
+    if value in (None, ''):
+        return 4326
+    try:
+        js = json.loads(value) if isinstance(value, str) else value
+    except ValueError:
+        js = value
+    wkid = int(js.get('latestWkid') or js.get('wkid')) if isinstance(js, dict) else int(js)
+    if wkid not in (4326, 3857, 102100):
+        raise ServiceError(400, f'outSR {wkid} is not supported (4326 or 3857)')
+    return wkid
+
+
+def _mercator(x, y):
+    r = 6378137.0
+    y = max(min(y, 85.0511), -85.0511)
+    return math.radians(x) * r, math.log(math.tan(math.pi / 4 + math.radians(y) / 2)) * r
+
+
+def _project(g, wkid, precision):
+    if not g or (wkid == 4326 and precision is None):
+        return g
+
+    def pt(v):
+        x, y = _mercator(v[0], v[1]) if wkid != 4326 else (v[0], v[1])
+        if precision is not None:
+            x, y = round(x, precision), round(y, precision)
+        return [x, y]
+
+    if g.get('x') is not None:
+        x, y = pt((g['x'], g['y']))
+        return {'x': x, 'y': y}
+    key = 'rings' if 'rings' in g else 'paths' if 'paths' in g else 'points'
+    if key == 'points':
+        return {'points': [pt(v) for v in g['points']]}
+    return {key: [[pt(v) for v in part] for part in g[key]]}
+
+
+def _flag(p, name):
+    return str(p.get(name, '')).lower() == 'true'
+
+
+def _sort_key(v):
+    # None last, numbers before text
+    return (v is None, isinstance(v, str), v if v is not None else 0)
+
+
+class Layer:
+    """
+    One feature layer in memory: features by object id plus a bbox per
+    feature for envelope filters (bbox intersection, not exact geometry).
+    Updates replace the feature dict, so a query can work on a snapshot of
+    the references without holding the lock while it serializes.
+    """
+
+    def __init__(self, features, fields=FIELDS, name='Projecten', max_record_count=MAX_RECORD_COUNT):
+        self.lock = threading.RLock()
+        self.name = name
+        self.fields = fields
+        self.names = tuple(f['name'] for f in fields)
+        self.max_record_count = max_record_count
+        self.features = {}
+        self.bboxes = {}
+        kinds = Counter()
+        for f in features:
+            oid = f['attributes'][OID]
+            self.features[oid] = f
+            self.bboxes[oid] = _bbox(f.get('geometry'))
+            kinds[_kind(f.get('geometry'))] += 1
+        kinds.pop(None, None)
+        self.mixed = len(kinds) > 1
+        self.geometry_type = GEOMETRY_TYPES[kinds.most_common(1)[0][0] if kinds else 'polygon']
+        self.next_oid = max(self.features, default=0) + 1
+        self.last_edit = max((f['attributes'].get(EDIT_FIELD) or 0 for f in features), default=BASE_MS)
+
+    def info(self):
+        with self.lock:
+            boxes = [b for b in self.bboxes.values() if b]
+            last_edit = self.last_edit
+        extent = {'xmin': min(b[0] for b in boxes), 'ymin': min(b[1] for b in boxes),
+                  'xmax': max(b[2] for b in boxes), 'ymax': max(b[3] for b in boxes)} if boxes else {}
+        extent['spatialReference'] = {'wkid': 4326}
+        return {
+            'id': 0, 'name': self.name, 'type': 'Feature Layer',
+            'geometryType': self.geometry_type, 'objectIdField': OID,
+            'fields': self.fields, 'maxRecordCount': self.max_record_count,
+            'capabilities': 'Query,Create,Update,Delete,Editing',
+            'supportedQueryFormats': 'JSON, geoJSON, PBF',
+            'advancedQueryCapabilities': {'supportsPagination': True, 'supportsOrderBy': True,
+                                          'supportsStatistics': True, 'supportsDistinct': False},
+            'editingInfo': {'lastEditDate': last_edit},
+            'editFieldsInfo': {'editDateField': EDIT_FIELD},
+            'extent': extent,
+        }
+
+    # ----------------------------------------------------------------------
+    # Query
+    # ----------------------------------------------------------------------
+    def _select(self, p):
+        """Matching features (object id order) for objectIds + where + envelope."""
+        pred = compile_where(p.get('where') or '1=1', self.names)
+        env = _envelope(p)
+        with self.lock:
+            if p.get('objectIds'):
+                ids = sorted({int(i) for i in str(p['objectIds']).split(',') if i.strip()})
+                cands = [(i, self.features[i]) for i in ids if i in self.features]
+            else:
+                cands = list(self.features.items())
+            boxes = self.bboxes if env else None
+        out = []
+        for oid, f in cands:
+            if env:
+                b = boxes.get(oid)
+                if b is None or b[0] > env[2] or b[2] < env[0] or b[1] > env[3] or b[3] < env[1]:
+                    continue
+            if pred(f['attributes']):
+                out.append(f)
+        return out
+
+    def query(self, p):
+        feats = self._select(p)
+        if _flag(p, 'returnIdsOnly'):
+            return {'objectIdFieldName': OID, 'objectIds': [f['attributes'][OID] for f in feats]}
+        if _flag(p, 'returnCountOnly'):
+            return {'count': len(feats)}
+        if _flag(p, 'returnExtentOnly'):
+            boxes = [_bbox(_project(f.get('geometry'), _wkid(p.get('outSR')), None)) for f in feats]
+            boxes = [b for b in boxes if b]
+            ext = {'xmin': min(b[0] for b in boxes), 'ymin': min(b[1] for b in boxes),
+                   'xmax': max(b[2] for b in boxes), 'ymax': max(b[3] for b in boxes)} if boxes else {}
+            return {'extent': dict(ext, spatialReference={'wkid': _wkid(p.get('outSR'))})}
+        if p.get('outStatistics'):
+            return self._statistics(p, feats)
+
+        order = p.get('orderByFields')
+        if order:
+            for part in reversed([s.strip() for s in order.split(',') if s.strip()]):
+                name, _, direction = part.partition(' ')
+                if name not in self.names:
+                    raise ServiceError(400, f"Invalid orderByFields: unknown field '{name}'")
+                feats = sorted(feats, key=lambda f: _sort_key(f['attributes'].get(name)),
+                               reverse=direction.strip().upper() == 'DESC')
+        offset = int(p.get('resultOffset') or 0)
+        limit = min(int(p.get('resultRecordCount') or self.max_record_count), self.max_record_count)
+        page = feats[offset:offset + limit]
+
+        out_fields = p.get('outFields') or OID
+        names = list(self.names) if out_fields.strip() == '*' else \
+            [n for n in self.names if n.upper() in {s.strip().upper() for s in out_fields.split(',')}]
+        geometry = p.get('returnGeometry', 'true').lower() != 'false'
+        wkid = _wkid(p.get('outSR'))
+        precision = int(p['geometryPrecision']) if p.get('geometryPrecision') not in (None, '') else None
+        res = {
+            'objectIdFieldName': OID,
+            'geometryType': self.geometry_type,
+            'spatialReference': {'wkid': wkid},
+            'fields': [f for f in self.fields if f['name'] in names],
+            'features': [],
+        }
+        for f in page:
+            attrs = f['attributes']
+            feat = {'attributes': {n: attrs.get(n) for n in names}}
+            if geometry and f.get('geometry'):
+                feat['geometry'] = _project(f['geometry'], wkid, precision)
+            res['features'].append(feat)
+        if len(feats) > offset + limit:
+            res['exceededTransferLimit'] = True
+        return res
+
+    def _statistics(self, p, feats):
+        stats = json.loads(p['outStatistics'])
+        group_by = [g.strip() for g in (p.get('groupByFieldsForStatistics') or '').split(',') if g.strip()]
+        for name in group_by + [s['onStatisticField'] for s in stats]:
+            if name not in self.names:
+                raise ServiceError(400, f"Invalid statistics field '{name}'")
+        groups = {}
+        for f in feats:
+            a = f['attributes']
+            groups.setdefault(tuple(a.get(g) for g in group_by), []).append(a)
+        if not group_by and not groups:
+            groups[()] = []
+        rows = []
+        for key, members in groups.items():
+            row = dict(zip(group_by, key))
+            for s in stats:
+                vals = [a.get(s['onStatisticField']) for a in members]
+                vals = [v for v in vals if v is not None]
+                row[s['outStatisticFieldName']] = _aggregate(s['statisticType'], vals)
+            rows.append(row)
+        for part in reversed([s.strip() for s in (p.get('orderByFields') or '').split(',') if s.strip()]):
+            name, _, direction = part.partition(' ')
+            rows.sort(key=lambda r: _sort_key(r.get(name)), reverse=direction.strip().upper() == 'DESC')
+        return {'features': [{'attributes': r} for r in rows]}
+
+    # ----------------------------------------------------------------------
+    # Edits
+    # ----------------------------------------------------------------------
+    def _clean(self, attrs):
+        return {k: v for k, v in (attrs or {}).items() if k in self.names and k not in (OID, EDIT_FIELD)}
+
+    def _put(self, oid, attrs, geometry, now):
+        attrs = dict(attrs, **{OID: oid, EDIT_FIELD: now})
+        self.features[oid] = {'attributes': attrs, 'geometry': geometry}
+        self.bboxes[oid] = _bbox(geometry)
+
+    def apply_edits(self, adds=(), updates=(), deletes=()):
+        with self.lock:
+            now = max(int(time.time() * 1000), self.last_edit + 1)
+            add_res, upd_res, del_res = [], [], []
+            for f in adds or []:
+                oid = self.next_oid
+                self.next_oid += 1
+                self._put(oid, self._clean(f.get('attributes')), f.get('geometry'), now)
+                add_res.append({'objectId': oid, 'globalId': None, 'success': True})
+            for f in updates or []:
+                oid = (f.get('attributes') or {}).get(OID)
+                cur = self.features.get(oid)
+                if cur is None:
+                    upd_res.append({'objectId': oid, 'success': False,
+                                    'error': {'code': 1019, 'description': 'Object is missing.'}})
+                    continue
+                attrs = dict(cur['attributes'], **self._clean(f.get('attributes')))
+                self._put(oid, attrs, f['geometry'] if 'geometry' in f else cur.get('geometry'), now)
+                upd_res.append({'objectId': oid, 'success': True})
+            for oid in deletes or []:
+                oid = int(oid)
+                if self.features.pop(oid, None) is None:
+                    del_res.append({'objectId': oid, 'success': False,
+                                    'error': {'code': 1019, 'description': 'Object is missing.'}})
+                    continue
+                self.bboxes.pop(oid, None)
+                del_res.append({'objectId': oid, 'success': True})
+            if add_res or upd_res or any(r['success'] for r in del_res):
+                self.last_edit = now
+        return {'addResults': add_res, 'updateResults': upd_res, 'deleteResults': del_res}
+
+
+def _kind(g):
+    if not g:
+        return None
+    if g.get('x') is not None:
+        return 'point'
+    return 'polygon' if g.get('rings') else 'polyline' if g.get('paths') else None
+
+
+def _aggregate(kind, vals):
+    if kind == 'count':
+        return len(vals)
+    if not vals:
+        return None
+    if kind == 'sum':
+        return sum(vals)
+    if kind == 'avg':
+        return sum(vals) / len(vals)
+    if kind == 'min':
+        return min(vals)
+    if kind == 'max':
+        return max(vals)
+    if kind in ('stddev', 'var'):
+        if len(vals) < 2:
+            return None
+        return statistics.stdev(vals) if kind == 'stddev' else statistics.variance(vals)
+    raise ServiceError(400, f"Invalid statisticType '{kind}'")
+
+
+# --------------------------------------------------------------------------
+# Fault injection
+# --------------------------------------------------------------------------
+class Faults:
+    """
+    Per-request latency and failures. latency + uniform(0, jitter) seconds
+    are added to every request; throttle_rate answers 429 + Retry-After,
+    error_rate answers 503 either as HTTP status or as HTTP 200 with an
+    error body (both forms occur on AGOL). fail_next() queues failures for
+    deterministic tests.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._rnd = random.Random(seed)
+        self._queue = []
+        self._lock = threading.Lock()
+
+    def fail_next(self, n=1, kind='http'):
+        """Fail the next n requests with kind 'http' (503), 'json' (200 + error) or 'throttle' (429)."""
+        with self._lock:
+            self._queue.extend([kind] * n)
+
+    def delay(self):
+        with self._lock:
+            return self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def pick(self):
+        with self._lock:
+            if self._queue:
+                return self._queue.pop(0)
+            u = self._rnd.random()
+            if u < self.throttle_rate:
+                return 'throttle'
+            if u < self.throttle_rate + self.error_rate:
+                return self._rnd.choice(('http', 'json'))
+            return None
+
+
+# --------------------------------------------------------------------------
+# HTTP
+# --------------------------------------------------------------------------
+_ROUTES = (
+    ('token', re.compile(r'^/sharing/rest/generateToken/?$')),
+    ('service', re.compile(r'^/arcgis/rest/services/(?P<svc>[^/]+)/FeatureServer/?$')),
+    ('layer', re.compile(r'^/arcgis/rest/services/(?P<svc>[^/]+)/FeatureServer/(?P<layer>\d+)'
+                         r'(?:/(?P<op>query|applyEdits|addFeatures|updateFeatures|deleteFeatures))?/?$')),
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the pooled client expects
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(parse_qs(urlparse(self.path).query, keep_blank_values=True))
+
+    def do_POST(self):
+        n = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(n).decode('utf-8') if n else ''
+        params = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        params.update(parse_qs(body, keep_blank_values=True))
+        self._handle(params)
+
+    def _handle(self, params):
+        standin = self.server.standin
+        p = {k: v[-1] for k, v in params.items()}
+        path = urlparse(self.path).path
+
+        wait = standin.faults.delay()
+        if wait:
+            time.sleep(wait)
+        fault = standin.faults.pick()
+        if fault == 'throttle':
+            return self._send(429, b'{"error": {"code": 429, "message": "Too many requests"}}',
+                              'application/json', {'Retry-After': '1'}, fault=True)
+        if fault == 'http':
+            return self._send(503, b'Service Unavailable', 'text/plain', fault=True)
+        if fault == 'json':
+            return self._json({'error': {'code': 503, 'message': 'Service unavailable', 'details': []}},
+                              fault=True)
+
+        try:
+            for name, rx in _ROUTES:
+                m = rx.match(path)
+                if m:
+                    break
+            else:
+                return self._json(ServiceError(404, f'Not found: {path}').to_json())
+            if name == 'token':
+                return self._json(standin.generate_token(p))
+            standin.check_token(p.get('token'))
+            if name == 'service':
+                return self._json(standin.service_info())
+            layer = standin.layer_for(m.group('svc'), int(m.group('layer')))
+            op = m.group('op')
+            if op is None:
+                return self._json(layer.info())
+            if op == 'query':
+                res = layer.query(p)
+                if p.get('f') == 'pbf':
+                    if layer.mixed and 'features' in res and 'outStatistics' not in p:
+                        raise ServiceError(400, 'pbf needs a single geometry type per layer')
+                    digits = p.get('geometryPrecision')
+                    scale = 10.0 ** -int(digits) if digits not in (None, '') else 1e-8
+                    return self._send(200, encode_query(res, scale), 'application/x-protobuf')
+                return self._json(res)
+            return self._json(standin.edit(layer, op, p))
+        except ServiceError as e:
+            return self._json(e.to_json())
+        except (ValueError, KeyError, TypeError) as e:
+            return self._json(ServiceError(400, f'Unable to complete operation: {e}').to_json())
+
+    def _json(self, js, fault=False):
+        return self._send(200, json.dumps(js, separators=(',', ':')).encode('utf-8'),
+                          'application/json; charset=utf-8', fault=fault)
+
+    def _send(self, status, body, content_type, headers=None, fault=False):
+        if len(body) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.standin.count(urlparse(self.path).path, len(body), fault)
+
+
+class StandIn:
+    """
+    The stand-in server: one FeatureServer ('Projecten') with one layer of
+    n synthetic projects, served on a background thread.
+
+        with StandIn(n=10000, faults=Faults(latency=0.05)) as srv:
+            agol = srv.client()
+            agol.query_all(srv.layer_url)
+
+    Any username/password gets a token; tokens expire after token_minutes
+    (or the requested expiration), after which requests fail with 498.
+    """
+
+    def __init__(self, n=1000, seed=0, mix=None, faults=None, host='127.0.0.1', port=0,
+                 max_record_count=MAX_RECORD_COUNT, token_minutes=None, service='Projecten'):
+        self.service = service
+        self.layer = Layer(synthetic_projects(n, seed, mix), name=service, max_record_count=max_record_count)
+        self.faults = faults or Faults()
+        self.token_minutes = token_minutes
+        self.host = host
+        self.port = port
+        self.stats = Counter()
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.standin = self
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name='standin', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    @property
+    def portal(self):
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def service_url(self):
+        return f'{self.portal}/arcgis/rest/services/{self.service}/FeatureServer'
+
+    @property
+    def layer_url(self):
+        return f'{self.service_url}/0'
+
+    def client(self, **kw):
+        """A fresh AGOL client for this server (not the process-wide registry one)."""
+        from utils_agol import AGOL
+        return AGOL('standin', 'standin', self.portal, **kw)
+
+    # ----------------------------------------------------------------------
+    # Service operations
+    # ----------------------------------------------------------------------
+    def count(self, path, nbytes, fault):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += nbytes
+            if fault:
+                self.stats['faults'] += 1
+            self.stats[path.rstrip('/').rsplit('/', 1)[-1]] += 1
+
+    def generate_token(self, p):
+        if not p.get('username'):
+            raise ServiceError(400, 'Unable to generate token: username required')
+        minutes = self.token_minutes or int(p.get('expiration') or 60)
+        expires = int((time.time() + minutes * 60) * 1000)
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = expires
+        return {'token': token, 'expires': expires, 'ssl': False}
+
+    def check_token(self, token):
+        with self._lock:
+            expires = self._tokens.get(token)
+        if expires is None or expires < time.time() * 1000:
+            raise ServiceError(498, 'Invalid token.')
+
+    def service_info(self):
+        return {'serviceDescription': '', 'maxRecordCount': self.layer.max_record_count,
+                'layers': [{'id': 0, 'name': self.layer.name, 'geometryType': self.layer.geometry_type}],
+                'tables': []}
+
+    def layer_for(self, svc, layer_id):
+        if svc != self.service or layer_id != 0:
+            raise ServiceError(400, 'Invalid URL')
+        return self.layer
+
+    def edit(self, layer, op, p):
+        def rows(key):
+            return json.loads(p[key]) if p.get(key) else []
+
+        if op == 'applyEdits':
+            deletes = p.get('deletes') or ''
+            deletes = json.loads(deletes) if deletes.startswith('[') else [i for i in deletes.split(',') if i.strip()]
+            return layer.apply_edits(rows('adds'), rows('updates'), deletes)
+        if op == 'addFeatures':
+            return {'addResults': layer.apply_edits(adds=rows('features'))['addResults']}
+        if op == 'updateFeatures':
+            return {'updateResults': layer.apply_edits(updates=rows('features'))['updateResults']}
+        ids = [f['attributes'][OID] for f in layer._select({'where': p.get('where') or '1=0'})]
+        return {'deleteResults': layer.apply_edits(deletes=ids)['deleteResults']}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    ap = argparse.ArgumentParser(description='Local stand-in FeatureServer with synthetic projects.')
+    ap.add_argument('--features', type=int, default=10000)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--mix', default='polygon=1', help="e.g. 'point=3,polyline=2,polygon=5'")
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    ap.add_argument('--jitter', type=float, default=0.0, help='extra uniform(0, jitter) seconds')
+    ap.add_argument('--error-rate', type=float, default=0.0)
+    ap.add_argument('--throttle-rate', type=float, default=0.0)
+    ap.add_argument('--max-record-count', type=int, default=MAX_RECORD_COUNT)
+    args = ap.parse_args()
+
+    mix = {k: float(v) for k, v in (part.split('=') for part in args.mix.split(','))}
+    t0 = time.perf_counter()
+    srv = StandIn(args.features, args.seed, mix,
+                  Faults(args.latency, args.jitter, args.error_rate, args.throttle_rate),
+                  args.host, args.port, args.max_record_count).start()
+    print(f'{args.features} features generated in {time.perf_counter() - t0:.1f}s\n')
+    print('[arcgis]\nusername = "standin"\npassword = "standin"')
+    print(f'portal = "{srv.portal}"\nprojects_layer_url = "{srv.layer_url}"\nrelation_key_field = "Projectnr"\n')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.stop()
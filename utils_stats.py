@@ -0,0 +1,80 @@
+import pandas as pd
+
+# outStatistics type -> pandas aggregation
+STAT_TYPES = {'count': 'count', 'sum': 'sum', 'avg': 'mean', 'min': 'min', 'max': 'max',
+              'stddev': 'std', 'var': 'var'}
+MONTH_PREFIX = 'month:'  # group on the planning month of a date field, e.g. 'month:Geplande_start'
+
+
+def stat(kind, field, out=None):
+    """One outStatistics definition."""
+    if kind not in STAT_TYPES:
+        raise ValueError(f'Unknown statistic: {kind}')
+    return {'statisticType': kind, 'onStatisticField': field,
+            'outStatisticFieldName': out or f'{kind}_{field}'}
+
+
+def month_column(values):
+    """Epoch ms -> 'YYYY-MM' (empty for missing dates)."""
+    dt = pd.to_datetime(pd.to_numeric(values, errors='coerce'), unit='ms', utc=True)
+    return dt.dt.strftime('%Y-%m').fillna('')
+
+
+def local_statistics(df, stats, group_by=None):
+    """
+    The same result as AGOL.statistics, computed over a cached attribute
+    table. Month groups ('month:<field>') come out as a column named <field>
+    with 'YYYY-MM' values.
+    """
+    group_by = list(group_by or [])
+    work = pd.DataFrame(index=df.index)
+    keys = []
+    for g in group_by:
+        if g.startswith(MONTH_PREFIX):
+            name = g[len(MONTH_PREFIX):]
+            work[name] = month_column(df[name]) if name in df.columns else ''
+        else:
+            name = g
+            work[name] = df[name].astype(object).where(df[name].notna(), '') if name in df.columns else ''
+        keys.append(name)
+    for s in stats:
+        col = s['onStatisticField']
+        work[s['outStatisticFieldName']] = (pd.to_numeric(df[col], errors='coerce')
+                                            if s['statisticType'] != 'count' else df[col]) if col in df.columns else None
+    aggs = {s['outStatisticFieldName']: STAT_TYPES[s['statisticType']] for s in stats}
+    if not keys:
+        if not len(work):
+            return pd.DataFrame([{k: 0 for k in aggs}])
+        return work.groupby(lambda _: 0).agg(aggs).reset_index(drop=True)
+    return work.groupby(keys, sort=True, dropna=False).agg(aggs).reset_index()
+
+
+def statistics(agol, layer_url, stats, group_by=None, where='1=1', df=None, prefer_local=False):
+    """
+    Aggregates as a DataFrame. Runs on the service (outStatistics, one
+    small request) unless prefer_local is set and a cached table is given;
+    if the service call fails, falls back to df when available.
+
+    Month groups cannot be expressed portably in groupByFieldsForStatistics;
+    without a cached table they are computed from a geometry-free query of
+    only the needed fields.
+    """
+    group_by = list(group_by or [])
+    if df is not None and prefer_local:
+        return local_statistics(df, stats, group_by)
+    if any(g.startswith(MONTH_PREFIX) for g in group_by):
+        if df is None:
+            fields = {g[len(MONTH_PREFIX):] if g.startswith(MONTH_PREFIX) else g for g in group_by}
+            fields |= {s['onStatisticField'] for s in stats}
+            res = agol.query_all(layer_url, where=where, out_fields=','.join(sorted(fields)),
+                                 return_geometry=False)
+            df = pd.DataFrame([f.get('attributes', {}) for f in res.get('features', [])])
+        return local_statistics(df, stats, group_by)
+    try:
+        rows = agol.statistics(layer_url, stats, group_by, where)
+    except Exception:
+        if df is None:
+            raise
+        return local_statistics(df, stats, group_by)
+    out = pd.DataFrame(rows, columns=group_by + [s['outStatisticFieldName'] for s in stats])
+    return out.sort_values(group_by).reset_index(drop=True) if group_by else out
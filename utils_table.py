@@ -0,0 +1,223 @@
+import json
+from datetime import datetime, timezone
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from utils_geo import GeometryArray
+from utils_schema import DATE_TYPES, FLOAT_TYPES, INT_TYPES, to_epoch_ms
+
+OPS = ('=', 'bevat', '>=', '<=')
+PAGE_SIZES = (25, 50, 100, 250)
+
+
+# --------------------------------------------------------------------------
+# Table query: {'search', 'filters': [(column, op, value)], 'sort', 'ascending'}
+# --------------------------------------------------------------------------
+def make_query(search='', filters=(), sort=None, ascending=True):
+    return {'search': (search or '').strip(), 'filters': [tuple(f) for f in filters],
+            'sort': sort or None, 'ascending': bool(ascending)}
+
+
+def filter_key(q):
+    """Stable key of the row set (search + filters, not the sort order), for cache keys."""
+    if not q['search'] and not q['filters']:
+        return 'all'
+    return json.dumps([q['search'], q['filters']], sort_keys=True, default=str)
+
+
+def sql_literal(value, ftype):
+    if ftype in DATE_TYPES:
+        ms = to_epoch_ms(value)
+        return f"timestamp '{datetime.fromtimestamp(ms / 1000.0, tz=timezone.utc):%Y-%m-%d %H:%M:%S}'"
+    if ftype in INT_TYPES or ftype in FLOAT_TYPES:
+        return repr(float(str(value).replace(',', '.')))
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def to_where(q, field_types, search_fields=None):
+    """
+    SQL where clause for the layer: the same rows as ColumnarTable.mask(q).
+    field_types maps field name -> esriFieldType (e.g. from LayerSchema).
+    """
+    parts = []
+    if q['search']:
+        needle = q['search'].upper().replace("'", "''")
+        cols = search_fields or [f for f, t in field_types.items() if t == 'esriFieldTypeString']
+        if cols:
+            parts.append('(' + ' OR '.join(f"UPPER({c}) LIKE '%{needle}%'" for c in cols) + ')')
+    for col, op, value in q['filters']:
+        ftype = field_types.get(col)
+        if op == 'bevat':
+            parts.append(f"UPPER({col}) LIKE '%" + str(value).upper().replace("'", "''") + "%'")
+        else:
+            parts.append(f'{col} {op} {sql_literal(value, ftype)}')
+    return ' AND '.join(parts) or '1=1'
+
+
+def order_by(q):
+    return f"{q['sort']} {'ASC' if q['ascending'] else 'DESC'}" if q['sort'] else None
+
+
+# --------------------------------------------------------------------------
+# Features -> columns (attribute DataFrame + GeometryArray)
+# --------------------------------------------------------------------------
+class FrameBuilder:
+    """
+    Attribute columns and geometries filled page by page: each page is
+    transposed into the per-field value lists and converted into a
+    GeometryArray as it arrives, so nothing walks the full feature list again
+    at the end. A field missing from some rows is None there.
+    """
+
+    def __init__(self, fields=(), geometry=True):
+        self.columns = {name: [] for name in fields}
+        self.geometry = geometry
+        self.rows = 0
+        self._geoms = []
+
+    def add(self, features):
+        attrs = [f.get('attributes') or {} for f in features]
+        names = list(attrs[0]) if attrs else []
+        new = set().union(*attrs) - self.columns.keys()
+        for name in (dict.fromkeys(chain.from_iterable(attrs)) if new else ()):
+            if name in new:
+                self.columns[name] = [None] * self.rows
+        if all(list(a) == names for a in attrs):
+            # the usual case: same fields in the same order on every row
+            page = dict(zip(names, zip(*[a.values() for a in attrs])))
+            missing = (None,) * len(attrs)
+            for name, col in self.columns.items():
+                col.extend(page.get(name, missing))
+        else:
+            for name, col in self.columns.items():
+                col.extend([a.get(name) for a in attrs])
+        self.rows += len(attrs)
+        if self.geometry:
+            self._geoms.append(GeometryArray.from_esri([f.get('geometry') for f in features]))
+        return self
+
+    def frame(self):
+        """(DataFrame, GeometryArray or None without geometry)."""
+        df = pd.DataFrame(self.columns, columns=list(self.columns))
+        return df, (GeometryArray.concat(self._geoms) if self.geometry else None)
+
+
+def features_frame(features, fields=(), geometry=True):
+    """(attribute DataFrame, GeometryArray) of a feature list; see FrameBuilder."""
+    return FrameBuilder(fields, geometry).add(features).frame()
+
+
+# --------------------------------------------------------------------------
+# Local columnar table (sort/filter/page over the cached DataFrame)
+# --------------------------------------------------------------------------
+class ColumnarTable:
+    """
+    Server-side row model over the cached attribute table. Sort orders and
+    the lowercase search text are computed once per column and reused by
+    every page request; a page is a slice of positions, so only the visible
+    rows are ever handed to the grid.
+    """
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self._orders = {}
+        self._blob = None
+
+    def __len__(self):
+        return len(self.df)
+
+    def _search_blob(self):
+        # text columns only, like the LIKE clauses of to_where()
+        if self._blob is None:
+            cols = [self.df[c].astype(str).where(self.df[c].notna(), '')
+                    for c in self.df.columns if pd.api.types.is_string_dtype(self.df[c])]
+            if cols:
+                self._blob = cols[0].str.cat(cols[1:], sep='\x1f').str.lower()
+            else:
+                self._blob = pd.Series([''] * len(self.df), dtype=str)
+        return self._blob
+
+    def _filter_mask(self, col, op, value):
+        s = self.df[col]
+        if op == 'bevat':
+            return s.notna().to_numpy() & s.astype(str).str.lower().str.contains(str(value).lower(), regex=False).to_numpy()
+        if pd.api.types.is_numeric_dtype(s):
+            try:
+                v = float(str(value).replace(',', '.'))
+            except ValueError:
+                v = float(to_epoch_ms(value))  # date fields are epoch ms
+            a = s.to_numpy(dtype=float)
+        else:
+            v, a = str(value), s.astype(str).to_numpy()
+        with np.errstate(invalid='ignore'):
+            if op == '=':
+                return a == v
+            if op == '>=':
+                return a >= v
+            return a <= v
+
+    def mask(self, q):
+        """Boolean array of the rows matching search and filters."""
+        m = np.ones(len(self.df), dtype=bool)
+        if q['search']:
+            m &= self._search_blob().str.contains(q['search'].lower(), regex=False).to_numpy()
+        for col, op, value in q['filters']:
+            if col in self.df.columns:
+                m &= self._filter_mask(col, op, value)
+        return m
+
+    def order(self, col, ascending=True):
+        """Row positions sorted on col (stable, empty values last); cached per column."""
+        key = (col, ascending)
+        if key not in self._orders:
+            s = self.df[col]
+            try:
+                idx = s.sort_values(ascending=ascending, na_position='last', kind='stable').index
+            except TypeError:  # mixed types
+                idx = s.astype(str).sort_values(ascending=ascending, kind='stable').index
+            self._orders[key] = np.asarray(idx)
+        return self._orders[key]
+
+    def positions(self, q, mask=None):
+        """Matching row positions in query order; mask (e.g. facets) is combined with the query."""
+        m = self.mask(q)
+        if mask is not None:
+            m &= mask
+        if q['sort'] and q['sort'] in self.df.columns:
+            o = self.order(q['sort'], q['ascending'])
+            return o[m[o]]
+        return np.flatnonzero(m)
+
+    def page(self, q, offset=0, limit=50, mask=None):
+        """(page DataFrame, total matching rows)."""
+        pos = self.positions(q, mask)
+        return self.df.iloc[pos[offset:offset + limit]], len(pos)
+
+    def ids(self, q, id_field, mask=None):
+        return self.df[id_field].to_numpy()[self.positions(q, mask)]
+
+
+# --------------------------------------------------------------------------
+# Remote pages (the layer itself)
+# --------------------------------------------------------------------------
+def and_where(*clauses):
+    parts = [c for c in clauses if c and c != '1=1']
+    return ' AND '.join(f'({c})' for c in parts) if parts else '1=1'
+
+
+def remote_page(agol, layer_url, q, field_types, offset=0, limit=50, profile='table', where=None):
+    """
+    One page straight from the service as a DataFrame: where + orderByFields
+    + resultOffset/resultRecordCount. The total is agol.count(layer_url,
+    where), kept separate so callers can cache it. `where` defaults to
+    to_where(q, field_types); pass it to add clauses (e.g. facets).
+    """
+    where = where or to_where(q, field_types)
+    extra = {'resultOffset': offset, 'resultRecordCount': limit}
+    ob = order_by(q)
+    if ob:
+        extra['orderByFields'] = ob
+    js = agol.query(layer_url, where=where, extra=extra, profile=profile)
+    return pd.DataFrame([f.get('attributes', {}) for f in js.get('features', [])])
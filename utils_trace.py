@@ -0,0 +1,206 @@
+import contextvars, json, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# --------------------------------------------------------------------------
+# Spans (one tree per Streamlit rerun)
+# --------------------------------------------------------------------------
+class Span:
+    """A timed step with attributes and child spans (perf_counter seconds)."""
+
+    __slots__ = ('name', 'attrs', 'start', 'end', 'children', 'thread')
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+        self.thread = threading.current_thread().name
+
+    @property
+    def seconds(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def walk(self, depth=0):
+        """(depth, span) for this span and all descendants, depth first."""
+        yield depth, self
+        for child in list(self.children):
+            yield from child.walk(depth + 1)
+
+    def to_dict(self):
+        return {'name': self.name, 'ms': round(self.seconds * 1000, 3), 'attrs': self.attrs,
+                'thread': self.thread, 'children': [c.to_dict() for c in list(self.children)]}
+
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Child span of the current one. Without an active trace this only
+    yields None, so library code can be instrumented unconditionally.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    s = Span(name, attrs)
+    parent.children.append(s)
+    token = _current.set(s)
+    try:
+        yield s
+    finally:
+        s.end = time.perf_counter()
+        _current.reset(token)
+
+
+def start_trace(name, **attrs):
+    """Start a new root span for this thread (e.g. one dashboard rerun)."""
+    root = Span(name, attrs)
+    _current.set(root)
+    return root
+
+
+def end_trace(root):
+    root.end = time.perf_counter()
+    if _current.get() is root:
+        _current.set(None)
+    return root
+
+
+def submit(pool, fn, *args, **kw):
+    """pool.submit that carries the current span into the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kw)
+
+
+def format_tree(root, min_ms=0.0):
+    """Indented text view of a span tree; spans below min_ms are left out."""
+    lines = []
+    for depth, s in root.walk():
+        ms = s.seconds * 1000
+        if depth and ms < min_ms:
+            continue
+        attrs = ' '.join(f'{k}={v}' for k, v in s.attrs.items())
+        lines.append(f"{ms:9.1f} ms  {'  ' * depth}{s.name}{'  ' + attrs if attrs else ''}")
+    return '\n'.join(lines)
+
+
+def summarize(root):
+    """{span name: (count, total seconds)} over the tree, for a per-step overview."""
+    out = {}
+    for depth, s in root.walk():
+        if depth:
+            n, t = out.get(s.name, (0, 0.0))
+            out[s.name] = (n + 1, t + s.seconds)
+    return out
+
+
+_log_lock = threading.Lock()
+
+
+def write_jsonl(root, path):
+    """Append the trace as one JSON line (structured log for aggregation across sessions)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rec = {'ts': time.time(), **root.to_dict()}
+    with _log_lock, open(path, 'a', encoding='utf-8') as fh:
+        fh.write(json.dumps(rec, default=str) + '\n')
+
+
+# --------------------------------------------------------------------------
+# Process-wide metrics (OpenMetrics text export)
+# --------------------------------------------------------------------------
+def _num(v):
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """Counters and histograms keyed by (name, labels); thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+
+    def inc(self, name, value=1.0, doc=None, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+            if doc:
+                self.help.setdefault(name, doc)
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, doc=None, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, le in enumerate(h['buckets']):
+                if value <= le:
+                    h['counts'][i] += 1
+            h['sum'] += value
+            h['count'] += 1
+            if doc:
+                self.help.setdefault(name, doc)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def openmetrics(self):
+        """All metrics in the OpenMetrics text format."""
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in items) + '}'
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            hists = sorted((k, dict(v, counts=list(v['counts']))) for k, v in self.histograms.items())
+            helps = dict(self.help)
+
+        lines, seen = [], set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} counter')
+                if name in helps:
+                    lines.append(f'# HELP {name} {helps[name]}')
+            lines.append(f'{name}_total{fmt(labels)} {_num(value)}')
+        for (name, labels), h in hists:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} histogram')
+                if name in helps:
+                    lines.append(f'# HELP {name} {helps[name]}')
+            for le, n in zip(h['buckets'], h['counts']):
+                lines.append(f'{name}_bucket{fmt(labels, [("le", f"{le:g}")])} {n}')
+            lines.append(f'{name}_bucket{fmt(labels, [("le", "+Inf")])} {h["count"]}')
+            lines.append(f'{name}_count{fmt(labels)} {h["count"]}')
+            lines.append(f'{name}_sum{fmt(labels)} {_num(h["sum"])}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the export atomically (e.g. for a node_exporter textfile collector)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_text(self.openmetrics(), encoding='utf-8')
+        tmp.replace(path)
+
+
+# process-wide registry (AGOL client, layer cache, dashboard)
+metrics = Metrics()